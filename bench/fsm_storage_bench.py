@@ -0,0 +1,101 @@
+# bench/fsm_storage_bench.py — апдейты/сек: MemoryStorage vs PgStorage (сразу / с накоплением)
+#
+#   python bench/fsm_storage_bench.py [--users 200] [--updates 20] [--rtt-ms 1.0] [--db]
+#
+# Апдейт — как taxi_flow.choose_time: update_data, get_data, update_data, set_state.
+# Без --db PostgreSQL заменён пулом-имитацией с задержкой rtt на каждый запрос
+# (считает запросы); с --db — настоящая БД из .env.
+
+import argparse
+import asyncio
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiogram.fsm.storage.base import StorageKey  # noqa: E402
+from aiogram.fsm.storage.memory import MemoryStorage  # noqa: E402
+
+import repo.fsm_storage as fsm_storage  # noqa: E402
+from repo.fsm_storage import PgStorage  # noqa: E402
+
+
+class SimulatedPool:
+    """Пул-имитация: каждый запрос — одна задержка rtt."""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.queries = 0
+
+    async def _query(self, *args):
+        self.queries += 1
+        await asyncio.sleep(self.rtt)
+
+    async def fetchrow(self, *args):
+        await self._query()
+        return None
+
+    async def fetchval(self, *args):
+        await self._query()
+        return True  # таблица на месте
+
+    async def execute(self, *args):
+        await self._query()
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self
+
+
+async def one_update(storage, key: StorageKey, n: int) -> None:
+    await storage.update_data(key=key, data={"when": f"{n % 24:02d}:00"})
+    data = await storage.get_data(key=key)
+    await storage.update_data(key=key, data={"price_quote": 30.0, "price_key": str(len(data))})
+    await storage.set_state(key=key, state="TaxiOrder:confirm")
+
+
+async def run(storage, users: int, updates: int) -> float:
+    async def user(uid: int):
+        key = StorageKey(bot_id=1, chat_id=uid, user_id=uid)
+        for n in range(updates):
+            await one_update(storage, key, n)
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(user(uid) for uid in range(users)))
+    await storage.close()  # PgStorage: дописать хвост — входит во время
+    return users * updates / (time.perf_counter() - t0)
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--users", type=int, default=200)
+    ap.add_argument("--updates", type=int, default=20)
+    ap.add_argument("--rtt-ms", type=float, default=1.0)
+    ap.add_argument("--db", action="store_true", help="настоящая БД из .env вместо имитации")
+    args = ap.parse_args()
+
+    cases = (
+        ("memory", lambda: MemoryStorage()),
+        ("pg, write-through", lambda: PgStorage(flush_interval=0)),
+        ("pg, coalesced 0.2s", lambda: PgStorage(flush_interval=0.2)),
+    )
+    for name, factory in cases:
+        pool = None
+        if not args.db:
+            pool = SimulatedPool(args.rtt_ms / 1000)
+            async def get_pool(pool=pool):
+                return pool
+            fsm_storage.get_pool = get_pool
+        rate = await run(factory(), args.users, args.updates)
+        queries = f", {pool.queries} queries" if pool else ""
+        print(f"{name:>20}: {rate:10.0f} updates/s{queries}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,42 @@
+# bench/i18n_bench.py — стоимость переводов на один апдейт: gettext на каждый ключ vs каталоги в памяти
+#
+#   python bench/i18n_bench.py [итераций]
+#
+# Апдейт = 10 ключей, как в handle_minute_selection.
+
+import gettext
+import sys
+import timeit
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from middlewares.i18n import LOCALES_DIR, translator  # noqa: E402
+
+KEYS = (
+    "order_summary", "service", "from", "to", "date",
+    "time", "confirm_prompt", "confirm_order_btn", "cancel", "Taxi",
+)
+
+
+def update_before(lang: str = "ru") -> None:
+    # как было: gettext.translation() (поиск .mo на диске) на каждый ключ
+    for key in KEYS:
+        gettext.translation("bot", localedir=str(LOCALES_DIR), languages=[lang], fallback=True).gettext(key)
+
+
+def update_after(lang: str = "ru") -> None:
+    _ = translator(lang)  # middleware делает это один раз на апдейт
+    for key in KEYS:
+        _(key)
+
+
+def main() -> None:
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    for name, fn in (("before", update_before), ("after", update_after)):
+        sec = min(timeit.repeat(fn, number=n, repeat=3))
+        print(f"{name:>6}: {sec / n * 1e6:8.2f} µs/update ({len(KEYS)} keys)")
+
+
+if __name__ == "__main__":
+    main()
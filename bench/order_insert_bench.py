@@ -0,0 +1,166 @@
+# bench/order_insert_bench.py — запись заказа: round-trip'ы и задержка
+#
+#   python bench/order_insert_bench.py [--orders 50] [--rtt-ms 40] [--db]
+#
+# legacy — прежний create_order: четыре запроса подряд на одном соединении
+# (upsert svc.user, upsert customers, SELECT service_id, INSERT orders).
+# cte    — repo.orders.create_order, каждый заказ от нового клиента: один оператор;
+# repeat — тот же клиент снова: id из кэша repo.orders, только INSERT заказа.
+# Без --db соединение — имитация с задержкой rtt на запрос (удалённая БД
+# Timeweb ~40 мс); с --db — настоящая БД из .env (заказы действительно пишутся).
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import repo.orders as orders  # noqa: E402
+
+ORDER = {
+    "client_tg_id": 100500,
+    "username": "bench",
+    "lang": "ru",
+    "pickup_text": "Aeropuerto Jose Marti",
+    "dropoff_text": "Hotel Nacional",
+    "when_dt": None,
+    "pax": 2,
+    "options": {"time": "10:00"},
+    "price_quote": 30.0,
+    "price_payload": {"source": "bench"},
+}
+
+
+class SimulatedConnection:
+    """Соединение-имитация: каждый запрос — одна задержка rtt."""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+
+    async def _query(self):
+        await asyncio.sleep(self.rtt)
+
+    async def fetchval(self, *args):
+        await self._query()
+        return 1
+
+    async def fetchrow(self, *args):
+        await self._query()
+        return {"id": 1, "customer_id": 1, "service_id": 1, "user_id": 1}
+
+
+class CountingConnection:
+    """Обёртка над соединением: считает запросы (= round-trip'ы) и upsert'ы пользователя."""
+
+    def __init__(self, con):
+        self._con = con
+        self.queries = 0
+        self.upserts = 0
+
+    def _count(self, sql: str) -> None:
+        self.queries += 1
+        self.upserts += 'INSERT INTO svc."user"' in sql
+
+    async def fetchval(self, sql, *args):
+        self._count(sql)
+        return await self._con.fetchval(sql, *args)
+
+    async def fetchrow(self, sql, *args):
+        self._count(sql)
+        return await self._con.fetchrow(sql, *args)
+
+
+class CountingPool:
+    def __init__(self, pool=None, rtt: float = 0.0):
+        self._pool = pool
+        self._rtt = rtt
+        self.queries = 0
+        self.upserts = 0
+
+    @asynccontextmanager
+    async def acquire(self):
+        if self._pool is None:
+            con = CountingConnection(SimulatedConnection(self._rtt))
+            yield con
+        else:
+            async with self._pool.acquire() as raw:
+                con = CountingConnection(raw)
+                yield con
+        self.queries += con.queries
+        self.upserts += con.upserts
+
+
+async def legacy_create_order(pool, order: dict) -> int:
+    """Прежняя реализация repo.orders.create_order (до одного оператора)."""
+    async with pool.acquire() as con:
+        user_id = await con.fetchval(
+            'INSERT INTO svc."user" (tg_id, username) VALUES ($1, $2) '
+            "ON CONFLICT (tg_id) DO UPDATE SET username = $2 RETURNING id",
+            order["client_tg_id"], order.get("username"),
+        )
+        customer_id = await con.fetchval(
+            "INSERT INTO uslugicuba.customers (user_id, lang) VALUES ($1, $2) "
+            "ON CONFLICT (user_id) DO UPDATE SET lang = $2 RETURNING id",
+            user_id, order.get("lang", "ru"),
+        )
+        service_id = await con.fetchval("SELECT id FROM uslugicuba.services WHERE category = 'taxi' LIMIT 1")
+        meta = json.dumps({"options": order.get("options", {}), "price_quote": order.get("price_quote"),
+                           "price_payload": order.get("price_payload", {}), "source_data": order},
+                          ensure_ascii=False, default=str)
+        row = await con.fetchrow(
+            "INSERT INTO uslugicuba.orders(customer_id, service_id, state, pickup_text, dropoff_text, "
+            "when_at, pax, meta) VALUES ($1, $2, 'new', $3, $4, $5, COALESCE($6, 1), $7::jsonb) RETURNING id",
+            customer_id, service_id, order.get("pickup_text", ""), order.get("dropoff_text", ""),
+            order.get("when_dt"), order.get("pax"), meta,
+        )
+        return int(row["id"])
+
+
+async def run(name: str, create, pool: CountingPool, n: int) -> None:
+    latencies = []
+    for _ in range(n):
+        t0 = time.perf_counter()
+        await create()
+        latencies.append(time.perf_counter() - t0)
+    ms = [x * 1000 for x in latencies]
+    print(f"{name:>7}: {pool.queries / n:.1f} round-trips/order, {pool.upserts / n:.1f} upserts/order, "
+          f"p50 {statistics.median(ms):6.1f} ms, max {max(ms):6.1f} ms")
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--orders", type=int, default=50)
+    ap.add_argument("--rtt-ms", type=float, default=40.0)
+    ap.add_argument("--db", action="store_true", help="настоящая БД из .env вместо имитации")
+    args = ap.parse_args()
+
+    real = await orders.get_pool() if args.db else None
+    if args.db and real is None:
+        sys.exit("DB not reachable")
+    rtt = args.rtt_ms / 1000
+
+    pool = CountingPool(real, rtt)
+    await run("legacy", lambda: legacy_create_order(pool, ORDER), pool, args.orders)
+
+    pools = []
+    async def get_pool():
+        return pools[-1]
+    orders.get_pool = get_pool
+
+    pools.append(CountingPool(real, rtt))
+    tg_ids = iter(range(200000, 200000 + args.orders))
+    await run("cte", lambda: orders.create_order(ORDER | {"client_tg_id": next(tg_ids)}), pools[-1], args.orders)
+
+    pools.append(CountingPool(real, rtt))
+    await orders.create_order(ORDER)  # клиент уже заходил
+    pools[-1].queries = pools[-1].upserts = 0
+    await run("repeat", lambda: orders.create_order(ORDER), pools[-1], args.orders)
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,116 @@
+# bench/order_writer_bench.py — заказов/сек: create_order по одному vs групповая запись
+#
+#   python bench/order_writer_bench.py [--orders 1000] [--rtt-ms 1.0] [--pool 10] [--db]
+#
+# Одновременных подтверждений 1, 10 и 100; каждый заказ — от нового клиента
+# (худший случай: нужны upsert'ы). Без --db пул — имитация asyncpg
+# (max_size=--pool соединений, задержка rtt на каждый запрос); с --db —
+# настоящая БД из .env (локальный Postgres; заказы действительно пишутся).
+
+import argparse
+import asyncio
+import itertools
+import sys
+import time
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import repo.orders as orders  # noqa: E402
+from repo.order_writer import OrderWriter  # noqa: E402
+
+ORDER = {
+    "username": "bench",
+    "lang": "ru",
+    "pickup_text": "Aeropuerto Jose Marti",
+    "dropoff_text": "Hotel Nacional",
+    "when_dt": None,
+    "pax": 2,
+    "options": {"time": "10:00"},
+    "price_quote": 30.0,
+    "price_payload": {"source": "bench"},
+}
+
+
+class SimulatedConnection:
+    """Соединение-имитация: каждый запрос — одна задержка rtt."""
+
+    def __init__(self, pool: "SimulatedPool"):
+        self.pool = pool
+
+    async def _query(self):
+        self.pool.queries += 1
+        await asyncio.sleep(self.pool.rtt)
+
+    async def fetchval(self, *args):
+        await self._query()
+        return next(self.pool.ids)
+
+    async def fetchrow(self, *args):
+        await self._query()
+        i = next(self.pool.ids)
+        return {"id": i, "customer_id": i, "service_id": 1, "user_id": i}
+
+    async def fetch(self, sql, *args):
+        await self._query()
+        return [{"n": n, "id": next(self.pool.ids), "customer_id": t, "user_id": t, "service_id": 1}
+                for n, t in enumerate(args[0], 1)]
+
+
+class SimulatedPool:
+    def __init__(self, rtt: float, size: int):
+        self.rtt = rtt
+        self.queries = 0
+        self.ids = itertools.count(1)
+        self._slots = asyncio.Semaphore(size)
+
+    @asynccontextmanager
+    async def acquire(self):
+        async with self._slots:
+            yield SimulatedConnection(self)
+
+
+async def run(create, concurrency: int, total: int) -> float:
+    tg_ids = itertools.count(300000 + concurrency * 100000)
+    left = iter(range(total))
+
+    async def client():
+        for _ in left:
+            await create(ORDER | {"client_tg_id": next(tg_ids)})
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return total / (time.perf_counter() - t0)
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--orders", type=int, default=1000)
+    ap.add_argument("--rtt-ms", type=float, default=1.0)
+    ap.add_argument("--pool", type=int, default=10)
+    ap.add_argument("--db", action="store_true", help="настоящая БД из .env вместо имитации")
+    args = ap.parse_args()
+
+    real = await orders.get_pool() if args.db else None
+    if args.db and real is None:
+        sys.exit("DB not reachable")
+
+    for concurrency in (1, 10, 100):
+        for name in ("direct", "batched"):
+            pool = real or SimulatedPool(args.rtt_ms / 1000, args.pool)
+            async def get_pool(pool=pool):
+                return pool
+            orders.get_pool = get_pool
+            orders.clear_repo_caches()
+            writer = OrderWriter(window=0.005, max_batch=100)
+            create = orders.create_order if name == "direct" else writer.submit
+            rate = await run(create, concurrency, args.orders)
+            await writer.close()
+            queries = f", {pool.queries / args.orders:.2f} queries/order" if not real else ""
+            batches = f", {writer.batches} batches" if name == "batched" else ""
+            print(f"{concurrency:>3} concurrent, {name:>7}: {rate:8.0f} orders/s{queries}{batches}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,167 @@
+# bench/webhook_bench.py — задержка нажатия кнопки: long polling vs вебхук
+#
+#   python bench/webhook_bench.py [--presses 200] [--rtt-ms 30]
+#
+# Локальный «Bot API» на aiohttp отвечает на каждый метод с задержкой rtt
+# (как настоящий api.telegram.org) и считает вызовы. Хэндлер — как в
+# handlers/client/paging.py: editMessageReplyMarkup, затем callback.answer().
+# Задержка — от появления апдейта до ответа на callback (пропали «часики»):
+#   polling — апдейт отдаётся в getUpdates, конец — приход answerCallbackQuery;
+#   webhook — POST апдейта на bots/webhook.py, конец — ответ на этот POST.
+
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from collections import Counter
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from aiohttp import ClientSession, web  # noqa: E402
+from aiogram import Bot, Dispatcher, F, Router  # noqa: E402
+from aiogram.client.session.aiohttp import AiohttpSession  # noqa: E402
+from aiogram.client.telegram import TelegramAPIServer  # noqa: E402
+from aiogram.types import CallbackQuery  # noqa: E402
+
+from bots.webhook import WebhookServer  # noqa: E402
+
+TOKEN = "42:bench"
+API_PORT, HOOK_PORT = 18081, 18082
+
+
+class FakeBotAPI:
+    """Bot API-имитация: getUpdates из очереди, остальные методы — ok с задержкой rtt."""
+
+    def __init__(self, rtt: float):
+        self.rtt = rtt
+        self.calls = Counter()
+        self.updates: asyncio.Queue = asyncio.Queue()
+        self.answered: dict[str, float] = {}
+        self.answer_event = asyncio.Event()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post("/bot{token}/{method}", self.handle)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        method = request.match_info["method"]
+        form = await request.post()
+        self.calls[method] += 1
+        if method == "getUpdates":
+            try:
+                update = await asyncio.wait_for(self.updates.get(), float(form.get("timeout") or 1))
+                result = [update]
+            except asyncio.TimeoutError:
+                result = []
+            return web.json_response({"ok": True, "result": result})
+        await asyncio.sleep(self.rtt)
+        if method == "answerCallbackQuery":
+            self.answered[form["callback_query_id"]] = time.perf_counter()
+            self.answer_event.set()
+        if method == "getMe":
+            return web.json_response({"ok": True, "result": {"id": 42, "is_bot": True, "first_name": "bench"}})
+        return web.json_response({"ok": True, "result": True})
+
+
+def make_update(n: int) -> dict:
+    return {
+        "update_id": n,
+        "callback_query": {
+            "id": f"cb{n}",
+            "from": {"id": 1000 + n % 50, "is_bot": False, "first_name": "u"},
+            "chat_instance": "bench",
+            "data": "pg|h|pickup_hotel|1",
+            "message": {
+                "message_id": n, "date": 1700000000, "text": "list",
+                "chat": {"id": 1000 + n % 50, "type": "private"},
+            },
+        },
+    }
+
+
+def make_dispatcher() -> Dispatcher:
+    router = Router()
+
+    @router.callback_query(F.data.startswith("pg|"))
+    async def turn_page(callback: CallbackQuery):
+        await callback.message.edit_reply_markup(reply_markup=None)
+        await callback.answer()
+
+    dp = Dispatcher()
+    dp.include_router(router)
+    return dp
+
+
+def make_bot() -> Bot:
+    api = TelegramAPIServer.from_base(f"http://127.0.0.1:{API_PORT}")
+    return Bot(token=TOKEN, session=AiohttpSession(api=api))
+
+
+async def bench_polling(api: FakeBotAPI, presses: int) -> list[float]:
+    bot, dp = make_bot(), make_dispatcher()
+    polling = asyncio.create_task(dp.start_polling(bot, polling_timeout=1, handle_signals=False))
+    latencies = []
+    for n in range(presses):
+        api.answer_event.clear()
+        t0 = time.perf_counter()
+        await api.updates.put(make_update(n))
+        while f"cb{n}" not in api.answered:
+            await api.answer_event.wait()
+            api.answer_event.clear()
+        latencies.append(api.answered[f"cb{n}"] - t0)
+    await dp.stop_polling()
+    await polling
+    await bot.session.close()
+    return latencies
+
+
+async def bench_webhook(presses: int) -> list[float]:
+    bot, dp = make_bot(), make_dispatcher()
+    server = WebhookServer(dp, bot, secret="", queue_size=100, concurrency=8, answer_window=0.5)
+    runner = web.AppRunner(server.app("/hook"))
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", HOOK_PORT).start()
+    latencies = []
+    async with ClientSession() as http:
+        for n in range(presses):
+            t0 = time.perf_counter()
+            async with http.post(f"http://127.0.0.1:{HOOK_PORT}/hook", json=make_update(n)) as resp:
+                payload = await resp.json()
+            latencies.append(time.perf_counter() - t0)
+            assert payload["method"] == "answerCallbackQuery", payload
+    await runner.cleanup()
+    await bot.session.close()
+    return latencies
+
+
+def report(name: str, latencies: list[float], calls: Counter, presses: int) -> None:
+    ms = sorted(x * 1000 for x in latencies)
+    outbound = sum(v for k, v in calls.items() if k not in ("getUpdates", "getMe"))
+    print(f"{name:>8}: p50 {statistics.median(ms):6.1f} ms, p95 {ms[int(len(ms) * 0.95) - 1]:6.1f} ms, "
+          f"{outbound / presses:.2f} Bot API calls/press ({dict(calls)})")
+
+
+async def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--presses", type=int, default=200)
+    ap.add_argument("--rtt-ms", type=float, default=30.0)
+    args = ap.parse_args()
+
+    api = FakeBotAPI(args.rtt_ms / 1000)
+    runner = web.AppRunner(api.app())
+    await runner.setup()
+    await web.TCPSite(runner, "127.0.0.1", API_PORT).start()
+
+    latencies = await bench_polling(api, args.presses)
+    report("polling", latencies, api.calls, args.presses)
+    api.calls.clear()
+    latencies = await bench_webhook(args.presses)
+    report("webhook", latencies, api.calls, args.presses)
+    await runner.cleanup()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
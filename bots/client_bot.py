@@ -1,12 +1,21 @@
 # bots/client_bot.py
+import time
+_IMPORT_STARTED = time.perf_counter()
+
 import asyncio
 import logging
 from aiogram import Bot, Dispatcher
-from aiogram.fsm.storage.memory import MemoryStorage
 
-from config import CLIENT_BOT_TOKEN
-from middlewares.i18n import I18nMiddleware
-from handlers.client import service_selection, taxi_flow
+from config import (
+    CLIENT_BOT_TOKEN, PRICE_MATRIX_PATH, DATA_RELOAD_INTERVAL, TARIFF_DB_TTL,
+    QUOTE_CACHE_SIZE, QUOTE_CACHE_TTL, REFERENCE_SNAPSHOT_PATH, REFERENCE_SNAPSHOT,
+    LANG_CACHE_SIZE, FSM_STORAGE, FSM_FLUSH_INTERVAL, FSM_CACHE_SIZE, FSM_IDLE_TTL, FSM_SWEEP_INTERVAL,
+    THROTTLE_RATE, THROTTLE_BURST, THROTTLE_DEDUP_WINDOW,
+)
+from middlewares.i18n import LANG_DESTINY, I18nMiddleware, configure_lang_cache
+from middlewares.fsm_unit import UserEventIsolation, install_unit_of_work
+from middlewares.throttling import ThrottlingMiddleware
+from handlers.client import language, paging, service_selection, taxi_flow
 
 
 # +++ ЛОГИ
@@ -16,17 +25,63 @@ logger = logging.getLogger("client_bot")
 
 # +++ ПИНГ БД
 from repo.orders import ping_db
+from repo.outbox import start_outbox
+from repo.tariffs import get_tariff_cache
+from repo.fsm_storage import PgStorage
+from states.storage import ExpiringMemoryStorage
+import price_matrix
+import pricing
+from data_loader import warm_up, watch_data_files
 
+_IMPORT_SECONDS = time.perf_counter() - _IMPORT_STARTED
 
-async def run_client_bot():
-    bot = Bot(token=CLIENT_BOT_TOKEN, parse_mode="HTML")
-    dp = Dispatcher(storage=MemoryStorage())
 
-    dp.message.middleware(I18nMiddleware())
-    dp.callback_query.middleware(I18nMiddleware())
+def make_storage():
+    """FSM-хранилище по FSM_STORAGE: pg — переживает рестарт, memory — в памяти с TTL простоя."""
+    if FSM_STORAGE == "pg":
+        return PgStorage(
+            flush_interval=FSM_FLUSH_INTERVAL, cache_size=FSM_CACHE_SIZE,
+            idle_ttl=FSM_IDLE_TTL, sweep_interval=FSM_SWEEP_INTERVAL,
+            keep_destinies=(LANG_DESTINY,),  # выбранный язык не «брошенный диалог»
+        )
+    return ExpiringMemoryStorage(ttl=FSM_IDLE_TTL, sweep_interval=FSM_SWEEP_INTERVAL)
+
 
+def build_dispatcher() -> Dispatcher:
+    """Dispatcher со всеми middleware и роутерами (общий для polling и воркеров кластера)."""
+    # FSM — единица работы на апдейт: одно чтение до хэндлера, одна запись после
+    dp = Dispatcher(storage=make_storage(), events_isolation=UserEventIsolation(), disable_fsm=True)
+    # повторы и флуд отсекаются раньше FSM: без замка, чтения состояния и хэндлера
+    dp.update.outer_middleware(ThrottlingMiddleware(
+        rate=THROTTLE_RATE, burst=THROTTLE_BURST, dedup_window=THROTTLE_DEDUP_WINDOW,
+    ))
+    install_unit_of_work(dp)
+
+    # один экземпляр на оба типа апдейтов; язык — из кэша в памяти, без чтения FSM
+    configure_lang_cache(LANG_CACHE_SIZE)
+    i18n = I18nMiddleware()
+    dp.message.middleware(i18n)
+    dp.callback_query.middleware(i18n)
+
+    dp.include_router(language.router)
+    dp.include_router(paging.router)  # до taxi_flow: там ловушка необработанных callback
     dp.include_router(service_selection.router)
     dp.include_router(taxi_flow.router)
+    return dp
+
+
+async def prepare_runtime() -> list[asyncio.Task]:
+    """Справочники, кэши, БД и фоновые задачи процесса. Возвращает задачи (держать ссылки)."""
+    tasks = []
+    # Матрица цен отображается в память один раз на процесс (страницы общие)
+    price_matrix.load(PRICE_MATRIX_PATH or None)
+    pricing.configure_quote_cache(QUOTE_CACHE_SIZE, QUOTE_CACHE_TTL)
+    # Справочники — до первого апдейта: из снимка, либо разбором CSV (и новый снимок)
+    warm_up(REFERENCE_SNAPSHOT_PATH or None, use_snapshot=REFERENCE_SNAPSHOT)
+
+    # Горячая перезагрузка data/*.csv без рестарта (0 — выключено)
+    if DATA_RELOAD_INTERVAL > 0:
+        tasks.append(asyncio.create_task(watch_data_files(DATA_RELOAD_INTERVAL)))
 
     # Проверяем БД перед запуском polling (упадём сразу, если что)
     try:
@@ -34,6 +89,23 @@ async def run_client_bot():
     except Exception as e:
         logging.warning("DB not reachable: %s — starting in NO-DB mode", e)
     logger.info("DB OK. Starting polling...")
+    # Заказы, записанные локально без БД, — в uslugicuba.orders, как только она доступна
+    tasks.append(start_outbox())
+
+    # Тарифы провайдеров из БД поверх CSV (при недоступной БД — CSV)
+    if TARIFF_DB_TTL > 0:
+        tasks.append(asyncio.create_task(get_tariff_cache(TARIFF_DB_TTL).run()))
+    return tasks
+
+
+async def run_client_bot():
+    logger.info("Imports: %.1fms (python -X importtime main.py — по модулям)", _IMPORT_SECONDS * 1000)
+    bot = Bot(token=CLIENT_BOT_TOKEN, parse_mode="HTML")
+    dp = build_dispatcher()
+    tasks = await prepare_runtime()
 
     await bot.delete_webhook(drop_pending_updates=True)
-    await dp.start_polling(bot)
+    try:
+        await dp.start_polling(bot)
+    finally:
+        await dp.storage.close()  # PgStorage дописывает накопленное
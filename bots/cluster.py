@@ -0,0 +1,170 @@
+# bots/cluster.py — несколько процессов: приёмник + N воркеров, шардирование по user id
+#
+# Один asyncio-цикл упирается в одно ядро (разбор апдейтов, pydantic, i18n,
+# клавиатуры). Здесь апдейты получает один процесс-приёмник (getUpdates) и
+# раскладывает их по воркерам: user_id % N. Все апдейты пользователя попадают
+# в один воркер, а внутри него их упорядочивает UserEventIsolation — порядок
+# FSM сохраняется, и кэш PgStorage не расходится с БД (ключом владеет один процесс).
+#
+# Общее у воркеров:
+#   * настройки БД — из того же .env (у каждого свой пул asyncpg);
+#   * справочники — снимок data/reference.snapshot, приёмник готовит его до старта;
+#   * матрица цен — mmap одного файла, страницы общие в page cache.
+#
+# Запуск: BOT_WORKERS=4 python main.py (1 — обычный polling в одном процессе).
+
+from __future__ import annotations
+import asyncio
+import logging
+import multiprocessing as mp
+import queue
+import signal
+from typing import Optional
+
+from aiogram import Bot
+from aiogram.types import Update
+
+from config import (
+    CLIENT_BOT_TOKEN, PRICE_MATRIX_PATH, REFERENCE_SNAPSHOT_PATH, REFERENCE_SNAPSHOT,
+    BOT_WORKERS, BOT_WORKER_QUEUE,
+)
+
+log = logging.getLogger("client_bot.cluster")
+
+_POLL_TIMEOUT = 30        # long polling getUpdates, сек
+_MAX_IN_FLIGHT = 256      # одновременно обрабатываемых апдейтов в воркере
+_RETRY_DELAY = 1.0        # пауза после ошибки getUpdates, сек
+
+
+def shard_of(update: Update, workers: int) -> int:
+    """Номер воркера для апдейта: по пользователю, иначе по чату, иначе 0."""
+    event = update.event
+    user = getattr(event, "from_user", None)
+    if user is not None:
+        return user.id % workers
+    chat = getattr(event, "chat", None)
+    if chat is not None:
+        return chat.id % workers
+    return 0
+
+
+# ───── Воркер ─────
+
+def _worker_main(index: int, updates: mp.Queue) -> None:
+    """Точка входа процесса-воркера (spawn: модуль импортируется заново)."""
+    signal.signal(signal.SIGINT, signal.SIG_IGN)  # останавливает приёмник — сигналом в очереди
+    logging.basicConfig(level=logging.INFO,
+                        format=f"%(asctime)s %(levelname)s w{index} %(name)s: %(message)s")
+    asyncio.run(_worker(index, updates))
+
+
+async def _worker(index: int, updates: mp.Queue) -> None:
+    from bots.client_bot import build_dispatcher, prepare_runtime
+
+    bot = Bot(token=CLIENT_BOT_TOKEN, parse_mode="HTML")
+    dp = build_dispatcher()
+    tasks = await prepare_runtime()  # noqa: F841 — держим ссылки на фоновые задачи
+    slots = asyncio.Semaphore(_MAX_IN_FLIGHT)
+    in_flight: set[asyncio.Task] = set()
+
+    async def handle(update: Update) -> None:
+        try:
+            await dp.feed_update(bot, update)
+        except Exception:
+            log.exception("Update %s failed", update.update_id)
+        finally:
+            slots.release()
+
+    log.info("Worker %d ready", index)
+    try:
+        while True:
+            raw = await asyncio.to_thread(updates.get)
+            if raw is None:  # приёмник остановился
+                break
+            await slots.acquire()  # очередь ограничена — приёмник почувствует нагрузку
+            # задачи стартуют в порядке очереди, замок пользователя — FIFO
+            task = asyncio.create_task(handle(Update.model_validate_json(raw, context={"bot": bot})))
+            in_flight.add(task)
+            task.add_done_callback(in_flight.discard)
+        if in_flight:
+            await asyncio.gather(*in_flight, return_exceptions=True)
+    finally:
+        await dp.storage.close()  # PgStorage дописывает накопленное
+        await bot.session.close()
+
+
+# ───── Приёмник ─────
+
+class Cluster:
+    """Процесс-приёмник: getUpdates → очередь воркера по user id."""
+
+    def __init__(self, workers: int = BOT_WORKERS, queue_size: int = BOT_WORKER_QUEUE):
+        self.workers = max(1, workers)
+        self._ctx = mp.get_context("spawn")  # без fork: у родителя уже есть цикл и сессия
+        self._queues = [self._ctx.Queue(maxsize=queue_size) for _ in range(self.workers)]
+        self._procs: list[Optional[mp.Process]] = [None] * self.workers
+
+    def _spawn(self, index: int) -> None:
+        proc = self._ctx.Process(target=_worker_main, args=(index, self._queues[index]),
+                                 name=f"bot-worker-{index}", daemon=True)
+        proc.start()
+        self._procs[index] = proc
+
+    def _check_workers(self) -> None:
+        for i, proc in enumerate(self._procs):
+            if proc is not None and not proc.is_alive():
+                log.error("Worker %d exited with code %s — restarting", i, proc.exitcode)
+                self._spawn(i)
+
+    async def _dispatch(self, update: Update) -> None:
+        q = self._queues[shard_of(update, self.workers)]
+        raw = update.model_dump_json(exclude_unset=True, by_alias=True)
+        try:
+            q.put_nowait(raw)
+        except queue.Full:
+            await asyncio.to_thread(q.put, raw)  # воркер не успевает — ждём, не теряем
+
+    async def run(self) -> None:
+        from bots.client_bot import build_dispatcher
+        import price_matrix
+        from data_loader import warm_up
+
+        # файлы, общие для воркеров, — до их старта, чтобы не собирать их N раз наперегонки
+        price_matrix.load(PRICE_MATRIX_PATH or None)
+        warm_up(REFERENCE_SNAPSHOT_PATH or None, use_snapshot=REFERENCE_SNAPSHOT)
+        allowed = build_dispatcher().resolve_used_update_types()
+
+        for i in range(self.workers):
+            self._spawn(i)
+        log.info("Cluster: %d workers, polling...", self.workers)
+
+        bot = Bot(token=CLIENT_BOT_TOKEN, parse_mode="HTML")
+        await bot.delete_webhook(drop_pending_updates=True)
+        offset = None
+        try:
+            while True:
+                try:
+                    updates = await bot.get_updates(offset=offset, timeout=_POLL_TIMEOUT,
+                                                    allowed_updates=allowed)
+                except Exception as e:
+                    log.warning("getUpdates failed: %s", e)
+                    await asyncio.sleep(_RETRY_DELAY)
+                    continue
+                for update in updates:
+                    await self._dispatch(update)
+                    offset = update.update_id + 1
+                self._check_workers()
+        finally:
+            await self.stop()
+            await bot.session.close()
+
+    async def stop(self) -> None:
+        for q in self._queues:
+            await asyncio.to_thread(q.put, None)
+        for proc in self._procs:
+            if proc is not None:
+                await asyncio.to_thread(proc.join, 30)
+
+
+async def run_cluster(workers: int = BOT_WORKERS) -> None:
+    await Cluster(workers).run()
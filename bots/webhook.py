@@ -0,0 +1,191 @@
+# bots/webhook.py — приём апдейтов вебхуком (aiohttp) вместо long polling
+#
+# Telegram сам присылает апдейт POST-запросом; сервер кладёт его в ограниченную
+# очередь и сразу отвечает, а обработку ведут N задач-обработчиков.
+#
+# Нажатие кнопки: ответ на callback (answerCallbackQuery — погасить «часики»)
+# уходит прямо в теле ответа на вебхук, а не отдельным HTTP-запросом к Bot API.
+# Сервер ждёт до WEBHOOK_ANSWER_WINDOW, пока хэндлер вызовет callback.answer():
+#   * успел — его ответ (с текстом/alert) возвращается инлайн, запроса нет;
+#   * не успел — инлайн уходит пустой ответ, а поздний пустой callback.answer()
+#     хэндлера становится no-op (InlineAnswers). Поздний ответ с текстом всё же
+#     отправляется обычным запросом — Telegram может его отклонить.
+#
+# Запуск: WEBHOOK_URL=https://host/tg/webhook python main.py
+
+from __future__ import annotations
+import asyncio
+import hmac
+import logging
+from typing import Any, Dict, Optional
+
+from aiohttp import web
+from aiogram import Bot, Dispatcher
+from aiogram.client.session.middlewares.base import BaseRequestMiddleware, NextRequestMiddlewareType
+from aiogram.methods import AnswerCallbackQuery, Response, TelegramMethod
+from aiogram.types import Update
+
+from cache import TTLCache
+from config import (
+    CLIENT_BOT_TOKEN, WEBHOOK_URL, WEBHOOK_PATH, WEBHOOK_HOST, WEBHOOK_PORT, WEBHOOK_SECRET,
+    WEBHOOK_QUEUE, WEBHOOK_CONCURRENCY, WEBHOOK_ANSWER_WINDOW,
+)
+
+log = logging.getLogger("client_bot.webhook")
+
+_SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+def method_payload(method: TelegramMethod) -> Dict[str, Any]:
+    """Метод Bot API как JSON-ответ на вебхук: {"method": ..., поля...}."""
+    payload = method.model_dump(exclude_none=True)
+    payload["method"] = method.__api_method__
+    return payload
+
+
+class InlineAnswers(BaseRequestMiddleware):
+    """
+    Middleware сессии бота: перехватывает answerCallbackQuery для callback,
+    ответ на который уходит в теле вебхука.
+    """
+
+    def __init__(self):
+        self._pending: Dict[str, asyncio.Future] = {}
+        # уже отвеченные инлайн — пустой повторный ответ хэндлера не отправляем
+        self._answered = TTLCache(maxsize=10000, ttl=60)
+
+    def expect(self, callback_id: str) -> asyncio.Future:
+        fut = asyncio.get_running_loop().create_future()
+        self._pending[callback_id] = fut
+        return fut
+
+    def release(self, callback_id: str) -> None:
+        """Хэндлер закончил без callback.answer(): вебхуку не нужно ждать окно до конца."""
+        fut = self._pending.pop(callback_id, None)
+        if fut is not None and not fut.done():
+            fut.set_result(None)
+
+    async def wait(self, callback_id: str, fut: asyncio.Future, window: float) -> AnswerCallbackQuery:
+        """Ответ хэндлера, если он успел за window, иначе пустой ответ."""
+        try:
+            method = await asyncio.wait_for(asyncio.shield(fut), window)
+        except asyncio.TimeoutError:
+            method = None
+        self._pending.pop(callback_id, None)
+        self._answered.set(callback_id, True)
+        return method or AnswerCallbackQuery(callback_query_id=callback_id)
+
+    async def __call__(
+        self,
+        make_request: NextRequestMiddlewareType,
+        bot: Bot,
+        method: TelegramMethod,
+    ) -> Response:
+        if isinstance(method, AnswerCallbackQuery):
+            cid = method.callback_query_id
+            fut = self._pending.pop(cid, None)
+            if fut is not None and not fut.done():
+                fut.set_result(method)  # уйдёт в ответе на вебхук
+                return Response[bool](ok=True, result=True)
+            if self._answered.get(cid) and not (method.text or method.show_alert or method.url):
+                return Response[bool](ok=True, result=True)  # пустой ответ уже отдан инлайн
+        return await make_request(bot, method)
+
+
+class WebhookServer:
+    """aiohttp-приложение: POST с апдейтом → очередь → обработчики."""
+
+    def __init__(
+        self,
+        dp: Dispatcher,
+        bot: Bot,
+        secret: str = WEBHOOK_SECRET,
+        queue_size: int = WEBHOOK_QUEUE,
+        concurrency: int = WEBHOOK_CONCURRENCY,
+        answer_window: float = WEBHOOK_ANSWER_WINDOW,
+    ):
+        self.dp, self.bot = dp, bot
+        self.secret = secret
+        self.concurrency = concurrency
+        self.answer_window = answer_window
+        self.answers = InlineAnswers()
+        bot.session.middleware(self.answers)
+        self._queue: asyncio.Queue[Update] = asyncio.Queue(maxsize=queue_size)
+        self._workers: list[asyncio.Task] = []
+
+    def app(self, path: str = WEBHOOK_PATH) -> web.Application:
+        app = web.Application()
+        app.router.add_post(path, self.handle)
+        app.on_startup.append(self._start)
+        app.on_shutdown.append(self._stop)
+        return app
+
+    async def handle(self, request: web.Request) -> web.Response:
+        if self.secret and not hmac.compare_digest(request.headers.get(_SECRET_HEADER, ""), self.secret):
+            return web.Response(status=401)
+        update = Update.model_validate(await request.json(), context={"bot": self.bot})
+
+        fut: Optional[asyncio.Future] = None
+        cb = update.callback_query
+        if cb is not None:
+            fut = self.answers.expect(cb.id)
+        try:
+            self._queue.put_nowait(update)
+        except asyncio.QueueFull:
+            # не ответили 2xx — Telegram повторит доставку позже
+            if cb is not None:
+                self.answers.release(cb.id)
+            log.warning("Webhook queue full, update %s deferred", update.update_id)
+            return web.Response(status=503)
+
+        if fut is None:
+            return web.Response()
+        method = await self.answers.wait(cb.id, fut, self.answer_window)
+        return web.json_response(method_payload(method))
+
+    async def _work(self) -> None:
+        while True:
+            update = await self._queue.get()
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception:
+                log.exception("Update %s failed", update.update_id)
+            finally:
+                if update.callback_query is not None:
+                    self.answers.release(update.callback_query.id)
+                self._queue.task_done()
+
+    async def _start(self, _app: web.Application) -> None:
+        self._workers = [asyncio.create_task(self._work()) for _ in range(self.concurrency)]
+
+    async def _stop(self, _app: web.Application) -> None:
+        await self._queue.join()  # дорабатываем принятые: Telegram их уже не повторит
+        for task in self._workers:
+            task.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+
+
+async def run_webhook() -> None:
+    from bots.client_bot import build_dispatcher, prepare_runtime
+
+    bot = Bot(token=CLIENT_BOT_TOKEN, parse_mode="HTML")
+    dp = build_dispatcher()
+    tasks = await prepare_runtime()  # noqa: F841 — держим ссылки на фоновые задачи
+    server = WebhookServer(dp, bot)
+
+    runner = web.AppRunner(server.app())
+    await runner.setup()
+    await web.TCPSite(runner, WEBHOOK_HOST, WEBHOOK_PORT).start()
+    await bot.set_webhook(
+        WEBHOOK_URL,
+        secret_token=WEBHOOK_SECRET or None,
+        allowed_updates=dp.resolve_used_update_types(),
+        drop_pending_updates=True,
+    )
+    log.info("Webhook %s on %s:%d", WEBHOOK_URL, WEBHOOK_HOST, WEBHOOK_PORT)
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+        await dp.storage.close()  # PgStorage дописывает накопленное
+        await bot.session.close()
@@ -27,6 +27,84 @@ DB_NAME = os.getenv("DB_NAME", "services")
 DB_USER = os.getenv("DB_USER", "")
 DB_PASSWORD = os.getenv("DB_PASSWORD", "")
 DB_SSLMODE = os.getenv("DB_SSLMODE", "require")
+# Пул соединений (repo/db.py): размеры (min_size открываются на старте), кэш prepared statements
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "2"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_STATEMENT_CACHE = int(os.getenv("DB_STATEMENT_CACHE", "256"))
+DB_COMMAND_TIMEOUT = float(os.getenv("DB_COMMAND_TIMEOUT", "10"))
+DB_CONNECT_TIMEOUT = float(os.getenv("DB_CONNECT_TIMEOUT", "5"))
+# Проверка SELECT 1 раз в N сек; ошибок связи подряд до отключения пула; макс. пауза переподключения
+DB_HEALTH_INTERVAL = float(os.getenv("DB_HEALTH_INTERVAL", "15"))
+DB_FAILURE_THRESHOLD = int(os.getenv("DB_FAILURE_THRESHOLD", "3"))
+DB_RECONNECT_MAX = float(os.getenv("DB_RECONNECT_MAX", "60"))
+# Кэш id в repo.orders (service_id, tg_id→user_id, user_id→customer_id)
+REPO_CACHE_SIZE = int(os.getenv("REPO_CACHE_SIZE", "10000"))
+REPO_CACHE_TTL = float(os.getenv("REPO_CACHE_TTL", "3600"))
+# Групповая запись заказов: окно накопления, сек (0 — каждый заказ сразу), и размер пакета
+ORDER_BATCH_WINDOW = float(os.getenv("ORDER_BATCH_WINDOW", "0.005"))
+ORDER_BATCH_MAX = int(os.getenv("ORDER_BATCH_MAX", "100"))
+# Локальный журнал заказов при недоступной БД (SQLite); пусто — data/orders_outbox.sqlite3
+ORDER_OUTBOX_PATH = os.getenv("ORDER_OUTBOX_PATH", "")
+# Как часто переносить журнал в БД, сек, и сколько заказов за пачку
+OUTBOX_REPLAY_INTERVAL = float(os.getenv("OUTBOX_REPLAY_INTERVAL", "5"))
+OUTBOX_BATCH = int(os.getenv("OUTBOX_BATCH", "100"))
+# Сколько подтверждение ждёт id заказа из БД после записи в журнал, сек (0 — не ждёт вовсе)
+OUTBOX_CONFIRM_WAIT = float(os.getenv("OUTBOX_CONFIRM_WAIT", "0.3"))
+
+# === PRICING ===
+# Предрасчитанная матрица цен (python price_matrix.py); пусто — data/price_matrix.bin
+PRICE_MATRIX_PATH = os.getenv("PRICE_MATRIX_PATH", "")
+# Период проверки data/*.csv на изменения, сек (0 — без горячей перезагрузки)
+DATA_RELOAD_INTERVAL = float(os.getenv("DATA_RELOAD_INTERVAL", "10"))
+# TTL кэша тарифов из БД (vehicle_zone_prices/service_offers), сек (0 — только CSV)
+TARIFF_DB_TTL = float(os.getenv("TARIFF_DB_TTL", "300"))
+# Кэш котировок (LRU + TTL)
+QUOTE_CACHE_SIZE = int(os.getenv("QUOTE_CACHE_SIZE", "4096"))
+QUOTE_CACHE_TTL = float(os.getenv("QUOTE_CACHE_TTL", "600"))
+# Снимок разобранных справочников для быстрого старта; пусто — data/reference.snapshot
+REFERENCE_SNAPSHOT_PATH = os.getenv("REFERENCE_SNAPSHOT_PATH", "")
+REFERENCE_SNAPSHOT = (os.getenv("REFERENCE_SNAPSHOT") or "1") == "1"
+
+# === FSM ===
+# memory — в памяти процесса с вытеснением по простою (теряется при рестарте);
+# pg — uslugicuba.fsm_state, переживает рестарт (сначала migrations/001_fsm_state.sql)
+FSM_STORAGE = os.getenv("FSM_STORAGE", "memory").lower()
+# Окно накопления записей FSM перед пакетной записью в БД, сек (0 — писать сразу)
+FSM_FLUSH_INTERVAL = float(os.getenv("FSM_FLUSH_INTERVAL", "0.2"))
+FSM_CACHE_SIZE = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+# Сколько хранить брошенный диалог без обращений, сек (0 — вечно); для pg — без записей
+FSM_IDLE_TTL = float(os.getenv("FSM_IDLE_TTL", "86400"))
+FSM_SWEEP_INTERVAL = float(os.getenv("FSM_SWEEP_INTERVAL", "60"))
+
+# === I18N ===
+# Сколько пользователей держать в кэше выбранного языка (LRU)
+LANG_CACHE_SIZE = int(os.getenv("LANG_CACHE_SIZE", "10000"))
+
+# === THROTTLING ===
+# Апдейтов в секунду на пользователя в среднем и подряд (token bucket); 0 — без ограничения
+THROTTLE_RATE = float(os.getenv("THROTTLE_RATE", "3"))
+THROTTLE_BURST = int(os.getenv("THROTTLE_BURST", "5"))
+# Окно, в котором одинаковое нажатие кнопки считается повтором, сек
+THROTTLE_DEDUP_WINDOW = float(os.getenv("THROTTLE_DEDUP_WINDOW", "1.0"))
+
+# === CLUSTER ===
+# Процессов-воркеров (bots/cluster.py); 1 — обычный polling в одном процессе
+BOT_WORKERS = int(os.getenv("BOT_WORKERS", "1"))
+# Очередь апдейтов на воркер; при заполнении приёмник ждёт
+BOT_WORKER_QUEUE = int(os.getenv("BOT_WORKER_QUEUE", "1000"))
+
+# === WEBHOOK ===
+# Публичный https-адрес вебхука; пусто — long polling (bots/webhook.py)
+WEBHOOK_URL = os.getenv("WEBHOOK_URL", "")
+WEBHOOK_PATH = os.getenv("WEBHOOK_PATH", "/tg/webhook")
+WEBHOOK_HOST = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+WEBHOOK_PORT = int(os.getenv("WEBHOOK_PORT", "8080"))
+# Передаётся в setWebhook и сверяется с заголовком X-Telegram-Bot-Api-Secret-Token
+WEBHOOK_SECRET = os.getenv("WEBHOOK_SECRET", "")
+WEBHOOK_QUEUE = int(os.getenv("WEBHOOK_QUEUE", "1000"))
+WEBHOOK_CONCURRENCY = int(os.getenv("WEBHOOK_CONCURRENCY", "64"))
+# Сколько ждать callback.answer() хэндлера, чтобы вернуть его в ответе на вебхук, сек
+WEBHOOK_ANSWER_WINDOW = float(os.getenv("WEBHOOK_ANSWER_WINDOW", "0.1"))
 
 assert CLIENT_BOT_TOKEN, "CLIENT_BOT_TOKEN is missing in .env"
 
@@ -44,8 +122,56 @@ config = SimpleNamespace(
     DB_USER=DB_USER,
     DB_PASSWORD=DB_PASSWORD,
     DB_SSLMODE=DB_SSLMODE,
+    DB_POOL_MIN=DB_POOL_MIN,
+    DB_POOL_MAX=DB_POOL_MAX,
+    DB_STATEMENT_CACHE=DB_STATEMENT_CACHE,
+    DB_COMMAND_TIMEOUT=DB_COMMAND_TIMEOUT,
+    DB_CONNECT_TIMEOUT=DB_CONNECT_TIMEOUT,
+    DB_HEALTH_INTERVAL=DB_HEALTH_INTERVAL,
+    DB_FAILURE_THRESHOLD=DB_FAILURE_THRESHOLD,
+    DB_RECONNECT_MAX=DB_RECONNECT_MAX,
+    REPO_CACHE_SIZE=REPO_CACHE_SIZE,
+    REPO_CACHE_TTL=REPO_CACHE_TTL,
+    ORDER_BATCH_WINDOW=ORDER_BATCH_WINDOW,
+    ORDER_BATCH_MAX=ORDER_BATCH_MAX,
+    ORDER_OUTBOX_PATH=ORDER_OUTBOX_PATH,
+    OUTBOX_REPLAY_INTERVAL=OUTBOX_REPLAY_INTERVAL,
+    OUTBOX_BATCH=OUTBOX_BATCH,
+    OUTBOX_CONFIRM_WAIT=OUTBOX_CONFIRM_WAIT,
     # publisher
     ORDERS_CHANNEL_ID=ORDERS_CHANNEL_ID,
     PUBLISH_MAX_RETRIES=PUBLISH_MAX_RETRIES,
     PUBLISH_BACKOFFS=PUBLISH_BACKOFFS,
+    # pricing
+    PRICE_MATRIX_PATH=PRICE_MATRIX_PATH,
+    DATA_RELOAD_INTERVAL=DATA_RELOAD_INTERVAL,
+    TARIFF_DB_TTL=TARIFF_DB_TTL,
+    QUOTE_CACHE_SIZE=QUOTE_CACHE_SIZE,
+    QUOTE_CACHE_TTL=QUOTE_CACHE_TTL,
+    REFERENCE_SNAPSHOT_PATH=REFERENCE_SNAPSHOT_PATH,
+    REFERENCE_SNAPSHOT=REFERENCE_SNAPSHOT,
+    # fsm
+    FSM_STORAGE=FSM_STORAGE,
+    FSM_FLUSH_INTERVAL=FSM_FLUSH_INTERVAL,
+    FSM_CACHE_SIZE=FSM_CACHE_SIZE,
+    FSM_IDLE_TTL=FSM_IDLE_TTL,
+    FSM_SWEEP_INTERVAL=FSM_SWEEP_INTERVAL,
+    # i18n
+    LANG_CACHE_SIZE=LANG_CACHE_SIZE,
+    # throttling
+    THROTTLE_RATE=THROTTLE_RATE,
+    THROTTLE_BURST=THROTTLE_BURST,
+    THROTTLE_DEDUP_WINDOW=THROTTLE_DEDUP_WINDOW,
+    # cluster
+    BOT_WORKERS=BOT_WORKERS,
+    BOT_WORKER_QUEUE=BOT_WORKER_QUEUE,
+    # webhook
+    WEBHOOK_URL=WEBHOOK_URL,
+    WEBHOOK_PATH=WEBHOOK_PATH,
+    WEBHOOK_HOST=WEBHOOK_HOST,
+    WEBHOOK_PORT=WEBHOOK_PORT,
+    WEBHOOK_SECRET=WEBHOOK_SECRET,
+    WEBHOOK_QUEUE=WEBHOOK_QUEUE,
+    WEBHOOK_CONCURRENCY=WEBHOOK_CONCURRENCY,
+    WEBHOOK_ANSWER_WINDOW=WEBHOOK_ANSWER_WINDOW,
 )
\ No newline at end of file
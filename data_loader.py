@@ -1,46 +1,154 @@
 # data_loader.py
 from __future__ import annotations
+import asyncio
 import csv
+import hashlib
+import logging
+import os
+import pickle
+import re
+import sys
+import time
 from pathlib import Path
-from typing import Dict, List, Tuple
+from typing import Any, Callable, Dict, List, NamedTuple, Tuple
 
 # Папка со справочниками
-from pathlib import Path
 DATA_DIR = Path(__file__).resolve().parent / "data"
 
 assert (DATA_DIR / "locations.csv").exists(), f"locations.csv not found at {DATA_DIR}"
 assert (DATA_DIR / "prices.csv").exists(), f"prices.csv not found at {DATA_DIR}"
 
 
-# Кэши, чтобы не читать файл при каждом вызове
-_locations_cache: Dict[str, List[Tuple[str, str]]] | None = None
+log = logging.getLogger("data_loader")
+
+# Кэш, чтобы не читать файл при каждом вызове
 _prices_cache: List[dict] | None = None
 
 
+# ───────────── Реестр локаций ─────────────
+
+def norm_name(s: str) -> str:
+    """Ключ для поиска по названию: убираем всё, кроме [A-Za-z0-9_], и casefold."""
+    return re.sub(r"[^\w]+", "", (s or "")).casefold()
+
+
+class Location(NamedTuple):
+    """Строка locations.csv. Кортеж: без __dict__, неизменяемый."""
+    idx:  int   # позиция в реестре (меняется при правке CSV — не для callback_data)
+    id:   str
+    kind: str   # airport | hotel | restaurant | ...
+    name: str
+    zone: str   # A/B/C/D (upper)
+    code: str   # тарифный код: VRA/HAV для аэропорта, иначе зона
+
+
+def location_key(loc_id: str) -> str:
+    """
+    Короткий устойчивый ключ точки для callback_data: хэш id, а не позиция в
+    реестре — кнопка, отправленная до перезагрузки CSV, ведёт на ту же точку
+    (id бывают длиннее лимита callback_data в 64 байта).
+    """
+    return hashlib.blake2b(loc_id.encode(), digest_size=5).hexdigest()
+
+
+class LocationRegistry:
+    """
+    Единственный разбор data/locations.csv на процесс: неизменяемые записи
+    и индексы по id, нормализованному названию, kind и зоне — всё O(1).
+    При правке CSV строится новый реестр и подменяется целиком.
+    """
+    __slots__ = ("records", "_by_id", "_by_key", "_by_name", "_by_kind", "_by_zone")
+
+    def __init__(self, records: Tuple[Location, ...]):
+        self.records = records
+        by_id: Dict[str, Location] = {}
+        by_name: Dict[str, List[Location]] = {}
+        by_kind: Dict[str, List[Location]] = {}
+        by_zone: Dict[str, List[Location]] = {}
+        for loc in records:
+            by_id.setdefault(loc.id, loc)
+            by_name.setdefault(norm_name(loc.name), []).append(loc)
+            by_kind.setdefault(loc.kind, []).append(loc)
+            if loc.zone:
+                by_zone.setdefault(loc.zone, []).append(loc)
+        self._by_id = by_id
+        self._by_key = {location_key(loc_id): loc for loc_id, loc in by_id.items()}
+        # списки замораживаем в кортежи: наружу отдаём без копирования
+        self._by_name = {k: tuple(v) for k, v in by_name.items()}
+        self._by_kind = {k: tuple(v) for k, v in by_kind.items()}
+        self._by_zone = {k: tuple(v) for k, v in by_zone.items()}
+
+    @classmethod
+    def from_csv(cls, path: Path | None = None) -> "LocationRegistry":
+        records: List[Location] = []
+        with (path or DATA_DIR / "locations.csv").open("r", encoding="utf-8") as f:
+            for row in csv.DictReader(f):
+                _id  = (row.get("id")   or "").strip()
+                kind = (row.get("kind") or "").strip().lower()
+                zone = (row.get("zone") or "").strip().upper()
+                if not _id:
+                    continue
+                code = _id.upper() if kind == "airport" else zone
+                records.append(Location(len(records), _id, kind, (row.get("name") or "").strip(), zone, code))
+        return cls(tuple(records))
+
+    def __len__(self) -> int:
+        return len(self.records)
+
+    def __iter__(self):
+        return iter(self.records)
+
+    def __getitem__(self, idx: int) -> Location:
+        return self.records[idx]
+
+    def get(self, loc_id: str | None) -> Location | None:
+        return self._by_id.get((loc_id or "").strip())
+
+    def by_key(self, key: str, kinds: Tuple[str, ...] | None = None) -> Location | None:
+        """По location_key из callback_data; None — точки больше нет или она не того вида."""
+        loc = self._by_key.get(key)
+        if loc is None or (kinds is not None and loc.kind not in kinds):
+            return None
+        return loc
+
+    def by_name(self, name: str, kind: str | None = None) -> Location | None:
+        """По названию (без учёта регистра/пунктуации); при омонимах предпочитаем kind."""
+        found = self._by_name.get(norm_name(name), ())
+        for loc in found:
+            if kind is None or loc.kind == kind:
+                return loc
+        return found[0] if found else None
+
+    def of_kind(self, kind: str) -> Tuple[Location, ...]:
+        return self._by_kind.get(kind, ())
+
+    def in_zone(self, zone: str) -> Tuple[Location, ...]:
+        return self._by_zone.get((zone or "").upper(), ())
+
+
+_REGISTRY: LocationRegistry | None = None
+
+
+def get_registry() -> LocationRegistry:
+    """Общий для всех модулей реестр локаций."""
+    global _REGISTRY
+    if _REGISTRY is None:
+        _REGISTRY = LocationRegistry.from_csv()
+    return _REGISTRY
+
+
 def load_locations() -> Dict[str, List[Tuple[str, str]]]:
     """
-    Загружает locations.csv
-    Возвращает словарь вида:
+    Локации по kind из реестра:
       {
         "airport": [("vra", "Varadero Airport"), ("hav","Jose Marti Airport"), ...],
         "hotel":   [("ibv","Iberostar Varadero"), ...],
         "city":    [("havana","Havana"), ...],
       }
     """
-    global _locations_cache
-    if _locations_cache is not None:
-        return _locations_cache
-
     res: Dict[str, List[Tuple[str, str]]] = {}
-    fp = DATA_DIR / "locations.csv"
-    with fp.open("r", encoding="utf-8") as f:
-        reader = csv.DictReader(f)
-        for row in reader:
-            kind = row["kind"].strip()
-            _id = row["id"].strip()
-            name = row["name"].strip()
-            res.setdefault(kind, []).append((_id, name))
-    _locations_cache = res
+    for loc in get_registry():
+        res.setdefault(loc.kind, []).append((loc.id, loc.name))
     return res
 
 
@@ -78,3 +186,192 @@ def load_prices() -> List[dict]:
             })
     _prices_cache = prices
     return prices
+
+
+# ───────────── Горячая перезагрузка справочников ─────────────
+
+# Производные от CSV структуры: (name, build, install, snapshot)
+_references: List[Tuple[str, Callable[[Dict[str, Any]], Any], Callable[[Any], None], bool]] = []
+
+
+def register_reference(
+    name: str,
+    build: Callable[[Dict[str, Any]], Any],
+    install: Callable[[Any], None],
+    snapshot: bool = True,
+) -> None:
+    """
+    Регистрирует производный справочник для перезагрузки.
+      build(built) — строит новые данные с нуля (вызывается в фоновом потоке,
+                     не должен трогать текущие данные); built — уже построенные
+                     в этом проходе справочники по имени, напр. built["locations"];
+      install(obj) — подставляет готовые данные (синхронно, без await);
+      snapshot     — класть ли результат в снимок (см. warm_up); False для того,
+                     что не сериализуется pickle (mmap и т.п.).
+    """
+    _references.append((name, build, install, snapshot))
+
+
+def _build_all(built: Dict[str, Any] | None = None, timings: Dict[str, float] | None = None) -> Dict[str, Any]:
+    """Строит все справочники, кроме уже готовых в built (напр. из снимка)."""
+    built = dict(built or {})
+    for name, build, _install, _snapshot in list(_references):
+        if name in built:
+            continue
+        t0 = time.perf_counter()
+        built[name] = build(built)
+        if timings is not None:
+            timings[f"build:{name}"] = time.perf_counter() - t0
+    return built
+
+
+def _install_all(built: Dict[str, Any]) -> None:
+    # Один синхронный проход без await: корутины (котировки и т.п.) видят
+    # либо все старые данные, либо все новые — никогда наполовину.
+    for name, _build, install, _snapshot in _references:
+        if name in built:
+            install(built[name])
+
+
+def reload_reference_data() -> None:
+    """Синхронно перестраивает и подставляет все зарегистрированные справочники."""
+    _install_all(_build_all())
+
+
+def _install_registry(registry: LocationRegistry) -> None:
+    global _REGISTRY, _prices_cache
+    _REGISTRY = registry
+    _prices_cache = None  # перечитается лениво при следующем load_prices()
+
+
+register_reference("locations", lambda built: LocationRegistry.from_csv(), _install_registry)
+
+
+def _stamps() -> Tuple[Tuple[int, int], ...]:
+    res = []
+    for name in ("locations.csv", "prices.csv"):
+        st = (DATA_DIR / name).stat()
+        res.append((st.st_mtime_ns, st.st_size))
+    return tuple(res)
+
+
+async def watch_data_files(interval: float = 10.0, settle: float = 1.0) -> None:
+    """
+    Фоновая задача: следит за locations.csv / prices.csv и при изменении
+    перестраивает справочники в отдельном потоке, затем атомарно их подменяет.
+    Ошибка разбора оставляет в работе прежние данные.
+    """
+    stamps = _stamps()
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            cur = _stamps()
+        except OSError:
+            continue  # файл как раз подменяют
+        if cur == stamps:
+            continue
+        # ждём, пока файл допишут (mtime/size перестанут меняться)
+        await asyncio.sleep(settle)
+        try:
+            if _stamps() != cur:
+                continue
+            built = await asyncio.to_thread(_build_all)
+        except Exception:
+            log.exception("Reference data reload failed — keeping current data")
+            stamps = cur  # не повторяем до следующей правки файла
+            continue
+        _install_all(built)
+        stamps = cur
+        log.info("Reference data reloaded (%d indexes)", len(built))
+        if _snapshot_path is not None:
+            await asyncio.to_thread(_save_snapshot, _snapshot_path, _sources_digest(), built)
+
+
+# ───────────── Снимок справочников (быстрый старт) ─────────────
+#
+# Всё, что строится из CSV (реестр, таблица правил, поисковый индекс), один раз
+# сохраняется pickle-снимком рядом с CSV. На старте снимок берётся, если
+# совпал sha256 от содержимого CSV; иначе — обычный разбор и новый снимок.
+# Менять SNAPSHOT_VERSION при изменении формата этих структур.
+
+SNAPSHOT_VERSION = 2
+DEFAULT_SNAPSHOT_PATH = DATA_DIR / "reference.snapshot"
+
+_snapshot_path: Path | None = None  # задаётся warm_up(); None — снимки выключены
+
+
+def _sources_digest() -> str:
+    h = hashlib.sha256(f"v{SNAPSHOT_VERSION}:py{sys.version_info[0]}.{sys.version_info[1]}".encode())
+    for name in ("locations.csv", "prices.csv"):
+        h.update(name.encode())
+        h.update((DATA_DIR / name).read_bytes())
+    return h.hexdigest()
+
+
+def _load_snapshot(path: Path, digest: str) -> Dict[str, Any] | None:
+    """Справочники из снимка; None — снимка нет, он от других CSV или битый."""
+    try:
+        with path.open("rb") as f:
+            snap = pickle.load(f)
+    except FileNotFoundError:
+        return None
+    except Exception as e:
+        log.warning("Reference snapshot %s unreadable: %s — parsing CSV", path, e)
+        return None
+    if not isinstance(snap, dict) or snap.get("digest") != digest:
+        log.info("Reference snapshot %s is stale — parsing CSV", path)
+        return None
+    return snap["data"]
+
+
+def _save_snapshot(path: Path, digest: str, built: Dict[str, Any]) -> None:
+    data = {name: built[name] for name, _b, _i, snapshot in _references if snapshot and name in built}
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    try:
+        with tmp.open("wb") as f:
+            pickle.dump({"digest": digest, "data": data}, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp, path)  # атомарно, как и матрица цен
+    except Exception as e:
+        log.warning("Reference snapshot %s not saved: %s", path, e)
+
+
+def warm_up(snapshot_path: str | os.PathLike | None = None, use_snapshot: bool = True) -> Dict[str, float]:
+    """
+    Стартовый этап: поднимает все справочники до первого апдейта, чтобы первый
+    пользователь не платил за разбор CSV. Возвращает время этапов в секундах
+    и пишет его в лог.
+    """
+    global _snapshot_path
+    timings: Dict[str, float] = {}
+    t_start = time.perf_counter()
+
+    path = Path(snapshot_path or DEFAULT_SNAPSHOT_PATH) if use_snapshot else None
+    built: Dict[str, Any] | None = None
+    if path is not None:
+        t0 = time.perf_counter()
+        digest = _sources_digest()
+        timings["digest"] = time.perf_counter() - t0
+        t0 = time.perf_counter()
+        built = _load_snapshot(path, digest)
+        timings["snapshot_load"] = time.perf_counter() - t0
+
+    from_snapshot = built is not None
+    built = _build_all(built, timings)  # из снимка — только то, что не сериализуется
+
+    t0 = time.perf_counter()
+    _install_all(built)
+    timings["install"] = time.perf_counter() - t0
+
+    if path is not None and not from_snapshot:
+        t0 = time.perf_counter()
+        _save_snapshot(path, digest, built)
+        timings["snapshot_save"] = time.perf_counter() - t0
+    _snapshot_path = path
+
+    timings["total"] = time.perf_counter() - t_start
+    log.info(
+        "Reference data warm-up (%s): %s",
+        "snapshot" if from_snapshot else "csv",
+        ", ".join(f"{k}={v * 1000:.1f}ms" for k, v in timings.items()),
+    )
+    return timings
@@ -0,0 +1,24 @@
+# handlers/client/language.py — выбор языка интерфейса
+from aiogram import Router, F
+from aiogram.filters import Command
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery, Message
+
+from keyboards.client import language_keyboard
+from middlewares.i18n import set_user_lang
+
+router = Router()
+
+LANG_NAMES = {"ru": "🇷🇺 Русский", "en": "🇬🇧 English", "es": "🇪🇸 Español"}
+
+
+@router.message(Command("lang"))
+async def cmd_lang(message: Message):
+    await message.answer("🌐 Язык / Language / Idioma:", reply_markup=language_keyboard())
+
+
+@router.callback_query(F.data.startswith("lang_"))
+async def choose_lang(callback: CallbackQuery, state: FSMContext):
+    lang = await set_user_lang(callback.from_user.id, callback.data.split("_", 1)[1], state)
+    await callback.message.edit_text(f"✅ {LANG_NAMES.get(lang, lang)}")
+    await callback.answer()
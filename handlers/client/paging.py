@@ -0,0 +1,44 @@
+# handlers/client/paging.py — навигация по постраничным спискам (keyboards/paging.py)
+from contextlib import suppress
+
+from aiogram import Router, F
+from aiogram.exceptions import TelegramBadRequest
+from aiogram.fsm.context import FSMContext
+from aiogram.types import CallbackQuery
+
+from keyboards.paging import alphabet_keyboard, get_list, page_keyboard
+
+router = Router()
+
+
+# Меняем только разметку (editMessageReplyMarkup): текст сообщения не пересылаем
+@router.callback_query(F.data.startswith("pg|"))
+async def turn_page(callback: CallbackQuery, state: FSMContext):
+    try:
+        _pg, name, prefix, page = callback.data.split("|")
+        page = int(page)
+    except ValueError:
+        return await callback.answer()
+    spec = get_list(name)
+    if spec is None:
+        return await callback.answer()
+    items = await spec.source(prefix, state)
+    with suppress(TelegramBadRequest):  # "message is not modified" — та же страница
+        await callback.message.edit_reply_markup(reply_markup=page_keyboard(name, prefix, items, page))
+    await callback.answer()
+
+
+@router.callback_query(F.data.startswith("abc|"))
+async def open_alphabet(callback: CallbackQuery, state: FSMContext):
+    try:
+        _abc, name, prefix = callback.data.split("|")
+    except ValueError:
+        return await callback.answer()
+    spec = get_list(name)
+    if spec is None:
+        return await callback.answer()
+    kb = alphabet_keyboard(name, prefix, await spec.source(prefix, state))
+    if kb is not None:
+        with suppress(TelegramBadRequest):
+            await callback.message.edit_reply_markup(reply_markup=kb)
+    await callback.answer()
@@ -12,49 +12,24 @@ from keyboards.client import (
 from keyboards.locations import (
     pickup_category_keyboard, dropoff_category_keyboard,
     hotel_list_keyboard, restaurant_list_keyboard,
-    HOTEL_NAMES, RESTAURANT_NAMES,
-    AIRPORT_NAMES, airport_list_keyboard
+    airport_list_keyboard, location_by_key,
 )
 from handlers.client.taxi_flow import TaxiOrder
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from pricing import quote_price            # (импорт вверху файла, если ещё нет)
-from keyboards.locations import HOTEL_NAMES, RESTAURANT_NAMES, AIRPORT_NAMES
-import os, csv, re
-from functools import lru_cache
+from pricing import quote_price_cached
+from keyboards.prebuilt import prebuilt
+from data_loader import get_registry
 
 router = Router()
 
-def _norm(s: str) -> str:
-    # убираем всё, кроме [A-Za-z0-9_], и приводим к нижнему регистру
-    return re.sub(r"[^\w]+", "", (s or "")).casefold()
-
-@lru_cache
-def _loc_by_name() -> dict[str, tuple[str, str, str]]:
-    """
-    Читает data/locations.csv и строит индекс:
-      normalized(name) -> (kind, id, original_name)
-    """
-    base = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
-    path = os.path.join(base, "data", "locations.csv")
-    idx = {}
-    with open(path, encoding="utf-8") as f:
-        for row in csv.DictReader(f):
-            nm = (row.get("name") or "").strip()
-            if not nm:
-                continue
-            idx[_norm(nm)] = (row.get("kind", ""), row.get("id", ""), nm)
-    return idx
-
 def name_to_kind_id(display_name: str, fallback_kind: str) -> tuple[str, str]:
     """
     Возвращает (kind, id) по названию из клавиатуры.
     Если не нашли — вернём (fallback_kind, "").
     """
-    idx = _loc_by_name()
-    key = _norm(display_name)
-    if key in idx:
-        kind, _id, _ = idx[key]
-        return (kind or fallback_kind), _id
+    loc = get_registry().by_name(display_name, fallback_kind or None)
+    if loc is not None:
+        return (loc.kind or fallback_kind), loc.id
     return fallback_kind, ""
 
 def to_place_dict(kind: str, _id: str, name: str) -> dict:
@@ -106,16 +81,14 @@ async def pickup_airports(callback: CallbackQuery, state: FSMContext, _: dict):
 
 @router.callback_query(F.data.startswith("pickup_airport_"))
 async def pickup_selected_airport(callback: CallbackQuery, state: FSMContext, _: dict):
-    try:
-        index = int(callback.data.split("_")[-1])
-        pickup_location = AIRPORT_NAMES[index]
-    except (IndexError, ValueError):
+    loc = location_by_key(callback.data.rsplit("_", 1)[-1], "airport")
+    if loc is None:
         await callback.answer("Ошибка выбора аэропорта", show_alert=True)
         return
+    pickup_location = loc.name
 
     pickup_txt = _('pickup_chosen')
-    k, i = name_to_kind_id(pickup_location, "airport")
-    await state.update_data(pickup=to_place_dict(k, i, pickup_location))
+    await state.update_data(pickup=to_place_dict(loc.kind, loc.id, pickup_location))
 
     await callback.message.answer(f"✅ {pickup_txt}: {pickup_location}")
     await callback.message.answer(_("dropoff_msg"), reply_markup=dropoff_category_keyboard())
@@ -132,16 +105,14 @@ async def dropoff_airports(callback: CallbackQuery, state: FSMContext, _: dict):
 
 @router.callback_query(F.data.startswith("dropoff_airport_"))
 async def dropoff_selected_airport(callback: CallbackQuery, state: FSMContext, _: dict):
-    try:
-        index = int(callback.data.split("_")[-1])
-        dropoff_location = AIRPORT_NAMES[index]
-    except (IndexError, ValueError):
+    loc = location_by_key(callback.data.rsplit("_", 1)[-1], "airport")
+    if loc is None:
         await callback.answer("Ошибка выбора аэропорта", show_alert=True)
         return
+    dropoff_location = loc.name
 
     dropoff_txt = _('dropoff_chosen')
-    k, i = name_to_kind_id(dropoff_location, "airport")
-    await state.update_data(dropoff=to_place_dict(k, i, dropoff_location))
+    await state.update_data(dropoff=to_place_dict(loc.kind, loc.id, dropoff_location))
 
     await callback.message.answer(f"✅ {dropoff_txt}: {dropoff_location}")
     await callback.message.answer(_("choose_date"), reply_markup=date_selection_keyboard(_))
@@ -164,16 +135,14 @@ async def pickup_restaurants(callback: CallbackQuery, state: FSMContext, _: dict
 
 @router.callback_query(F.data.startswith("pickup_hotel_"))
 async def pickup_selected_hotel(callback: CallbackQuery, state: FSMContext, _: dict):
-    try:
-        index = int(callback.data.split("_")[-1])
-        pickup_location = HOTEL_NAMES[index]
-    except (IndexError, ValueError):
+    loc = location_by_key(callback.data.rsplit("_", 1)[-1], "hotel")
+    if loc is None:
         await callback.answer("Ошибка выбора отеля", show_alert=True)
         return
+    pickup_location = loc.name
 
     pickup_txt = _('pickup_chosen')
-    k, i = name_to_kind_id(pickup_location, "hotel")
-    await state.update_data(pickup=to_place_dict(k, i, pickup_location))
+    await state.update_data(pickup=to_place_dict(loc.kind, loc.id, pickup_location))
 
     await callback.message.answer(f"✅ {pickup_txt}: {pickup_location}")
     await callback.message.answer(_("dropoff_msg"), reply_markup=dropoff_category_keyboard())
@@ -183,18 +152,16 @@ async def pickup_selected_hotel(callback: CallbackQuery, state: FSMContext, _: d
 
 @router.callback_query(F.data.startswith("pickup_rest_"))
 async def pickup_selected_restaurant(callback: CallbackQuery, state: FSMContext, _: dict):
-    try:
-        index = int(callback.data.split("_")[-1])
-        pickup_location = RESTAURANT_NAMES[index]
-    except (IndexError, ValueError):
+    loc = location_by_key(callback.data.rsplit("_", 1)[-1], "restaurant")
+    if loc is None:
         await callback.answer("Ошибка выбора ресторана", show_alert=True)
         return
+    pickup_location = loc.name
 
     pickup_txt = _('pickup_chosen')
 
     # сохраняем в state сразу (kind, id, name)
-    k, i = name_to_kind_id(pickup_location, "restaurant")
-    await state.update_data(pickup=to_place_dict(k, i, pickup_location))
+    await state.update_data(pickup=to_place_dict(loc.kind, loc.id, pickup_location))
 
     await callback.message.answer(f"✅ {pickup_txt}: {pickup_location}")
     await callback.message.answer(_("dropoff_msg"), reply_markup=dropoff_category_keyboard())
@@ -218,16 +185,14 @@ async def dropoff_restaurants(callback: CallbackQuery, state: FSMContext, _: dic
 
 @router.callback_query(F.data.startswith("dropoff_hotel_"))
 async def dropoff_selected_hotel(callback: CallbackQuery, state: FSMContext, _: dict):
-    try:
-        index = int(callback.data.split("_")[-1])
-        dropoff_location = HOTEL_NAMES[index]
-    except (IndexError, ValueError):
+    loc = location_by_key(callback.data.rsplit("_", 1)[-1], "hotel")
+    if loc is None:
         await callback.answer("Ошибка выбора отеля", show_alert=True)
         return
+    dropoff_location = loc.name
 
     dropoff_txt = _('dropoff_chosen')
-    k, i = name_to_kind_id(dropoff_location, "hotel")
-    await state.update_data(dropoff=to_place_dict(k, i, dropoff_location))
+    await state.update_data(dropoff=to_place_dict(loc.kind, loc.id, dropoff_location))
 
     await callback.message.answer(f"✅ {dropoff_txt}: {dropoff_location}")
     await callback.message.answer(_("choose_date"), reply_markup=date_selection_keyboard(_))
@@ -237,18 +202,16 @@ async def dropoff_selected_hotel(callback: CallbackQuery, state: FSMContext, _:
 
 @router.callback_query(F.data.startswith("dropoff_rest_"))
 async def dropoff_selected_restaurant(callback: CallbackQuery, state: FSMContext, _: dict):
-    try:
-        index = int(callback.data.split("_")[-1])
-        dropoff_location = RESTAURANT_NAMES[index]
-    except (IndexError, ValueError):
+    loc = location_by_key(callback.data.rsplit("_", 1)[-1], "restaurant")
+    if loc is None:
         await callback.answer("Ошибка выбора ресторана", show_alert=True)
         return
+    dropoff_location = loc.name
 
     dropoff_txt = _('dropoff_chosen')
 
     # ✅ сохраняем В ПРАВИЛЬНОМ ВИДЕ: dict с kind/id/name
-    k, i = name_to_kind_id(dropoff_location, "restaurant")
-    await state.update_data(dropoff=to_place_dict(k, i, dropoff_location))
+    await state.update_data(dropoff=to_place_dict(loc.kind, loc.id, dropoff_location))
 
     await callback.message.answer(f"✅ {dropoff_txt}: {dropoff_location}")
     await callback.message.answer(_("choose_date"), reply_markup=date_selection_keyboard(_))
@@ -332,14 +295,14 @@ async def handle_minute_selection(callback: CallbackQuery, state: FSMContext, _:
     # Считаем цену строго по id↔id
     when_hhmm = f"{hour}:{minute}"
     try:
-        price, payload = quote_price(
+        price_key, price, payload = quote_price_cached(
             service="taxi",
             from_kind=from_kind, from_id=from_id,
             to_kind=to_kind,     to_id=to_id,
             when_hhmm=when_hhmm,
             options=data.get("options", {}),
         )
-        await state.update_data(price_quote=price, price_payload=payload)
+        await state.update_data(price_quote=price, price_payload=payload, price_key=price_key)
         price_line = f"💵 Цена: {price} USD\n"
     except Exception:
         price_line = "💵 Цена: —\n"
@@ -366,12 +329,12 @@ async def handle_minute_selection(callback: CallbackQuery, state: FSMContext, _:
 
     confirm_btn = _("confirm_order_btn")
     cancel_btn  = _("cancel")
-    confirm_kb  = InlineKeyboardMarkup(
+    confirm_kb  = prebuilt(("confirm_order", confirm_btn, cancel_btn), lambda: InlineKeyboardMarkup(
         inline_keyboard=[
             [InlineKeyboardButton(text="✅ " + confirm_btn, callback_data="confirm_order")],
             [InlineKeyboardButton(text="❌ " + cancel_btn,  callback_data="cancel_order")]
         ]
-    )
+    ))
 
     await callback.message.answer(summary, reply_markup=confirm_kb)
     await state.set_state(OrderServiceState.confirming_order)
@@ -1,5 +1,6 @@
 # handlers/client/taxi_flow.py
 from __future__ import annotations
+import uuid
 
 from aiogram import Router, F
 from aiogram.fsm.context import FSMContext
@@ -11,26 +12,39 @@ from aiogram.types import (
 
 from config import HOURS_FROM, HOURS_TO, ADMIN_CHAT_ID
 from middlewares.i18n import _
-from repo.orders import create_order
+from repo.outbox import save_order
 from services.publisher import publish_order
 
 # ← добавили работу со справочниками и ценами
-from data_loader import load_locations
-from pricing import quote_price
+from data_loader import get_registry, location_key
+from pricing import quote_key, quote_price_cached, quote_prices_batch
+from location_search import search_locations
+from keyboards.paging import Item, page_keyboard, register_list
+from keyboards.prebuilt import prebuilt
 
 router = Router()
 
 # ───────────────── Справочники из CSV ─────────────────
-# читаем один раз при импорте модуля
-_LOCS = load_locations()
-# списки вида: [("id","name"), ...]
-AIRPORTS: list[tuple[str, str]] = _LOCS.get("airport", [])
-HOTELS:   list[tuple[str, str]] = _LOCS.get("hotel", [])
+# списки вида: [("id","name"), ...] — срез общего реестра локаций;
+# строятся при первом обращении и заново, если реестр подменили (правка CSV)
+_LISTS: tuple = (None, [], [])
+
+def _lists() -> tuple:
+    global _LISTS
+    registry = get_registry()
+    if _LISTS[0] is not registry:
+        _LISTS = (
+            registry,
+            [(loc.id, loc.name) for loc in registry.of_kind("airport")],
+            [(loc.id, loc.name) for loc in registry.of_kind("hotel")],
+        )
+    return _LISTS
+
+def airports() -> list[tuple[str, str]]:
+    return _lists()[1]
 
-# Быстрые словари "имя → id" (чтобы по названию находить id)
-# Быстрые словари "имя → id" (по CSV), чтобы по названию найти id
-NAME2AIRPORT = {name: _id for _id, name in AIRPORTS}
-NAME2HOTEL   = {name: _id for _id, name in HOTELS}
+def hotels() -> list[tuple[str, str]]:
+    return _lists()[2]
 
 # Набор возможных ключей, где в dict может лежать «человеческое» название
 NAME_KEYS = ["name", "text", "title", "label", "value", "display", "full", "place"]
@@ -40,10 +54,9 @@ def resolve_place(name: str) -> tuple[str, str | None]:
     По названию вернуть (kind, id), если знаем из справочника;
     иначе угадать по ключевым словам.
     """
-    if name in NAME2AIRPORT:
-        return "airport", NAME2AIRPORT[name]
-    if name in NAME2HOTEL:
-        return "hotel", NAME2HOTEL[name]
+    loc = get_registry().by_name(name)
+    if loc is not None and loc.kind in ("airport", "hotel"):
+        return loc.kind, loc.id
     low = name.lower()
     if "airport" in low or "аэропорт" in low:
         return "airport", None
@@ -79,9 +92,10 @@ def norm_place(val) -> tuple[str, str, str | None]:
         if len(val) >= 2:
             a, b = str(val[0]), str(val[1])
             # пытаемся понять, что id, а что имя
-            if a in NAME2AIRPORT or a in NAME2HOTEL:
+            registry = get_registry()
+            if registry.get(a) is not None:
                 _id, name = a, b
-            elif b in NAME2AIRPORT or b in NAME2HOTEL:
+            elif registry.get(b) is not None:
                 _id, name = b, a
             else:
                 _id, name = a, b  # по умолчанию считаем (id, name)
@@ -103,15 +117,52 @@ def norm_place(val) -> tuple[str, str, str | None]:
 
 
 
-def kb_from_list(prefix: str, items: list[tuple[str, str]]) -> InlineKeyboardMarkup:
-    rows = [
-        [InlineKeyboardButton(text=name, callback_data=f"{prefix}:{i}")]
+def kb_from_list(prefix: str, items: list[tuple[str, str]], prices: list[float] | None = None) -> InlineKeyboardMarkup:
+    # постранично (keyboards/paging.py); в callback_data — location_key(id), не позиция в items
+    return page_keyboard("t", prefix, _list_items(prefix, items, prices))
+
+def _list_items(prefix: str, items: list[tuple[str, str]], prices: list[float] | None) -> list[Item]:
+    return [
+        Item(f"{name} · {prices[i]} USD" if prices and prices[i] else name, f"{prefix}:{location_key(_id)}", name)
         for i, (_id, name) in enumerate(items)
     ]
+
+async def _list_source(prefix: str, state: FSMContext) -> list[Item]:
+    """Элементы списка по prefix: pickupA/pickupH — без цен, dropA/dropH — с ценами от pickup."""
+    kind = "airport" if prefix.endswith("A") else "hotel"
+    items = airports() if kind == "airport" else hotels()
+    prices = None
+    if prefix.startswith("drop"):
+        prices = prices_from((await state.get_data()).get("pickup") or {}, kind, items)
+    return _list_items(prefix, items, prices)
+
+def prices_from(pickup: dict, kind: str, items: list[tuple[str, str]]) -> list[float]:
+    """Дневные цены от pickup до каждой точки списка — одним пакетным вызовом."""
+    try:
+        quotes = quote_prices_batch(
+            "taxi", pickup.get("kind"), pickup.get("id"),
+            [(kind, _id) for _id, _name in items],
+        )
+    except Exception:
+        return []
+    return [price for price, _payload in quotes]
+
+def kb_candidates(prefix: str, locs: list) -> InlineKeyboardMarkup:
+    """Кандидаты поиска: в callback_data — location_key(id) точки."""
+    rows = [[InlineKeyboardButton(text=loc.name, callback_data=f"{prefix}:{location_key(loc.id)}")] for loc in locs]
     rows.append([InlineKeyboardButton(text="← Назад", callback_data="back")])
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
+def found_location(callback: CallbackQuery, kinds: tuple[str, ...]):
+    """Точка из callback_data кнопки; None — точку удалили из CSV или она не того вида."""
+    return get_registry().by_key(callback.data.split(":", 1)[-1], kinds)
+
+register_list("t", _list_source, page_size=8, columns=1, footer=[("← Назад", "back")])
+
 def kb_time() -> InlineKeyboardMarkup:
+    return prebuilt(("time",), _kb_time)
+
+def _kb_time() -> InlineKeyboardMarkup:
     rows = []
     for h in range(HOURS_FROM, HOURS_TO + 1):
         row = []
@@ -123,10 +174,16 @@ def kb_time() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=rows)
 
 def kb_confirm() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(inline_keyboard=[
+    return prebuilt(("confirm",), lambda: InlineKeyboardMarkup(inline_keyboard=[
         [InlineKeyboardButton(text="✅ Подтвердить", callback_data="confirm:yes")],
         [InlineKeyboardButton(text="← Назад", callback_data="back")]
-    ])
+    ]))
+
+def kb_pickup_kind() -> InlineKeyboardMarkup:
+    return prebuilt(("pickup_kind",), lambda: InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text="🛫 Аэропорт", callback_data="choose:pickup:airport")],
+        [InlineKeyboardButton(text="🏨 Отель",   callback_data="choose:pickup:hotel")],
+    ]))
 
 
 class TaxiOrder(StatesGroup):
@@ -138,27 +195,32 @@ class TaxiOrder(StatesGroup):
 
 # ───────────────── ВХОД В СЦЕНАРИЙ ─────────────────
 
+# Черновик заказа получает order_key при входе в сценарий: из него ключ
+# идемпотентности заказа, поэтому повторные «Подтвердить» того же черновика
+# (двойной тап, повтор после ошибки) не создают второй заказ.
+# state.clear() после записи заказа убирает ключ вместе с черновиком.
+
+def _new_order_key() -> str:
+    return uuid.uuid4().hex
+
+
 @router.message(Command("taxi"))
 async def cmd_taxi(message: Message, state: FSMContext, _):
     await state.clear()
+    await state.update_data(order_key=_new_order_key())
     await message.answer(
-        "🛫 Откуда едем? Выберите аэропорт или отель:",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🛫 Аэропорт", callback_data="choose:pickup:airport")],
-            [InlineKeyboardButton(text="🏨 Отель",   callback_data="choose:pickup:hotel")],
-        ])
+        "🛫 Откуда едем? Выберите аэропорт или отель (или напишите название):",
+        reply_markup=kb_pickup_kind()
     )
     await state.set_state(TaxiOrder.pickup)
 
 @router.callback_query(F.data == "svc:taxi")
 async def from_services(callback: CallbackQuery, state: FSMContext, _):
     await state.clear()
+    await state.update_data(order_key=_new_order_key())
     await callback.message.edit_text(
-        "🛫 Откуда едем? Выберите аэропорт или отель:",
-        reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-            [InlineKeyboardButton(text="🛫 Аэропорт", callback_data="choose:pickup:airport")],
-            [InlineKeyboardButton(text="🏨 Отель",   callback_data="choose:pickup:hotel")],
-        ])
+        "🛫 Откуда едем? Выберите аэропорт или отель (или напишите название):",
+        reply_markup=kb_pickup_kind()
     )
     await state.set_state(TaxiOrder.pickup)
 
@@ -169,50 +231,99 @@ async def from_services(callback: CallbackQuery, state: FSMContext, _):
 async def choose_pickup_kind(callback: CallbackQuery, state: FSMContext):
     _, _, kind = callback.data.split(":")  # airport | hotel
     if kind == "airport":
-        await callback.message.edit_text("🛫 Выберите аэропорт:", reply_markup=kb_from_list("pickupA", AIRPORTS))
+        await callback.message.edit_text("🛫 Выберите аэропорт:", reply_markup=kb_from_list("pickupA", airports()))
     else:
-        await callback.message.edit_text("🏨 Выберите отель:", reply_markup=kb_from_list("pickupH", HOTELS))
+        await callback.message.edit_text("🏨 Выберите отель:", reply_markup=kb_from_list("pickupH", hotels()))
 
 @router.callback_query(TaxiOrder.pickup, F.data.startswith("pickupA:"))
 async def pickup_airport(callback: CallbackQuery, state: FSMContext):
-    idx = int(callback.data.split(":")[1])
-    if idx < 0 or idx >= len(AIRPORTS):
+    loc = found_location(callback, ("airport",))
+    if loc is None:
         return await callback.answer("Неверный выбор", show_alert=True)
-    _id, name = AIRPORTS[idx]  # << вот тут берём (id, name)
-    await state.update_data(pickup={"kind": "airport", "id": _id, "i": idx, "name": name})
-    await callback.message.edit_text("📍 Куда едем? Выберите отель:", reply_markup=kb_from_list("dropH", HOTELS))
+    pickup = {"kind": "airport", "id": loc.id, "name": loc.name}
+    await state.update_data(pickup=pickup)
+    await callback.message.edit_text(
+        "📍 Куда едем? Выберите отель:",
+        reply_markup=kb_from_list("dropH", hotels(), prices_from(pickup, "hotel", hotels())),
+    )
     await state.set_state(TaxiOrder.dropoff)
 
 @router.callback_query(TaxiOrder.pickup, F.data.startswith("pickupH:"))
 async def pickup_hotel(callback: CallbackQuery, state: FSMContext):
-    idx = int(callback.data.split(":")[1])
-    if idx < 0 or idx >= len(HOTELS):
+    loc = found_location(callback, ("hotel",))
+    if loc is None:
         return await callback.answer("Неверный выбор", show_alert=True)
-    _id, name = HOTELS[idx]
-    await state.update_data(pickup={"kind": "hotel", "id": _id, "i": idx, "name": name})
-    await callback.message.edit_text("📍 Куда едем? Выберите аэропорт:", reply_markup=kb_from_list("dropA", AIRPORTS))
+    pickup = {"kind": "hotel", "id": loc.id, "name": loc.name}
+    await state.update_data(pickup=pickup)
+    await callback.message.edit_text(
+        "📍 Куда едем? Выберите аэропорт:",
+        reply_markup=kb_from_list("dropA", airports(), prices_from(pickup, "airport", airports())),
+    )
+    await state.set_state(TaxiOrder.dropoff)
+
+
+# Текстом: «melia», «варадеро» — короткий список кандидатов вместо длинной клавиатуры
+@router.message(TaxiOrder.pickup, F.text, ~F.text.startswith("/"))
+async def pickup_search(message: Message, state: FSMContext):
+    found = search_locations(message.text, k=6, kinds=("airport", "hotel"))
+    if not found:
+        return await message.answer("🔎 Ничего не нашли. Уточните название или выберите из списка.")
+    await message.answer("🔎 Выберите из найденного:", reply_markup=kb_candidates("pickS", found))
+
+@router.callback_query(TaxiOrder.pickup, F.data.startswith("pickS:"))
+async def pickup_found(callback: CallbackQuery, state: FSMContext):
+    loc = found_location(callback, ("airport", "hotel"))
+    if loc is None:
+        return await callback.answer("Неверный выбор", show_alert=True)
+    pickup = {"kind": loc.kind, "id": loc.id, "name": loc.name}
+    await state.update_data(pickup=pickup)
+    if loc.kind == "airport":
+        text, kb = "📍 Куда едем? Выберите отель:", kb_from_list("dropH", hotels(), prices_from(pickup, "hotel", hotels()))
+    else:
+        text, kb = "📍 Куда едем? Выберите аэропорт:", kb_from_list("dropA", airports(), prices_from(pickup, "airport", airports()))
+    await callback.message.edit_text(text, reply_markup=kb)
     await state.set_state(TaxiOrder.dropoff)
 
 
 # ───────────────── DROPOFF ─────────────────
 
+def _dropoff_kinds(pickup: dict) -> tuple[str, ...]:
+    # сценарий такси: аэропорт ↔ отель
+    return ("hotel",) if (pickup or {}).get("kind") == "airport" else ("airport",)
+
+@router.message(TaxiOrder.dropoff, F.text, ~F.text.startswith("/"))
+async def dropoff_search(message: Message, state: FSMContext):
+    data = await state.get_data()
+    found = search_locations(message.text, k=6, kinds=_dropoff_kinds(data.get("pickup")))
+    if not found:
+        return await message.answer("🔎 Ничего не нашли. Уточните название или выберите из списка.")
+    await message.answer("🔎 Выберите из найденного:", reply_markup=kb_candidates("dropS", found))
+
+@router.callback_query(TaxiOrder.dropoff, F.data.startswith("dropS:"))
+async def dropoff_found(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    loc = found_location(callback, _dropoff_kinds(data.get("pickup")))
+    if loc is None:
+        return await callback.answer("Неверный выбор", show_alert=True)
+    await state.update_data(dropoff={"kind": loc.kind, "id": loc.id, "name": loc.name})
+    await callback.message.edit_text("⏰ Во сколько подать автомобиль?", reply_markup=kb_time())
+    await state.set_state(TaxiOrder.when)
+
 @router.callback_query(TaxiOrder.dropoff, F.data.startswith("dropA:"))
 async def drop_to_airport(callback: CallbackQuery, state: FSMContext):
-    idx = int(callback.data.split(":")[1])
-    if idx < 0 or idx >= len(AIRPORTS):
+    loc = found_location(callback, ("airport",))
+    if loc is None:
         return await callback.answer("Неверный выбор", show_alert=True)
-    _id, name = AIRPORTS[idx]
-    await state.update_data(dropoff={"kind": "airport", "id": _id, "i": idx, "name": name})
+    await state.update_data(dropoff={"kind": "airport", "id": loc.id, "name": loc.name})
     await callback.message.edit_text("⏰ Во сколько подать автомобиль?", reply_markup=kb_time())
     await state.set_state(TaxiOrder.when)
 
 @router.callback_query(TaxiOrder.dropoff, F.data.startswith("dropH:"))
 async def drop_to_hotel(callback: CallbackQuery, state: FSMContext):
-    idx = int(callback.data.split(":")[1])
-    if idx < 0 or idx >= len(HOTELS):
+    loc = found_location(callback, ("hotel",))
+    if loc is None:
         return await callback.answer("Неверный выбор", show_alert=True)
-    _id, name = HOTELS[idx]
-    await state.update_data(dropoff={"kind": "hotel", "id": _id, "i": idx, "name": name})
+    await state.update_data(dropoff={"kind": "hotel", "id": loc.id, "name": loc.name})
     await callback.message.edit_text("⏰ Во сколько подать автомобиль?", reply_markup=kb_time())
     await state.set_state(TaxiOrder.when)
 
@@ -227,15 +338,16 @@ async def choose_time(callback: CallbackQuery, state: FSMContext):
 
     # считаем цену сразу для показа в карточке
     try:
-        price, payload = quote_price(
+        price_key, price, payload = quote_price_cached(
             service="taxi",
             from_kind=data['pickup']['kind'], from_id=data['pickup']['id'],
             to_kind=data['dropoff']['kind'], to_id=data['dropoff']['id'],
             when_hhmm=hhmm,
             options=data.get("options", {}),
         )
-        # сохраним, если захочешь не пересчитывать на подтверждении
-        await state.update_data(price_quote=price, price_payload=payload)
+        # сохраняем вместе с ключом: подтверждение возьмёт эту же цену,
+        # если маршрут/время/опции не менялись
+        await state.update_data(price_quote=price, price_payload=payload, price_key=price_key)
     except Exception:
         await callback.message.answer("❗ Ошибка при расчёте цены. Попробуйте ещё раз.")
         return
@@ -353,23 +465,34 @@ async def confirm_order(callback: CallbackQuery, state: FSMContext):
     pickup_name, from_kind, from_id = norm_place(pickup_val)
     drop_name,  to_kind,   to_id    = norm_place(dropoff_val)
 
-    # --- Расчёт цены по CSV (fallback сработает по kind->kind, если id нет) ---
+    # --- Цена: та же, что показали в карточке, если входные данные не менялись ---
     try:
-        price, payload = quote_price(
-            service="taxi",
-            from_kind=from_kind, from_id=from_id,
-            to_kind=to_kind,     to_id=to_id,
-            when_hhmm=when_hhmm,
-            options=data.get("options", {}),
+        price_key = quote_key(
+            "taxi", from_kind, from_id, to_kind, to_id, when_hhmm, data.get("options", {}),
         )
+        if data.get("price_key") == price_key and data.get("price_quote") is not None:
+            price, payload = data["price_quote"], data.get("price_payload") or {}
+        else:
+            price_key, price, payload = quote_price_cached(
+                service="taxi",
+                from_kind=from_kind, from_id=from_id,
+                to_kind=to_kind,     to_id=to_id,
+                when_hhmm=when_hhmm,
+                options=data.get("options", {}),
+            )
     except Exception:
         log.exception("quote_price failed")
         await callback.message.answer("❗ Ошибка при расчёте цены. Попробуйте ещё раз.")
         return
 
     # --- Запись заказа ---
+    order_key = data.get("order_key")
+    if not order_key:  # черновик начат до появления order_key — выдаём сейчас
+        order_key = _new_order_key()
+        await state.update_data(order_key=order_key)
     try:
-        order_id = await create_order({
+        order_id = await save_order({
+            "idempotency_key": f"tg:{order_key}",  # один черновик — один заказ
             "client_tg_id": callback.from_user.id,
             "username": callback.from_user.username,
             "lang": getattr(callback.from_user, "language_code", "ru"),
@@ -437,18 +560,22 @@ async def go_back(callback: CallbackQuery, state: FSMContext):
         await state.set_state(TaxiOrder.when)
     elif cur == TaxiOrder.when:
         data = await state.get_data()
-        if data.get("pickup", {}).get("kind") == "airport":
-            await callback.message.edit_text("📍 Куда едем? Выберите отель:", reply_markup=kb_from_list("dropH", HOTELS))
+        pickup = data.get("pickup", {})
+        if pickup.get("kind") == "airport":
+            await callback.message.edit_text(
+                "📍 Куда едем? Выберите отель:",
+                reply_markup=kb_from_list("dropH", hotels(), prices_from(pickup, "hotel", hotels())),
+            )
         else:
-            await callback.message.edit_text("📍 Куда едем? Выберите аэропорт:", reply_markup=kb_from_list("dropA", AIRPORTS))
+            await callback.message.edit_text(
+                "📍 Куда едем? Выберите аэропорт:",
+                reply_markup=kb_from_list("dropA", airports(), prices_from(pickup, "airport", airports())),
+            )
         await state.set_state(TaxiOrder.dropoff)
     elif cur == TaxiOrder.dropoff:
         await callback.message.edit_text(
-            "🛫 Откуда едем? Выберите аэропорт или отель:",
-            reply_markup=InlineKeyboardMarkup(inline_keyboard=[
-                [InlineKeyboardButton(text="🛫 Аэропорт", callback_data="choose:pickup:airport")],
-                [InlineKeyboardButton(text="🏨 Отель",   callback_data="choose:pickup:hotel")],
-            ])
+            "🛫 Откуда едем? Выберите аэропорт или отель (или напишите название):",
+            reply_markup=kb_pickup_kind()
         )
         await state.set_state(TaxiOrder.pickup)
     else:
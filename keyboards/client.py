@@ -1,14 +1,23 @@
-from datetime import datetime, timedelta
+from datetime import date as date_cls, datetime, timedelta
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
 
+from keyboards.prebuilt import prebuilt
+
 
 def date_selection_keyboard(_) -> InlineKeyboardMarkup:
+    # ключ — сегодняшняя дата и переведённое "Today": в полночь и при смене
+    # языка собирается новая клавиатура
     today = datetime.now().date()
+    today_txt = _("Today")
+    return prebuilt(("date", today, today_txt), lambda: _date_keyboard(today, today_txt))
+
+
+def _date_keyboard(today: date_cls, today_txt: str) -> InlineKeyboardMarkup:
     dates = [today + timedelta(days=i) for i in range(7)]
 
     buttons = [
         InlineKeyboardButton(
-            text=_("Today") if i == 0 else date.strftime("%d.%m"),
+            text=today_txt if i == 0 else date.strftime("%d.%m"),
             callback_data=f"date_{date.strftime('%Y-%m-%d')}"
         )
         for i, date in enumerate(dates)
@@ -19,6 +28,10 @@ def date_selection_keyboard(_) -> InlineKeyboardMarkup:
 
 
 def hour_selection_keyboard() -> InlineKeyboardMarkup:
+    return prebuilt(("hour",), _hour_selection_keyboard)
+
+
+def _hour_selection_keyboard() -> InlineKeyboardMarkup:
     buttons = [
         InlineKeyboardButton(
             text=f"{hour:02}",
@@ -32,6 +45,10 @@ def hour_selection_keyboard() -> InlineKeyboardMarkup:
 
 
 def minute_selection_keyboard() -> InlineKeyboardMarkup:
+    return prebuilt(("minute",), _minute_selection_keyboard)
+
+
+def _minute_selection_keyboard() -> InlineKeyboardMarkup:
     buttons = [
         InlineKeyboardButton(
             text=f"{minute:02}",
@@ -44,9 +61,10 @@ def minute_selection_keyboard() -> InlineKeyboardMarkup:
 
 
 def service_inline_keyboard(_) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(inline_keyboard=[
-        [InlineKeyboardButton(text=f"🚖 {_('Taxi & Cabriolets')}", callback_data="service_taxi")]
-    ])
+    text = f"🚖 {_('Taxi & Cabriolets')}"
+    return prebuilt(("service", text), lambda: InlineKeyboardMarkup(inline_keyboard=[
+        [InlineKeyboardButton(text=text, callback_data="service_taxi")]
+    ]))
 
 
 def confirm_inline_keyboard(_) -> InlineKeyboardMarkup:
@@ -59,6 +77,10 @@ def confirm_inline_keyboard(_) -> InlineKeyboardMarkup:
 
 
 def language_keyboard() -> InlineKeyboardMarkup:
+    return prebuilt(("language",), _language_keyboard)
+
+
+def _language_keyboard() -> InlineKeyboardMarkup:
     return InlineKeyboardMarkup(inline_keyboard=[
         [
             InlineKeyboardButton(text="🇷🇺 Русский", callback_data="lang_ru"),
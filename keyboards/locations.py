@@ -1,52 +1,54 @@
 from aiogram.types import InlineKeyboardMarkup, InlineKeyboardButton
-from itertools import zip_longest
+from typing import Callable
 
+from data_loader import Location, get_registry, location_key, norm_name
+from keyboards.paging import Item, page_keyboard, register_list
+from keyboards.prebuilt import prebuilt
 
-# Добавь список аэропортов
-AIRPORT_NAMES = [
-    "Аэропорт Варадеро (VRA)",
-    "Аэропорт Гаваны (HAV)",
-]
 
+# Списки точек — из общего реестра (data/locations.csv), а не захардкожены:
+# в callback_data уходит location_key(id), обратно — get_registry().by_key(key).
+def airport_locations() -> tuple[Location, ...]:
+    return get_registry().of_kind("airport")
 
-def chunk_buttons(items, n: int) -> list[list[InlineKeyboardButton]]:
-    """Разбивает список items на строки по n элементов для клавиатуры."""
-    args = [iter(items)] * n
-    return [list(filter(None, group)) for group in zip_longest(*args)]
+def hotel_locations() -> tuple[Location, ...]:
+    return get_registry().of_kind("hotel")
 
+def restaurant_locations() -> tuple[Location, ...]:
+    return get_registry().of_kind("restaurant")
+
+def location_by_key(key: str, kind: str) -> Location | None:
+    """Точка по ключу из callback_data; None — если точку удалили или она не того вида."""
+    return get_registry().by_key(key, (kind,))
 
 
 def pickup_category_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+    return prebuilt(("pickup_category",), lambda: InlineKeyboardMarkup(
         inline_keyboard=[
             [InlineKeyboardButton(text="🏨 Отель", callback_data="pickup_hotels")],
             [InlineKeyboardButton(text="🍽 Ресторан", callback_data="pickup_restaurants")],
             [InlineKeyboardButton(text="🛫 Аэропорт", callback_data="pickup_airports")],
         ]
-    )
+    ))
 
 def dropoff_category_keyboard() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+    return prebuilt(("dropoff_category",), lambda: InlineKeyboardMarkup(
         inline_keyboard=[
             [InlineKeyboardButton(text="🏨 Отель", callback_data="dropoff_hotels")],
             [InlineKeyboardButton(text="🍽 Ресторан", callback_data="dropoff_restaurants")],
             [InlineKeyboardButton(text="🛬 Аэропорт", callback_data="dropoff_airports")],
         ]
-    )
+    ))
+
+def _airport_items(type_: str) -> tuple[Item, ...]:
+    return prebuilt(("items", "a", type_), lambda: tuple(
+        Item(loc.name, f"{type_}_airport_{location_key(loc.id)}", loc.name) for loc in airport_locations()
+    ))
 
 def airport_list_keyboard(type_: str) -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        inline_keyboard=[
-            [
-                InlineKeyboardButton(
-                    text=name,
-                    callback_data=f"{type_}_airport_{i}"
-                )
-            ] for i, name in enumerate(AIRPORT_NAMES)
-        ]
-    )
+    return page_keyboard("a", type_, _airport_items(type_))
 
-# --- УНИКАЛЬНЫЕ ЭМОДЗИ ДЛЯ КАЖДОГО ОТЕЛЯ ---
+# --- УНИКАЛЬНЫЕ ЭМОДЗИ ДЛЯ КАЖДОГО ОТЕЛЯ (по названию; точек без эмодзи — 📍) ---
 HOTEL_EMOJIS: dict[str, str] = {
     "Arenas Doradas": "✨",
     "Barcelo Solymar": "🌞",
@@ -96,7 +98,6 @@ HOTEL_EMOJIS: dict[str, str] = {
     "Villa Cuba": "🇨🇺",
     "Villa Tortuga": "🐢",
 }
-HOTEL_NAMES = list(HOTEL_EMOJIS.keys())  # Рядом с HOTEL_EMOJIS
 
 # --- УНИКАЛЬНЫЕ ЭМОДЗИ ДЛЯ КАЖДОГО РЕСТОРАНА ---
 RESTAURANT_EMOJIS: dict[str, str] = {
@@ -134,30 +135,46 @@ RESTAURANT_EMOJIS: dict[str, str] = {
     "Бар Floridita": "🍍",
     "Бар клуб Calle 62 (62я улица)": "🎵",
     "Вилла Дюпона. Коктейли": "🥂",
-    "Клуб La Comparсита": "🕺",
+    "Клуб La Comparsita": "🕺",
     "Пивоварня Factoria 43": "🍺",
     "Рудольфо и его лобстеры (28я-29я)": "🦀",
 }
-RESTAURANT_NAMES = list(RESTAURANT_EMOJIS.keys())
 
-def hotel_list_keyboard(prefix: str) -> InlineKeyboardMarkup:
-    hotels = list(HOTEL_EMOJIS.keys())
-    buttons: list[InlineKeyboardButton] = [
-        InlineKeyboardButton(text=f"{HOTEL_EMOJIS[name]} {name}", callback_data=f"{prefix}_hotel_{i}")
-        for i, name in enumerate(HOTEL_NAMES)
-    ]
+# Ключи — нормализованные названия, чтобы пунктуация в CSV не ломала сопоставление
+_HOTEL_EMOJI = {norm_name(name): e for name, e in HOTEL_EMOJIS.items()}
+_RESTAURANT_EMOJI = {norm_name(name): e for name, e in RESTAURANT_EMOJIS.items()}
+
+
+# Элементы списков тоже кэшируются (сбрасываются вместе с клавиатурами при правке CSV)
+def _hotel_items(prefix: str) -> tuple[Item, ...]:
+    return prebuilt(("items", "h", prefix), lambda: tuple(
+        Item(f"{_HOTEL_EMOJI.get(norm_name(loc.name), '📍')} {loc.name}", f"{prefix}_hotel_{location_key(loc.id)}", loc.name)
+        for loc in hotel_locations()
+    ))
 
-    keyboard = chunk_buttons(buttons, 2)
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+def _restaurant_items(prefix: str) -> tuple[Item, ...]:
+    return prebuilt(("items", "r", prefix), lambda: tuple(
+        Item(f"{_RESTAURANT_EMOJI.get(norm_name(loc.name), '📍')} {loc.name}", f"{prefix}_rest_{location_key(loc.id)}", loc.name)
+        for loc in restaurant_locations()
+    ))
+
+
+# Списки постраничные (keyboards/paging.py): по 10 кнопок в 2 колонки + навигация
+def hotel_list_keyboard(prefix: str) -> InlineKeyboardMarkup:
+    return page_keyboard("h", prefix, _hotel_items(prefix))
 
 
 def restaurant_list_keyboard(prefix: str) -> InlineKeyboardMarkup:
-    buttons: list[InlineKeyboardButton] = [
-        InlineKeyboardButton(
-            text=f"{RESTAURANT_EMOJIS[name]} {name}",
-            callback_data=f"{prefix}_rest_{i}"
-        )
-        for i, name in enumerate(RESTAURANT_NAMES)
-    ]
-    keyboard = chunk_buttons(buttons, 2)
-    return InlineKeyboardMarkup(inline_keyboard=keyboard)
+    return page_keyboard("r", prefix, _restaurant_items(prefix))
+
+
+def _static_source(items: Callable[[str], tuple[Item, ...]]):
+    # списку не нужен state: он зависит только от prefix
+    async def source(prefix: str, state) -> tuple[Item, ...]:
+        return items(prefix)
+    return source
+
+
+register_list("a", _static_source(_airport_items), page_size=8, columns=1)
+register_list("h", _static_source(_hotel_items))
+register_list("r", _static_source(_restaurant_items))
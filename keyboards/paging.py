@@ -0,0 +1,120 @@
+# keyboards/paging.py — постраничные списки с алфавитным указателем
+#
+# Длинный список (отели, рестораны, ...) режется на страницы фиксированного
+# размера: каждая правка сообщения отправляет одну страницу, сколько бы точек
+# ни было в CSV. Навигация целиком в callback_data:
+#   pg|<list>|<prefix>|<page>   — открыть страницу
+#   abc|<list>|<prefix>         — открыть алфавитный указатель
+# Буква указателя сразу ведёт на страницу (pg|...), где начинается эта буква.
+# Обработчики — handlers/client/paging.py; списки регистрируются register_list().
+
+from __future__ import annotations
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional, Sequence, Tuple
+
+from aiogram.fsm.context import FSMContext
+from aiogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from keyboards.prebuilt import prebuilt
+
+ALPHABET_COLUMNS = 6
+
+
+class Item(NamedTuple):
+    text:          str
+    callback_data: str
+    sort_name:     str  # по нему сортируем и берём букву указателя
+
+
+# (prefix, state) -> элементы списка; нужен обработчику навигации,
+# чтобы восстановить список по callback_data
+Source = Callable[[str, FSMContext], Awaitable[Sequence[Item]]]
+
+
+class ListSpec(NamedTuple):
+    source:    Source
+    page_size: int
+    columns:   int
+    footer:    Tuple[Tuple[str, str], ...]  # ряды (text, callback_data) под списком
+
+
+_LISTS: Dict[str, ListSpec] = {}
+
+
+def register_list(
+    name: str,
+    source: Source,
+    page_size: int = 10,
+    columns: int = 2,
+    footer: Sequence[Tuple[str, str]] = (),
+) -> None:
+    """Регистрирует список для навигации; name идёт в callback_data — делайте коротким."""
+    _LISTS[name] = ListSpec(source, page_size, columns, tuple(footer))
+
+
+def get_list(name: str) -> Optional[ListSpec]:
+    return _LISTS.get(name)
+
+
+class Paged(NamedTuple):
+    pages:    Tuple[InlineKeyboardMarkup, ...]
+    alphabet: Optional[InlineKeyboardMarkup]  # None — список в одну страницу
+
+
+def _letter(name: str) -> str:
+    for ch in name:
+        if ch.isalpha():
+            return ch.upper()
+        if ch.isdigit():
+            return "#"
+    return "#"
+
+
+def _paginate(name: str, prefix: str, items: Tuple[Item, ...], spec: ListSpec) -> Paged:
+    items = tuple(sorted(items, key=lambda it: it.sort_name.casefold()))
+    size = spec.page_size
+    chunks = [items[i:i + size] for i in range(0, len(items), size)] or [()]
+    n = len(chunks)
+    footer = [[InlineKeyboardButton(text=t, callback_data=cb)] for t, cb in spec.footer]
+
+    pages = []
+    for p, chunk in enumerate(chunks):
+        buttons = [InlineKeyboardButton(text=it.text, callback_data=it.callback_data) for it in chunk]
+        rows = [buttons[i:i + spec.columns] for i in range(0, len(buttons), spec.columns)]
+        if n > 1:
+            rows.append([
+                InlineKeyboardButton(text="◀", callback_data=f"pg|{name}|{prefix}|{(p - 1) % n}"),
+                InlineKeyboardButton(text=f"🔤 {p + 1}/{n}", callback_data=f"abc|{name}|{prefix}"),
+                InlineKeyboardButton(text="▶", callback_data=f"pg|{name}|{prefix}|{(p + 1) % n}"),
+            ])
+        pages.append(InlineKeyboardMarkup(inline_keyboard=rows + footer))
+
+    if n == 1:
+        return Paged(tuple(pages), None)
+
+    # буква -> первая страница, где она встречается
+    first_page: Dict[str, int] = {}
+    for i, it in enumerate(items):
+        first_page.setdefault(_letter(it.sort_name), i // size)
+    letters = [
+        InlineKeyboardButton(text=ch, callback_data=f"pg|{name}|{prefix}|{p}")
+        for ch, p in first_page.items()
+    ]
+    rows = [letters[i:i + ALPHABET_COLUMNS] for i in range(0, len(letters), ALPHABET_COLUMNS)]
+    rows.append([InlineKeyboardButton(text="◀ 1", callback_data=f"pg|{name}|{prefix}|0")])
+    return Paged(tuple(pages), InlineKeyboardMarkup(inline_keyboard=rows + footer))
+
+
+def paginate(name: str, prefix: str, items: Sequence[Item]) -> Paged:
+    """Все страницы списка разом; собираются один раз на (список, prefix, элементы)."""
+    spec = _LISTS[name]
+    items = tuple(items)
+    return prebuilt(("paged", name, prefix, items), lambda: _paginate(name, prefix, items, spec))
+
+
+def page_keyboard(name: str, prefix: str, items: Sequence[Item], page: int = 0) -> InlineKeyboardMarkup:
+    pages = paginate(name, prefix, items).pages
+    return pages[min(max(page, 0), len(pages) - 1)]
+
+
+def alphabet_keyboard(name: str, prefix: str, items: Sequence[Item]) -> Optional[InlineKeyboardMarkup]:
+    return paginate(name, prefix, items).alphabet
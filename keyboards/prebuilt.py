@@ -0,0 +1,38 @@
+# keyboards/prebuilt.py — кэш готовых inline-клавиатур
+#
+# Статичные клавиатуры (списки отелей, часы, минуты и т.п.) собираются один раз
+# на ключ (экран, prefix, язык/текст) и дальше отдаются тем же объектом.
+# Модели aiogram frozen, так что общий экземпляр безопасен.
+# Кэш сбрасывается при перезагрузке справочников (списки зависят от CSV).
+
+from __future__ import annotations
+from typing import Callable, Hashable
+
+from aiogram.types import InlineKeyboardMarkup
+
+from cache import TTLCache
+from data_loader import register_reference
+
+# ключей немного (экраны × prefix × язык), но дата меняется каждый день —
+# LRU-граница не даёт накапливаться вчерашним
+_KEYBOARDS = TTLCache(maxsize=512, ttl=0)
+
+
+def prebuilt(key: tuple[Hashable, ...], build: Callable[[], InlineKeyboardMarkup]) -> InlineKeyboardMarkup:
+    """Клавиатура (или её заготовка) по ключу; build() вызывается только при первом запросе."""
+    kb = _KEYBOARDS.get(key)
+    if kb is None:
+        kb = build()
+        _KEYBOARDS.set(key, kb)
+    return kb
+
+
+def clear_keyboards() -> None:
+    _KEYBOARDS.clear()
+
+
+def keyboard_cache_stats() -> dict:
+    return _KEYBOARDS.stats()
+
+
+register_reference("keyboards", lambda built: None, lambda _none: clear_keyboards(), snapshot=False)
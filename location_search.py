@@ -0,0 +1,102 @@
+# location_search.py — нечёткий поиск точек по названию (триграммы + префикс)
+#
+# Названия и запросы сводятся к одному виду: нижний регистр, без диакритики,
+# кириллица транслитерируется в латиницу — «варадеро», «Varadero» и «Varadéro»
+# дают одни и те же триграммы. Индекс: триграмма -> кортеж Location.idx.
+
+from __future__ import annotations
+import heapq
+import re
+import unicodedata
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from data_loader import Location, LocationRegistry, get_registry, register_reference
+
+_TRANSLIT = str.maketrans({
+    "а": "a", "б": "b", "в": "v", "г": "g", "д": "d", "е": "e", "ё": "e",
+    "ж": "zh", "з": "z", "и": "i", "й": "y", "к": "k", "л": "l", "м": "m",
+    "н": "n", "о": "o", "п": "p", "р": "r", "с": "s", "т": "t", "у": "u",
+    "ф": "f", "х": "h", "ц": "ts", "ч": "ch", "ш": "sh", "щ": "sch", "ъ": "",
+    "ы": "y", "ь": "", "э": "e", "ю": "yu", "я": "ya",
+})
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def fold(text: str) -> str:
+    """Нормальная форма для поиска: 'Marisquería Лоран' -> 'marisqueria loran'."""
+    text = unicodedata.normalize("NFKD", (text or "").casefold())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_WORD.sub(" ", text.translate(_TRANSLIT)).strip()
+
+
+def _trigrams(text: str, partial_tail: bool = False) -> List[str]:
+    """
+    Триграммы слов с отступами: '  m', ' me', 'mel', ... 'ia '.
+    partial_tail — последнее слово запроса ещё набирается: без хвостового пробела,
+    чтобы 'mel' совпадало с началом 'melia'.
+    """
+    words = fold(text).split()
+    grams: List[str] = []
+    for n, w in enumerate(words):
+        tail = "" if partial_tail and n == len(words) - 1 else " "
+        padded = "  " + w + tail
+        grams += [padded[i:i + 3] for i in range(len(padded) - 2)]
+    return grams
+
+
+class LocationSearchIndex:
+    """Неизменяемый индекс по реестру локаций; при правке CSV строится заново."""
+    __slots__ = ("_registry", "_postings", "_sizes")
+
+    def __init__(self, registry: LocationRegistry):
+        postings: Dict[str, List[int]] = {}
+        sizes: List[int] = []
+        for loc in registry:
+            grams = set(_trigrams(loc.name))
+            sizes.append(len(grams))
+            for g in grams:
+                postings.setdefault(g, []).append(loc.idx)
+        self._registry = registry
+        self._postings: Dict[str, Tuple[int, ...]] = {g: tuple(ids) for g, ids in postings.items()}
+        self._sizes = tuple(sizes)
+
+    def search(self, query: str, k: int = 5, kinds: Optional[Iterable[str]] = None) -> List[Location]:
+        """
+        До k лучших точек по сходству названия (коэффициент Дайса по триграммам).
+        kinds — ограничить видами (airport, hotel, ...). Пустой запрос — [].
+        """
+        qgrams = set(_trigrams(query, partial_tail=True))
+        if not qgrams:
+            return []
+        hits: Dict[int, int] = {}
+        for g in qgrams:
+            for idx in self._postings.get(g, ()):
+                hits[idx] = hits.get(idx, 0) + 1
+        kinds = set(kinds) if kinds else None
+        registry, sizes, nq = self._registry, self._sizes, len(qgrams)
+        scored = (
+            (2.0 * common / (nq + sizes[idx]), -idx)
+            for idx, common in hits.items()
+            if kinds is None or registry[idx].kind in kinds
+        )
+        # отсекаем случайные совпадения одной-двух триграмм
+        best = heapq.nlargest(k, (s for s in scored if s[0] >= 0.2))
+        return [registry[-neg_idx] for _score, neg_idx in best]
+
+
+_INDEX: LocationSearchIndex | None = None
+
+
+def _install_index(index: LocationSearchIndex) -> None:
+    global _INDEX
+    _INDEX = index
+
+
+def search_locations(query: str, k: int = 5, kinds: Optional[Iterable[str]] = None) -> List[Location]:
+    """Поиск по текущему реестру (см. LocationSearchIndex.search)."""
+    if _INDEX is None:
+        _install_index(LocationSearchIndex(get_registry()))
+    return _INDEX.search(query, k, kinds)
+
+
+register_reference("location_search", lambda built: LocationSearchIndex(built["locations"]), _install_index)
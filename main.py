@@ -1,11 +1,18 @@
 # main.py
 import asyncio
 from bots.client_bot import run_client_bot
+from bots.cluster import run_cluster
+from bots.webhook import run_webhook
 from config import config
 
 if __name__ == "__main__":
     print("BOT TOKEN tail:", (config.CLIENT_BOT_TOKEN or "")[-8:])  # диагностика
     try:
-        asyncio.run(run_client_bot())
+        if config.WEBHOOK_URL:
+            asyncio.run(run_webhook())  # Telegram сам присылает апдейты
+        elif config.BOT_WORKERS > 1:
+            asyncio.run(run_cluster(config.BOT_WORKERS))  # приёмник + воркеры по user id
+        else:
+            asyncio.run(run_client_bot())
     except KeyboardInterrupt:
         print("Bot stopped")
@@ -0,0 +1,160 @@
+# middlewares/fsm_unit.py — FSM как «единица работы» на апдейт
+#
+# Стандартный FSMContext ходит в хранилище на каждый вызов: хэндлер вида
+# update_data → get_data → update_data → set_state — это 4–5 обращений
+# (update_data сам делает get_data + set_data). Здесь состояние читается один
+# раз до хэндлера, все изменения копятся в памяти и записываются одним
+# вызовом после него: не больше 2 обращений к хранилищу на апдейт.
+#
+# Подключение (вместо встроенного FSM-middleware aiogram):
+#   dp = Dispatcher(storage=..., events_isolation=UserEventIsolation(), disable_fsm=True)
+#   install_unit_of_work(dp)
+
+from __future__ import annotations
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Awaitable, Callable, Dict, Hashable, Optional, cast
+
+from aiogram import Bot, Dispatcher
+from aiogram.fsm.context import FSMContext
+from aiogram.fsm.middleware import FSMContextMiddleware
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseEventIsolation, BaseStorage, StateType, StorageKey
+from aiogram.types import TelegramObject
+
+
+class BufferedFSMContext(FSMContext):
+    """FSMContext поверх снимка (state, data): чтения и записи — в памяти до flush()."""
+
+    def __init__(self, storage: BaseStorage, key: StorageKey) -> None:
+        super().__init__(storage, key)
+        self._state: Optional[str] = None
+        self._data: Dict[str, Any] = {}
+        self._loaded = False
+        self._dirty = False
+
+    async def load(self) -> Optional[str]:
+        if not self._loaded:
+            get_record = getattr(self.storage, "get_record", None)
+            if get_record is not None:  # PgStorage: state и data одним вызовом
+                self._state, self._data = await get_record(self.key)
+            else:
+                self._state = await self.storage.get_state(key=self.key)
+                self._data = await self.storage.get_data(key=self.key)
+            self._loaded = True
+        return self._state
+
+    async def flush(self) -> None:
+        if not self._dirty:
+            return
+        set_record = getattr(self.storage, "set_record", None)
+        if set_record is not None:
+            await set_record(self.key, self._state, self._data)
+        else:
+            await self.storage.set_state(key=self.key, state=self._state)
+            await self.storage.set_data(key=self.key, data=self._data)
+        self._dirty = False
+
+    async def set_state(self, state: StateType = None) -> None:
+        await self.load()
+        self._state = state.state if isinstance(state, State) else state
+        self._dirty = True
+
+    async def get_state(self) -> Optional[str]:
+        return await self.load()
+
+    async def set_data(self, data: Dict[str, Any]) -> None:
+        await self.load()
+        self._data = data.copy()
+        self._dirty = True
+
+    async def get_data(self) -> Dict[str, Any]:
+        await self.load()
+        return self._data.copy()
+
+    async def update_data(self, data: Optional[Dict[str, Any]] = None, **kwargs: Any) -> Dict[str, Any]:
+        if data:
+            kwargs.update(data)
+        await self.load()
+        self._data.update(kwargs)
+        self._dirty = True
+        return self._data.copy()
+
+    async def clear(self) -> None:
+        await self.load()
+        self._state, self._data = None, {}
+        self._dirty = True
+
+
+class UnitOfWorkFSMMiddleware(FSMContextMiddleware):
+    """FSMContextMiddleware, который отдаёт хэндлерам BufferedFSMContext."""
+
+    def get_context(
+        self,
+        bot: Bot,
+        chat_id: int,
+        user_id: int,
+        thread_id: Optional[int] = None,
+        destiny: str = "default",
+    ) -> FSMContext:
+        return BufferedFSMContext(
+            storage=self.storage,
+            key=StorageKey(user_id=user_id, chat_id=chat_id, bot_id=bot.id, thread_id=thread_id, destiny=destiny),
+        )
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        bot = cast(Bot, data["bot"])
+        context = cast(Optional[BufferedFSMContext], self.resolve_event_context(bot, data))
+        data["fsm_storage"] = self.storage
+        if context is None:
+            return await handler(event, data)
+        # под блокировкой пользователя: иначе два его апдейта прочитают
+        # один снимок и последний flush затрёт изменения первого
+        async with self.events_isolation.lock(key=context.key):
+            data.update({"state": context, "raw_state": await context.load()})
+            try:
+                return await handler(event, data)
+            finally:
+                # пишем и при исключении — как писал бы обычный FSMContext
+                await context.flush()
+
+
+class UserEventIsolation(BaseEventIsolation):
+    """
+    Блокировка на ключ FSM, как SimpleEventIsolation aiogram, но замки
+    удаляются, когда их никто не ждёт (у aiogram они копятся вечно).
+    """
+
+    def __init__(self) -> None:
+        self._locks: Dict[Hashable, list] = {}  # key -> [Lock, сколько держат/ждут]
+
+    @asynccontextmanager
+    async def lock(self, key: StorageKey) -> AsyncGenerator[None, None]:
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                del self._locks[key]
+
+    async def close(self) -> None:
+        self._locks.clear()
+
+
+def install_unit_of_work(dp: Dispatcher) -> UnitOfWorkFSMMiddleware:
+    """Ставит UnitOfWorkFSMMiddleware; dp должен быть создан с disable_fsm=True."""
+    fsm = dp.fsm
+    uow = UnitOfWorkFSMMiddleware(storage=fsm.storage, events_isolation=fsm.events_isolation, strategy=fsm.strategy)
+    dp.fsm = uow
+    dp.update.outer_middleware(uow)
+    return uow
@@ -1,61 +1,111 @@
 # middlewares/i18n.py
 
 import gettext
-from typing import Callable, Dict, Any, Awaitable, Union
+from dataclasses import replace
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict
+
 from aiogram import BaseMiddleware
-from aiogram.types import Message, CallbackQuery
+from aiogram.fsm.context import FSMContext
+from aiogram.types import User
 
-# Загрузка переводов
-LOCALES = {
-    "en": gettext.translation("bot", localedir="locales", languages=["en"]),
-    "ru": gettext.translation("bot", localedir="locales", languages=["ru"]),
-    "es": gettext.translation("bot", localedir="locales", languages=["es"]),
-}
+from cache import TTLCache
 
-class I18nMiddleware(BaseMiddleware):
-    async def __call__(
-        self,
-        handler: Callable[[Union[Message, CallbackQuery], Dict[str, Any]], Awaitable[Any]],
-        event: Union[Message, CallbackQuery],
-        data: Dict[str, Any]
-    ) -> Any:
-        # Получаем язык от пользователя
-        lang_code = getattr(event.from_user, "language_code", "en")
-
-        # Пробуем взять язык из FSM (если уже выбран пользователем)
-        if "state" in data:
-            try:
-                state_data = await data["state"].get_data()
-                lang_code = state_data.get("lang", lang_code)
-            except Exception:
-                pass
+# ───── Каталоги переводов ─────
+# .mo читаются один раз при импорте в обычные dict: перевод ключа — это
+# dict.get, без gettext.translation() и файловой системы на каждый вызов.
+LOCALES_DIR = Path(__file__).resolve().parent.parent / "locales"
+LANGS = ("ru", "en", "es")
 
-        # Фолбэк на английский
-        lang = lang_code if lang_code in LOCALES else "en"
 
-        # Подставляем функцию перевода
-        data["_"] = LOCALES[lang].gettext
+def _load_catalog(lang: str) -> Dict[str, str]:
+    tr = gettext.translation("bot", localedir=str(LOCALES_DIR), languages=[lang], fallback=True)
+    catalog = dict(getattr(tr, "_catalog", {}))  # NullTranslations (нет .mo) — пустой
+    catalog.pop("", None)  # заголовок .po
+    return catalog
 
-        return await handler(event, data)
+
+CATALOGS: Dict[str, Dict[str, str]] = {lang: _load_catalog(lang) for lang in LANGS}
 
 
-def _get_tr(lang: str):
-    return gettext.translation("bot", localedir="locales", languages=[lang], fallback=True)
+def _bind(catalog: Dict[str, str]) -> Callable[[str], str]:
+    get = catalog.get
+    def tr(key: str) -> str:
+        return get(key, key)
+    return tr
+
+
+# Готовые переводчики на язык: один и тот же объект для всех апдейтов
+TRANSLATORS: Dict[str, Callable[[str], str]] = {lang: _bind(c) for lang, c in CATALOGS.items()}
+
+
+def translator(lang: str | None) -> Callable[[str], str]:
+    """Переводчик для языка; неизвестный язык — ru (как и раньше по умолчанию)."""
+    return TRANSLATORS.get(lang or "ru") or TRANSLATORS["ru"]
+
 
 def _(key: str, lang: str | None = None):
-    tr = _get_tr(lang or "ru")
-    return tr.gettext(key)
+    return translator(lang)(key)
+
+# ───── Язык пользователя ─────
+# Выбранный язык живёт в ограниченном LRU в памяти процесса; в хранилище FSM
+# он записывается при каждом явном выборе (/lang), а читается оттуда лишь при
+# промахе кэша (первый апдейт пользователя после рестарта/вытеснения).
+# Ключ — отдельный (destiny="lang"), а не данные диалога: state.clear() в
+# конце заказа его не стирает.
+LANG_DESTINY = "lang"
+_USER_LANGS = TTLCache(maxsize=10000, ttl=0)
+
+
+def configure_lang_cache(maxsize: int) -> None:
+    _USER_LANGS.maxsize = maxsize
+
+
+def norm_lang(code: str | None) -> str | None:
+    """'en-US' -> 'en'; None — язык, для которого нет каталога."""
+    lang = (code or "").split("-")[0].lower()
+    return lang if lang in TRANSLATORS else None
+
+
+async def set_user_lang(user_id: int, lang: str, state: FSMContext | None = None) -> str:
+    """Меняет язык пользователя: кэш сразу, хранилище FSM — для восстановления после рестарта."""
+    lang = norm_lang(lang) or "ru"
+    _USER_LANGS.set(user_id, lang)
+    if state is not None:
+        await state.storage.set_data(replace(state.key, destiny=LANG_DESTINY), {"lang": lang})
+    return lang
+
+
+async def _stored_lang(state: FSMContext) -> str | None:
+    lang = (await state.storage.get_data(replace(state.key, destiny=LANG_DESTINY))).get("lang")
+    if lang is None:  # выбран до отдельного ключа — лежал в данных диалога
+        lang = (await state.get_data()).get("lang")
+    return norm_lang(lang)
 
-# Aiogram middleware (легкий)
-from aiogram import BaseMiddleware
-from typing import Callable, Awaitable, Dict, Any
 
 class I18nMiddleware(BaseMiddleware):
     def __init__(self, default_lang: str = "ru"):
         self.default_lang = default_lang
         super().__init__()
 
+    async def _resolve(self, user: User | None, data: Dict[str, Any]) -> str:
+        if user is None:
+            return self.default_lang
+        lang = _USER_LANGS.get(user.id)
+        if lang is not None:
+            return lang
+        lang = None
+        state = data.get("state")
+        if state is not None:
+            try:
+                lang = await _stored_lang(state)
+            except Exception:
+                pass
+        lang = lang or norm_lang(user.language_code) or self.default_lang
+        _USER_LANGS.set(user.id, lang)
+        return lang
+
     async def __call__(self, handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]], event: Any, data: Dict[str, Any]) -> Any:
-        data["lang"] = getattr(getattr(event, "from_user", None), "language_code", None) or self.default_lang
-        data["_"] = lambda key: _(key, data["lang"])
+        data["lang"] = await self._resolve(getattr(event, "from_user", None), data)
+        data["_"] = translator(data["lang"])
         return await handler(event, data)
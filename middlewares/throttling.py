@@ -0,0 +1,97 @@
+# middlewares/throttling.py — ограничение частоты и отсев повторных нажатий
+#
+# Двойной тап по кнопке присылает два одинаковых callback: без фильтра второй
+# проходит весь путь заново (для confirm_order — котировки, SQL, отправки).
+# Middleware стоит на уровне update перед FSM, поэтому отсеянный апдейт не
+# берёт замок пользователя, не читает FSM и не доходит до хэндлеров.
+#
+# Навигация (back, листание pg|…, указатель abc|…) повтором не считается:
+# два «Назад» подряд — это два шага назад, а не двойной тап; частоту она
+# по-прежнему расходует.
+#
+# На пользователя — одна запись фиксированного размера:
+#   [токены, время пополнения, последний callback data, время нажатия]
+# Записи — в OrderedDict по давности; сверх maxsize вытесняется самая старая.
+
+from __future__ import annotations
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict
+
+from aiogram import BaseMiddleware
+from aiogram.types import CallbackQuery, TelegramObject, Update
+
+
+class ThrottlingMiddleware(BaseMiddleware):
+    """
+    rate/burst — token bucket на пользователя: rate апдейтов/сек в среднем,
+    не больше burst подряд (rate=0 — без ограничения). dedup_window — сколько
+    секунд одинаковый callback data того же пользователя считается повтором.
+    navigation — префиксы callback data, которые повтором не бывают.
+    """
+
+    def __init__(
+        self,
+        rate: float = 3.0,
+        burst: int = 5,
+        dedup_window: float = 1.0,
+        maxsize: int = 10000,
+        navigation: tuple[str, ...] = ("back", "pg|", "abc|"),
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.rate = rate
+        self.burst = burst
+        self.dedup_window = dedup_window
+        self.maxsize = maxsize
+        self.navigation = navigation
+        self._clock = clock
+        self._users: OrderedDict[int, list] = OrderedDict()
+        self.throttled = 0  # отсеяно по частоте — для метрик
+        self.duplicates = 0  # отсеяно как повтор
+
+    def _entry(self, user_id: int, now: float) -> list:
+        entry = self._users.get(user_id)
+        if entry is None:
+            entry = self._users[user_id] = [float(self.burst), now, None, 0.0]
+            if len(self._users) > self.maxsize:
+                self._users.popitem(last=False)
+        else:
+            self._users.move_to_end(user_id)
+        return entry
+
+    def allow(self, user_id: int, data: str | None = None) -> bool:
+        """Пропустить ли апдейт пользователя (data — callback data, если это нажатие)."""
+        now = self._clock()
+        entry = self._entry(user_id, now)
+        if data is not None and not data.startswith(self.navigation):
+            if data == entry[2] and now - entry[3] < self.dedup_window:
+                self.duplicates += 1
+                return False
+            entry[2], entry[3] = data, now
+        if self.rate <= 0:
+            return True
+        tokens = min(float(self.burst), entry[0] + (now - entry[1]) * self.rate)
+        entry[1] = now
+        if tokens < 1.0:
+            entry[0] = tokens
+            self.throttled += 1
+            return False
+        entry[0] = tokens - 1.0
+        return True
+
+    async def __call__(
+        self,
+        handler: Callable[[TelegramObject, Dict[str, Any]], Awaitable[Any]],
+        event: TelegramObject,
+        data: Dict[str, Any],
+    ) -> Any:
+        inner = event.event if isinstance(event, Update) else event
+        user = getattr(inner, "from_user", None)
+        if user is None:
+            return await handler(event, data)
+        callback = inner if isinstance(inner, CallbackQuery) else None
+        if self.allow(user.id, callback.data if callback else None):
+            return await handler(event, data)
+        if callback is not None:
+            await callback.answer()  # погасить «часики»; в режиме вебхука — без запроса
+        return None
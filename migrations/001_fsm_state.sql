@@ -0,0 +1,25 @@
+-- migrations/001_fsm_state.sql — FSM-хранилище бота (FSM_STORAGE=pg, repo/fsm_storage.py)
+--
+--   psql "host=$DB_HOST dbname=$DB_NAME user=$DB_USER" -f migrations/001_fsm_state.sql
+--
+-- Ключ — bot:chat:user:thread:destiny. Брошенные диалоги бот удаляет сам
+-- (FSM_IDLE_TTL) по updated_at.
+
+\set ON_ERROR_STOP on
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS uslugicuba.fsm_state (
+    key        text PRIMARY KEY,
+    state      text,
+    data       jsonb NOT NULL DEFAULT '{}'::jsonb,
+    updated_at timestamptz NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS fsm_state_updated_at_idx ON uslugicuba.fsm_state (updated_at);
+
+INSERT INTO uslugicuba.schema_migrations (version)
+SELECT '001_fsm_state'
+WHERE NOT EXISTS (SELECT 1 FROM uslugicuba.schema_migrations WHERE version = '001_fsm_state');
+
+COMMIT;
@@ -0,0 +1,23 @@
+-- migrations/002_orders_idempotency_key.sql — защита от повторной вставки заказа
+--
+--   psql "host=$DB_HOST dbname=$DB_NAME user=$DB_USER" -f migrations/002_orders_idempotency_key.sql
+--
+-- Журнал заказов (repo/outbox.py) переносит заказы через
+-- ON CONFLICT ((meta->>'idempotency_key')) DO NOTHING — без этого индекса
+-- перенос выключен (бот пишет ошибку в лог), работает только прямая запись.
+--
+-- CONCURRENTLY не блокирует запись заказов, но не работает внутри BEGIN.
+-- Если индекс не построился (дубли ключей), он остаётся INVALID — найти дубли:
+--   SELECT meta->>'idempotency_key' AS key, array_agg(id ORDER BY id)
+--   FROM uslugicuba.orders WHERE meta ? 'idempotency_key'
+--   GROUP BY 1 HAVING count(*) > 1;
+-- разобрать их, затем DROP INDEX uslugicuba.orders_idempotency_key_uq и повторить.
+
+\set ON_ERROR_STOP on
+
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS orders_idempotency_key_uq
+ON uslugicuba.orders ((meta->>'idempotency_key'));
+
+INSERT INTO uslugicuba.schema_migrations (version)
+SELECT '002_orders_idempotency_key'
+WHERE NOT EXISTS (SELECT 1 FROM uslugicuba.schema_migrations WHERE version = '002_orders_idempotency_key');
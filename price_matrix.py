@@ -0,0 +1,198 @@
+# price_matrix.py — предрасчитанная матрица цен location×location (mmap, read-only)
+#
+# Сборка:  python price_matrix.py [путь]   (по умолчанию data/price_matrix.bin)
+#
+# Формат файла (little-endian):
+#   header   "<4sHHI32s": magic, version, n_buckets, n_locations, sha256(CSV)
+#   ids      uint32 длина + JSON {"locs": [[id, kind], ...], "rules": [rule_type, ...]}
+#            (дополнено до 8 байт)
+#   rules    uint8[n*n]     — код правила (0 = not_found)   (дополнено до 8 байт)
+#   totals   float64[b*n*n] — цена без опций для каждого временного бакета
+
+from __future__ import annotations
+import hashlib, json, logging, mmap, os, struct, sys
+from pathlib import Path
+from typing import Optional, Tuple
+
+import pricing
+from data_loader import DATA_DIR, LocationRegistry, register_reference
+
+log = logging.getLogger("price_matrix")
+
+DEFAULT_PATH = DATA_DIR / "price_matrix.bin"
+
+MAGIC = b"UCPM"
+VERSION = 2
+_HEADER = struct.Struct("<4sHHI32s")
+
+# Временные бакеты модификаторов: (имя, пример времени для расчёта)
+BUCKETS = (("day", None), ("night", "23:00"))
+
+
+def sources_digest() -> bytes:
+    """sha256 от содержимого prices.csv + locations.csv — версия матрицы."""
+    h = hashlib.sha256()
+    for name in ("prices.csv", "locations.csv"):
+        h.update((DATA_DIR / name).read_bytes())
+    return h.digest()
+
+def _pad8(n: int) -> int:
+    return (8 - n % 8) % 8
+
+def _bucket(when_hhmm: Optional[str]) -> int:
+    return 1 if pricing.is_night(when_hhmm) else 0
+
+
+# ───────────── Сборка ─────────────
+
+def build(path: str | os.PathLike = DEFAULT_PATH) -> Path:
+    """Считает цену по правилам для всех пар локаций и бакетов и пишет матрицу в файл."""
+    locs = [(loc.id, loc.kind) for loc in LocationRegistry.from_csv()]
+    n = len(locs)
+
+    rules = bytearray(n * n)
+    rule_names = ["not_found"]  # код правила = индекс в этом списке
+    totals = [0.0] * (len(BUCKETS) * n * n)
+    for i, (fid, fkind) in enumerate(locs):
+        for j, (tid, tkind) in enumerate(locs):
+            k = i * n + j
+            for b, (_name, when) in enumerate(BUCKETS):
+                price, payload = pricing._quote_from_rules(fkind, fid, tkind, tid, when_hhmm=when)
+                totals[b * n * n + k] = price
+            name = payload.get("rule", "not_found")
+            if name not in rule_names:
+                rule_names.append(name)
+            rules[k] = rule_names.index(name)
+    if len(rule_names) > 256:
+        raise ValueError("too many rule types for a uint8 rule code")
+
+    meta = {"locs": locs, "rules": rule_names}
+    ids_blob = json.dumps(meta, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    head = _HEADER.pack(MAGIC, VERSION, len(BUCKETS), n, sources_digest())
+    head += struct.pack("<I", len(ids_blob)) + ids_blob
+    head += b"\0" * _pad8(len(head))
+    body = bytes(rules) + b"\0" * _pad8(len(rules))
+
+    path = Path(path)
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    with tmp.open("wb") as f:
+        f.write(head)
+        f.write(body)
+        f.write(struct.pack(f"<{len(totals)}d", *totals))
+    os.replace(tmp, path)  # атомарно: читатели видят либо старый, либо новый файл
+    return path
+
+
+# ───────────── Чтение ─────────────
+
+class PriceMatrix:
+    """
+    Матрица цен, отображённая в память только на чтение: несколько процессов
+    бота на одном хосте делят одну физическую копию страниц.
+    """
+
+    def __init__(self, path: str | os.PathLike):
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, nb, n, digest = _HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path}: not a price matrix v{VERSION}")
+        off = _HEADER.size
+        (ids_len,) = struct.unpack_from("<I", self._mm, off)
+        off += 4
+        meta = json.loads(bytes(self._mm[off:off + ids_len]).decode("utf-8"))
+        locs = meta["locs"]
+        off += ids_len
+        off += _pad8(off)
+
+        self.digest = digest
+        self._n = n
+        self._index = {loc_id: i for i, (loc_id, _kind) in enumerate(locs)}
+        self._kinds = [kind for _id, kind in locs]
+        self._rule_names = meta["rules"]
+        self._view = memoryview(self._mm)
+        self._rules = self._view[off:off + n * n]
+        off += n * n + _pad8(n * n)
+        self._totals = self._view[off:off + nb * n * n * 8].cast("d")
+
+    def close(self) -> None:
+        """Снимает отображение (после замены матрицы при перезагрузке)."""
+        # mmap не закрывается, пока на него есть memoryview
+        for view in (self._totals, self._rules, self._view):
+            view.release()
+        self._mm.close()
+
+    def quote(
+        self,
+        from_kind: str, from_id: Optional[str],
+        to_kind:   str, to_id:   Optional[str],
+        when_hhmm: Optional[str] = None,
+        options:   Optional[dict] = None,
+    ) -> Optional[Tuple[float, dict]]:
+        """
+        То же, что pricing.quote_price, но индексированием массива.
+        None — пара не покрыта матрицей (неизвестный id или kind не как в CSV).
+        """
+        i = self._index.get((from_id or "").strip())
+        j = self._index.get((to_id or "").strip())
+        if i is None or j is None:
+            return None
+        if (from_kind or "").lower() != self._kinds[i] or (to_kind or "").lower() != self._kinds[j]:
+            return None
+
+        n = self._n
+        k = i * n + j
+        rule = self._rules[k]
+        if not rule:
+            return 0.0, {"rule": "not_found"}
+
+        base = self._totals[k]  # дневной бакет без опций = базовая цена
+        total, mods = pricing._apply_mods(base, when_hhmm, options or {})
+        if not options:
+            total = self._totals[_bucket(when_hhmm) * n * n + k]
+        return total, {"rule": self._rule_names[rule], "base_usd": base, "mods": mods}
+
+
+def _open_fresh(path: Path) -> Optional[PriceMatrix]:
+    """Матрица из файла, если он есть и собран по текущим CSV; иначе None."""
+    if not path.exists():
+        log.info("Price matrix %s not found — quoting from CSV rules", path)
+        return None
+    try:
+        matrix = PriceMatrix(path)
+    except Exception as e:
+        log.warning("Price matrix %s unreadable: %s — quoting from CSV rules", path, e)
+        return None
+    if matrix.digest != sources_digest():
+        log.warning("Price matrix %s is stale (CSV changed) — rebuild with `python price_matrix.py`", path)
+        return None
+    log.info("Price matrix loaded: %s", path)
+    return matrix
+
+
+_current: Optional[PriceMatrix] = None
+
+
+def _install(matrix: Optional[PriceMatrix]) -> None:
+    global _current
+    old, _current = _current, matrix
+    pricing.use_price_matrix(matrix)
+    if old is not None and old is not matrix:
+        old.close()  # иначе каждая перезагрузка оставляет отображение файла
+
+
+def load(path: str | os.PathLike | None = None) -> None:
+    """
+    Регистрирует матрицу как справочник: открывает её и подключает к
+    pricing.quote_price data_loader.warm_up (один раз на процесс), а при
+    горячей перезагрузке CSV — перечитывает, закрывая прежнюю (или отключает,
+    если устарела). Если файла нет или CSV поменялись после сборки — работаем
+    без матрицы.
+    """
+    path = Path(path or DEFAULT_PATH)
+    register_reference("price_matrix", lambda built: _open_fresh(path), _install, snapshot=False)
+
+
+if __name__ == "__main__":
+    out = build(sys.argv[1] if len(sys.argv) > 1 else DEFAULT_PATH)
+    print(f"Built: {out}")
@@ -1,10 +1,12 @@
 # pricing.py — работает с CSV-схемой: rule_type + from_type/from_code/to_type/to_code/price_usd
 
 from __future__ import annotations
-import os, csv
-from functools import lru_cache
+import os, csv, json
 from datetime import time
-from typing import Optional, Tuple
+from typing import Iterable, NamedTuple, Optional, Tuple
+
+from cache import TTLCache
+from data_loader import Location, LocationRegistry, get_registry, register_reference
 
 # ───────────── Модификаторы ─────────────
 
@@ -30,7 +32,6 @@ def _apply_mods(base: float, when_hhmm: Optional[str], options: dict):
 
 # ───────────── Загрузка справочников ─────────────
 
-@lru_cache
 def _load_prices_rows():
     path = os.path.join(os.path.dirname(__file__), "data", "prices.csv")
     rows = []
@@ -38,25 +39,166 @@ def _load_prices_rows():
         rows = list(csv.DictReader(f))
     return rows
 
-@lru_cache
-def _load_locations_map():
-    path = os.path.join(os.path.dirname(__file__), "data", "locations.csv")
-    id2 = {}
-    with open(path, encoding="utf-8") as f:
-        for r in csv.DictReader(f):
-            _id   = (r.get("id")   or "").strip()
-            kind  = (r.get("kind") or "").strip().lower()
-            zone  = (r.get("zone") or "").strip().upper()
-            if not _id:
-                continue
-            # код для аэропорта — его id в верхнем регистре (VRA/HAV),
-            # для остальных — используем зону
-            code = _id.upper() if kind == "airport" else zone
-            id2[_id] = {"kind": kind, "zone": zone, "code": code, "name": r.get("name", "")}
-    return id2
+# ───────────── Таблица решений ─────────────
+#
+# Каждая строка prices.csv — правило «сторона from → сторона to → цена».
+# Сторона (селектор) — одна из:
+#   ("location", id)   конкретная точка: колонки from_id/to_id (фикс. цена отеля и т.п.)
+#   ("airport", CODE)  аэропорт по коду (VRA/HAV); CODE="*" — любой аэропорт
+#   ("zone", CODE)     зона A/B/C/D; CODE="*" — любая зона
+#   ("*", "*")         что угодно (from_type/to_type = "*")
+# Из всех подошедших правил выигрывает наименьший priority, при равенстве — строка выше.
+
+# priority по умолчанию, если колонка пустая (совпадает с прежним порядком веток)
+_DEFAULT_PRIORITY = {"airport_airport": 1.0, "airport_zone": 2.0, "zone_zone": 3.0, "intra_zone": 4.0}
+_LAST_PRIORITY = 100.0
+
+class _Rule(NamedTuple):
+    priority:  float
+    seq:       int     # номер строки — тай-брейк при равном priority
+    rule_type: str
+    base:      float
+
+def _selector(type_: Optional[str], code: Optional[str], loc_id: Optional[str]) -> Optional[tuple[str, str]]:
+    loc_id = (loc_id or "").strip()
+    if loc_id:
+        return ("location", loc_id)
+    type_ = (type_ or "").strip().lower()
+    code  = (code  or "").strip()
+    if type_ in ("*", "any"):
+        return ("*", "*")
+    if type_ == "location" and code:
+        return ("location", code)
+    if type_ in ("airport", "zone") and code:
+        return (type_, "*" if code == "*" else code.upper())
+    return None
+
+def _compile_rules(rows) -> dict[tuple[tuple[str, str], tuple[str, str]], _Rule]:
+    """
+    Компилирует строки prices.csv в таблицу решений (from_sel, to_sel) -> _Rule.
+    Коды, цены и приоритеты разбираются один раз при загрузке; на каждую пару
+    селекторов остаётся только лучшее правило, так что котировка — это
+    несколько обращений к dict за один проход, сколько бы правил ни было.
+    """
+    rules: dict[tuple[tuple[str, str], tuple[str, str]], _Rule] = {}
+    for seq, r in enumerate(rows):
+        fsel = _selector(r.get("from_type") or r.get("from_kind"), r.get("from_code"), r.get("from_id"))
+        tsel = _selector(r.get("to_type")   or r.get("to_kind"),   r.get("to_code"),   r.get("to_id"))
+        if fsel is None or tsel is None:
+            continue
+        rule_type = (r.get("rule_type") or "").strip().lower() or "custom"
+        try:
+            base = float(r.get("price_usd") or r.get("base_usd"))
+        except (TypeError, ValueError):
+            continue
+        try:
+            priority = float(r.get("priority"))
+        except (TypeError, ValueError):
+            priority = _DEFAULT_PRIORITY.get(rule_type, _LAST_PRIORITY)
+        rule = _Rule(priority, seq, rule_type, base)
+        key = (fsel, tsel)
+        if key not in rules or rule < rules[key]:
+            rules[key] = rule
+    return rules
+
+# Кэш котировок: один заказ считает один и тот же маршрут 2–3 раза.
+# Сбрасывается при любой подмене индекса или матрицы.
+_QUOTES = TTLCache(maxsize=4096, ttl=600.0)
+
+class _Index(NamedTuple):
+    rules:   dict              # (from_sel, to_sel) -> _Rule
+    locmap:  LocationRegistry  # общий реестр локаций (data_loader)
+    loc_ids: frozenset  # id точек, на которые есть ("location", id)-правила
+
+def _location_ids(rules: dict) -> frozenset:
+    return frozenset(sel[1] for pair in rules for sel in pair if sel[0] == "location")
+
+# Текущий индекс; подменяется целиком (горячая перезагрузка CSV, тарифы из БД),
+# поэтому котировка берёт его один раз и работает с согласованной парой.
+_INDEX: Optional[_Index] = None
+_CSV_INDEX: Optional[_Index] = None
+# Правила из БД (repo/tariffs.py) поверх CSV; None — только CSV
+_DB_RULES: Optional[dict] = None
+
+def _build_index(built: Optional[dict] = None) -> _Index:
+    # при перезагрузке берём только что построенный реестр, а не текущий
+    registry = (built or {}).get("locations") or get_registry()
+    rules = _compile_rules(_load_prices_rows())
+    return _Index(rules, registry, _location_ids(rules))
+
+def _publish() -> None:
+    global _INDEX
+    _QUOTES.clear()
+    if _DB_RULES:
+        rules = {**_CSV_INDEX.rules, **_DB_RULES}
+        _INDEX = _Index(rules, _CSV_INDEX.locmap, _location_ids(rules))
+    else:
+        _INDEX = _CSV_INDEX
+
+def _install_index(index: _Index) -> None:
+    global _CSV_INDEX
+    _CSV_INDEX = index
+    _publish()
+
+def use_db_rules(rules: Optional[dict]) -> None:
+    """
+    Подключает правила из БД (результат _compile_rules). Для той же пары селекторов
+    они перекрывают CSV-правила; None/{} — вернуться к чистому CSV.
+    """
+    global _DB_RULES
+    _DB_RULES = rules or None
+    if _CSV_INDEX is None:
+        _install_index(_build_index())
+    else:
+        _publish()
+
+def _index() -> _Index:
+    if _INDEX is None:
+        _install_index(_build_index())
+    return _INDEX
+
+register_reference("pricing", _build_index, _install_index)
+
+# ───────────── Разрешение правил ─────────────
+
+def _sides(kind: str, loc: Optional[Location], loc_id: str) -> list[tuple[str, str]]:
+    """Все селекторы, под которые подпадает точка маршрута."""
+    sides = []
+    if loc_id:
+        sides.append(("location", loc_id))
+    code = loc.code if loc else ""  # VRA/HAV для airport
+    if kind == "airport" and code:
+        sides += [("airport", code), ("airport", "*")]
+    zone = loc.zone if loc else ""  # hotel/restaurant считаем по зоне
+    if zone:
+        sides += [("zone", zone), ("zone", "*")]
+    sides.append(("*", "*"))
+    return sides
+
+def _resolve(rules: dict, fsides, tsides, when_hhmm: Optional[str], options: dict) -> Tuple[float, dict]:
+    best = None
+    for f in fsides:
+        for t in tsides:
+            rule = rules.get((f, t))
+            if rule is not None and (best is None or rule < best):
+                best = rule
+    if best is None:
+        # Ничего не нашли
+        return 0.0, {"rule": "not_found"}
+    total, mods = _apply_mods(best.base, when_hhmm, options)
+    return total, {"rule": best.rule_type, "base_usd": best.base, "mods": mods}
 
 # ───────────── Основная функция ─────────────
 
+# Предрасчитанная матрица цен (см. price_matrix.py); None — считаем по правилам
+_MATRIX = None
+
+def use_price_matrix(matrix) -> None:
+    """Подключает (или отключает, matrix=None) матрицу для quote_price."""
+    global _MATRIX
+    _MATRIX = matrix
+    _QUOTES.clear()
+
 def quote_price(
     service: str,
     from_kind: str, from_id: Optional[str],
@@ -65,68 +207,122 @@ def quote_price(
     options:   Optional[dict] = None,
 ) -> Tuple[float, dict]:
     """
-    Возвращает (цена_usd, payload) по CSV-правилам:
+    Возвращает (цена_usd, payload) по таблице решений из CSV (см. _compile_rules):
       - airport↔airport (rule_type=airport_airport, code=VRA/HAV)
       - airport↔zone    (rule_type=airport_zone,    to_code=A/B/C/D)
       - zone↔zone       (rule_type=zone_zone,       A↔B и т.п.)
       - intra_zone      (rule_type=intra_zone,      A↔A и т.п.)
+      - плюс персональные правила точек и «*»-правила — по колонке priority
     """
+    # Матрица собрана по CSV — при активных тарифах из БД она не годится
+    if _MATRIX is not None and _DB_RULES is None:
+        hit = _MATRIX.quote(from_kind, from_id, to_kind, to_id, when_hhmm, options)
+        if hit is not None:
+            return hit
+    return _quote_from_rules(from_kind, from_id, to_kind, to_id, when_hhmm, options)
+
+
+def _quote_from_rules(
+    from_kind: str, from_id: Optional[str],
+    to_kind:   str, to_id:   Optional[str],
+    when_hhmm: Optional[str] = None,
+    options:   Optional[dict] = None,
+) -> Tuple[float, dict]:
     options = options or {}
-    prices  = _load_prices_rows()
-    locmap  = _load_locations_map()
+    rules, locmap, _loc_ids = _index()
 
-    fk = (from_kind or "").lower()
-    tk = (to_kind   or "").lower()
     fid = (from_id or "").strip()
     tid = (to_id   or "").strip()
+    fsides = _sides((from_kind or "").lower(), locmap.get(fid), fid)
+    tsides = _sides((to_kind   or "").lower(), locmap.get(tid), tid)
+    return _resolve(rules, fsides, tsides, when_hhmm, options)
 
-    fzone = locmap.get(fid, {}).get("zone", "")
-    tzone = locmap.get(tid, {}).get("zone", "")
-    facode = locmap.get(fid, {}).get("code", "")  # VRA/HAV для airport
-    tacode = locmap.get(tid, {}).get("code", "")
-
-    # 1) airport↔airport
-    if fk == "airport" and tk == "airport" and facode and tacode:
-        for r in prices:
-            if r["rule_type"] == "airport_airport" and r["from_type"] == "airport" and r["to_type"] == "airport":
-                if r["from_code"].upper() == facode.upper() and r["to_code"].upper() == tacode.upper():
-                    base = float(r["price_usd"])
-                    total, mods = _apply_mods(base, when_hhmm, options)
-                    return total, {"rule": "airport_airport", "base_usd": base, "mods": mods}
-
-    # 2) airport↔zone (hotel/restaurant считаем по зоне)
-    if fk == "airport" and tzone:
-        for r in prices:
-            if r["rule_type"] == "airport_zone" and r["from_type"] == "airport" and r["to_type"] == "zone":
-                if r["from_code"].upper() == facode.upper() and r["to_code"].upper() == tzone.upper():
-                    base = float(r["price_usd"])
-                    total, mods = _apply_mods(base, when_hhmm, options)
-                    return total, {"rule": "airport_zone", "base_usd": base, "mods": mods}
-    if tk == "airport" and fzone:
-        for r in prices:
-            if r["rule_type"] == "airport_zone" and r["from_type"] == "zone" and r["to_type"] == "airport":
-                if r["from_code"].upper() == fzone.upper() and r["to_code"].upper() == tacode.upper():
-                    base = float(r["price_usd"])
-                    total, mods = _apply_mods(base, when_hhmm, options)
-                    return total, {"rule": "airport_zone", "base_usd": base, "mods": mods}
-
-    # 3) зона↔зона
-    if fzone and tzone:
-        if fzone.upper() == tzone.upper():
-            # intra_zone
-            for r in prices:
-                if r["rule_type"] == "intra_zone" and r["from_type"] == "zone" and r["to_type"] == "zone":
-                    if r["from_code"].upper() == fzone.upper() and r["to_code"].upper() == tzone.upper():
-                        base = float(r["price_usd"])
-                        total, mods = _apply_mods(base, when_hhmm, options)
-                        return total, {"rule": "intra_zone", "base_usd": base, "mods": mods}
-        else:
-            for r in prices:
-                if r["rule_type"] == "zone_zone" and r["from_type"] == "zone" and r["to_type"] == "zone":
-                    if r["from_code"].upper() == fzone.upper() and r["to_code"].upper() == tzone.upper():
-                        base = float(r["price_usd"])
-                        total, mods = _apply_mods(base, when_hhmm, options)
-                        return total, {"rule": "zone_zone", "base_usd": base, "mods": mods}
-
-    # Ничего не нашли
-    return 0.0, {"rule": "not_found"}
+
+def quote_prices_batch(
+    service: str,
+    from_kind: str, from_id: Optional[str],
+    to: Iterable[Tuple[str, Optional[str]]],
+    when_hhmm: Optional[str] = None,
+    options:   Optional[dict] = None,
+) -> list[Tuple[float, dict]]:
+    """
+    Цены от одной точки до списка точек `to` = [(kind, id), ...] за один вызов.
+    Результат — список (цена_usd, payload) в порядке `to`, как у quote_price.
+
+    Цена зависит только от (kind, zone, code) точки назначения (плюс id, если на
+    неё есть персональное правило), поэтому правило разрешается один раз на такую
+    сигнатуру (их единицы, а кнопок — десятки).
+    Одинаковые payload'ы — общий объект, не мутируйте их.
+    """
+    options = options or {}
+    rules, locmap, loc_ids = _index()
+
+    fid = (from_id or "").strip()
+    fsides = _sides((from_kind or "").lower(), locmap.get(fid), fid)
+
+    resolved: dict[tuple, Tuple[float, dict]] = {}
+    out: list[Tuple[float, dict]] = []
+    for to_kind, to_id in to:
+        tid = (to_id or "").strip()
+        tloc = locmap.get(tid)
+        # точки с персональными правилами считаем по id, остальные — по сигнатуре
+        sig = ((to_kind or "").lower(), tloc.zone if tloc else "", tloc.code if tloc else "",
+               tid if tid in loc_ids else "")
+        res = resolved.get(sig)
+        if res is None:
+            tsides = _sides(sig[0], tloc, tid)
+            res = resolved[sig] = _resolve(rules, fsides, tsides, when_hhmm, options)
+        out.append(res)
+    return out
+
+
+# ───────────── Кэш котировок ─────────────
+
+def configure_quote_cache(maxsize: int, ttl: float) -> None:
+    """Размер и TTL кэша котировок (из config при старте бота)."""
+    _QUOTES.maxsize = maxsize
+    _QUOTES.ttl = ttl
+    _QUOTES.clear()
+
+def quote_cache_stats() -> dict:
+    return _QUOTES.stats()
+
+def quote_key(
+    service: str,
+    from_kind: str, from_id: Optional[str],
+    to_kind:   str, to_id:   Optional[str],
+    when_hhmm: Optional[str] = None,
+    options:   Optional[dict] = None,
+) -> str:
+    """
+    Ключ котировки: всё, от чего зависит цена. Время сведено к бакету day/night,
+    опции — к каноничному JSON. Строка, чтобы её можно было хранить в FSM state.
+    """
+    bucket = "night" if is_night(when_hhmm) else "day"
+    opts = json.dumps(options or {}, sort_keys=True, separators=(",", ":"), default=str)
+    return "|".join((
+        service or "",
+        f"{(from_kind or '').lower()}:{(from_id or '').strip()}",
+        f"{(to_kind or '').lower()}:{(to_id or '').strip()}",
+        bucket, opts,
+    ))
+
+def quote_price_cached(
+    service: str,
+    from_kind: str, from_id: Optional[str],
+    to_kind:   str, to_id:   Optional[str],
+    when_hhmm: Optional[str] = None,
+    options:   Optional[dict] = None,
+) -> Tuple[str, float, dict]:
+    """
+    quote_price через кэш. Возвращает (ключ, цена_usd, payload); ключ стоит
+    сохранить рядом с ценой, чтобы на подтверждении понять, менялись ли входные данные.
+    payload общий для всех попаданий — не мутируйте его.
+    """
+    key = quote_key(service, from_kind, from_id, to_kind, to_id, when_hhmm, options)
+    hit = _QUOTES.get(key)
+    if hit is None:
+        hit = quote_price(service, from_kind, from_id, to_kind, to_id, when_hhmm, options)
+        _QUOTES.set(key, hit)
+    price, payload = hit
+    return key, price, payload
@@ -0,0 +1,207 @@
+# repo/db.py — управляемый пул asyncpg: прогрев, проверки, переподключение, предохранитель
+#
+# Раньше одна неудачная попытка create_pool включала NO-DB режим до рестарта:
+# короткий сбой БД превращался в часы заказов с фиктивными id. Теперь:
+#   * пул создаётся с заданными размерами, и min_size соединений открываются
+#     на старте (ping_db), а не на первых подтверждениях;
+#   * фоновая задача раз в health_interval делает SELECT 1;
+#   * после failure_threshold ошибок подряд (проверок или обрывов связи в
+#     запросах; успешный запрос сбрасывает счёт) пул закрывается,
+#     предохранитель «размыкается»: get_pool() сразу отдаёт None
+#     (вызовы идут по NO-DB пути без ожидания таймаутов), а фон пытается
+#     переподключиться с экспоненциальной паузой (1, 2, 4 … reconnect_max сек);
+#   * удалось — пул снова отдаётся, и заказы опять пишутся в БД.
+
+from __future__ import annotations
+import asyncio
+import logging
+import random
+import time
+from typing import Optional
+
+import asyncpg
+
+from config import (
+    DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, DB_SSLMODE,
+    DB_POOL_MIN, DB_POOL_MAX, DB_STATEMENT_CACHE, DB_COMMAND_TIMEOUT, DB_CONNECT_TIMEOUT,
+    DB_HEALTH_INTERVAL, DB_RECONNECT_MAX, DB_FAILURE_THRESHOLD,
+)
+
+log = logging.getLogger("repo.db")
+
+# потеря связи с БД (а не ошибка конкретного запроса) — её считает предохранитель
+CONNECTION_LOST = (
+    OSError,
+    asyncpg.PostgresConnectionError,
+    asyncpg.InterfaceError,
+    asyncpg.CannotConnectNowError,
+)
+# ошибки, после которых неизвестно, выполнился ли запрос: потеря связи или
+# command_timeout (медленный запрос — не повод рвать пул, но и повторять его нельзя)
+CONNECTION_ERRORS = CONNECTION_LOST + (asyncio.TimeoutError,)
+
+
+class ManagedPool:
+    """Пул asyncpg с проверками здоровья и переподключением в фоне."""
+
+    def __init__(
+        self,
+        min_size: int = 2,
+        max_size: int = 10,
+        statement_cache_size: int = 256,
+        command_timeout: float = 10.0,
+        connect_timeout: float = 5.0,
+        health_interval: float = 15.0,
+        reconnect_max: float = 60.0,
+        failure_threshold: int = 3,
+    ):
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self.command_timeout = command_timeout
+        self.connect_timeout = connect_timeout
+        self.health_interval = health_interval
+        self.reconnect_max = reconnect_max
+        self.failure_threshold = failure_threshold
+        self._pool: Optional[asyncpg.Pool] = None
+        self._lock = asyncio.Lock()
+        self._failures = 0
+        self._backoff = 1.0
+        self._retry_at = 0.0  # до этого времени предохранитель разомкнут
+        self._monitor: asyncio.Task | None = None
+
+    @property
+    def available(self) -> bool:
+        return self._pool is not None
+
+    async def get(self) -> Optional[asyncpg.Pool]:
+        """Пул или None, если БД недоступна (предохранитель разомкнут)."""
+        if self._pool is not None:
+            return self._pool
+        if time.monotonic() < self._retry_at:
+            return None  # не ждём таймаут подключения на каждом апдейте
+        await self._connect()
+        return self._pool
+
+    async def _connect(self) -> None:
+        async with self._lock:  # одно подключение на всех ожидающих
+            if self._pool is not None or time.monotonic() < self._retry_at:
+                return
+            try:
+                self._pool = await asyncpg.create_pool(
+                    host=DB_HOST,
+                    port=int(DB_PORT),
+                    database=DB_NAME,
+                    user=DB_USER,
+                    password=DB_PASSWORD,
+                    ssl=DB_SSLMODE,
+                    min_size=self.min_size,  # прогрев: столько соединений открывается сразу
+                    max_size=self.max_size,
+                    statement_cache_size=self.statement_cache_size,
+                    command_timeout=self.command_timeout,
+                    timeout=self.connect_timeout,
+                )
+            except Exception as e:
+                self._trip(e)
+                return
+            if self._retry_at:
+                log.warning("DB connection restored")
+            self._failures = 0
+            self._backoff = 1.0
+            self._retry_at = 0.0
+
+    def _trip(self, error: BaseException) -> None:
+        """Размыкает предохранитель до следующей попытки (пауза растёт вдвое)."""
+        delay = self._backoff * random.uniform(0.8, 1.2)  # разброс: воркеры не ломятся разом
+        self._retry_at = time.monotonic() + delay
+        log.warning("DB unavailable: %s — retry in %.1fs (NO-DB until then)", error, delay)
+        self._backoff = min(self._backoff * 2, self.reconnect_max)
+
+    def _fail(self, error: BaseException) -> None:
+        self._failures += 1
+        if self._failures >= self.failure_threshold and self._pool is not None:
+            pool, self._pool = self._pool, None
+            self._trip(error)
+            pool.terminate()  # соединения, скорее всего, мертвы — не ждём close()
+
+    def report(self, error: BaseException | None) -> None:
+        """
+        Итог запроса к БД: None — успех (счётчик ошибок сбрасывается); потери
+        связи копятся до failure_threshold подряд. Таймаут одного медленного
+        запроса не считается: terminate() оборвал бы чужие запросы — таймауты
+        считает только probe().
+        """
+        if error is None:
+            self._failures = 0
+        elif isinstance(error, CONNECTION_LOST) and not isinstance(error, asyncio.TimeoutError):
+            self._fail(error)  # TimeoutError в 3.11+ — подкласс OSError
+
+    async def probe(self) -> bool:
+        """SELECT 1 через пул; False — БД не ответила."""
+        pool = self._pool
+        if pool is None:
+            return False
+        try:
+            async with pool.acquire(timeout=self.connect_timeout) as con:
+                await con.fetchval("SELECT 1", timeout=self.connect_timeout)
+        except Exception as e:
+            self._fail(e)
+            return False
+        self._failures = 0
+        return True
+
+    async def _monitor_loop(self) -> None:
+        while True:
+            if self._pool is None:
+                await asyncio.sleep(max(0.0, self._retry_at - time.monotonic()))
+                await self.get()
+            else:
+                await asyncio.sleep(self.health_interval)
+                await self.probe()
+
+    async def start(self) -> bool:
+        """Подключение с прогревом и запуск фоновых проверок. True — БД доступна."""
+        await self.get()
+        if self._monitor is None or self._monitor.done():
+            self._monitor = asyncio.create_task(self._monitor_loop())
+        return self._pool is not None
+
+    async def close(self) -> None:
+        if self._monitor is not None:
+            self._monitor.cancel()
+            self._monitor = None
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            await pool.close()
+
+
+db = ManagedPool(
+    min_size=DB_POOL_MIN,
+    max_size=DB_POOL_MAX,
+    statement_cache_size=DB_STATEMENT_CACHE,
+    command_timeout=DB_COMMAND_TIMEOUT,
+    connect_timeout=DB_CONNECT_TIMEOUT,
+    health_interval=DB_HEALTH_INTERVAL,
+    reconnect_max=DB_RECONNECT_MAX,
+    failure_threshold=DB_FAILURE_THRESHOLD,
+)
+
+
+async def get_pool():
+    """
+    Возвращает пул подключений к БД или None, если БД сейчас недоступна.
+    """
+    return await db.get()
+
+
+async def ping_db():
+    """
+    Старт: подключение с прогревом и фоновые проверки. Без БД — NO-DB режим
+    до успешного переподключения.
+    """
+    if not await db.start():
+        logging.warning("Skipping DB ping (NO-DB mode, reconnecting in background)")
+        return
+
+    async with db._pool.acquire() as conn:
+        await conn.execute("SELECT 1")
@@ -0,0 +1,286 @@
+# repo/fsm_storage.py — FSM-хранилище aiogram в PostgreSQL с отложенной записью
+#
+# Состояние и данные диалога лежат в uslugicuba.fsm_state и переживают рестарт.
+# Чтения идут из кэша в памяти процесса (в БД — только при первом обращении
+# к ключу), а записи копятся и уходят одним пакетом раз в flush_interval:
+# 3–5 вызовов update_data/set_state за апдейт превращаются в одну строку UPSERT.
+# Ключом владеет один процесс (при нескольких воркерах — шардирование по
+# user id), поэтому кэш не расходится с БД.
+# Без БД (NO-DB режим) работает как MemoryStorage:
+# изменения копятся в кэше (не больше cache_size ключей) и записываются,
+# когда пул вернётся (repo/db.py).
+#
+# Таблицу бот не создаёт: она ставится миграцией migrations/001_fsm_state.sql.
+# Без неё хранилище пишет ошибку в лог и работает как без БД. Диалоги, к
+# которым не обращались idle_ttl секунд, удаляются из таблицы фоновой задачей
+# (кроме ключей keep_destinies — например, выбранного языка).
+
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+from repo.orders import db, get_pool
+
+log = logging.getLogger("repo.fsm_storage")
+
+_TABLE_EXISTS_SQL = "SELECT to_regclass('uslugicuba.fsm_state') IS NOT NULL"
+
+_SELECT_SQL = "SELECT state, data::text FROM uslugicuba.fsm_state WHERE key = $1"
+
+_UPSERT_SQL = """
+INSERT INTO uslugicuba.fsm_state (key, state, data, updated_at)
+SELECT k, s, d::jsonb, now() FROM unnest($1::text[], $2::text[], $3::text[]) AS t(k, s, d)
+ON CONFLICT (key) DO UPDATE SET state = EXCLUDED.state, data = EXCLUDED.data, updated_at = now()
+"""
+
+_DELETE_SQL = "DELETE FROM uslugicuba.fsm_state WHERE key = ANY($1::text[])"
+
+# ключ — bot:chat:user:thread:destiny (см. PgStorage._key)
+_EXPIRE_SQL = """
+DELETE FROM uslugicuba.fsm_state
+WHERE updated_at < now() - make_interval(secs => $1)
+  AND split_part(key, ':', 5) <> ALL($2::text[])
+"""
+
+
+_RETRY_DELAY = 5.0  # пауза перед повтором записи после ошибки БД, сек
+_TABLE_RECHECK = 60.0  # как часто снова искать таблицу, если миграция не применена, сек
+
+
+def _state_name(state: StateType) -> Optional[str]:
+    return state.state if isinstance(state, State) else state
+
+
+def _dump(data: Dict[str, Any]) -> str:
+    # компактно: без пробелов, кириллица как есть (не \uXXXX)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str)
+
+
+class PgStorage(BaseStorage):
+    """
+    flush_interval — сколько копить записи, сек; 0 — писать сразу (без окна
+    потери при падении, но запрос в БД на каждый вызов).
+    cache_size — сколько ключей держать в памяти; вытесняются только записанные.
+    idle_ttl — через сколько секунд без записей диалог удаляется из таблицы
+    (0 — никогда); проверка раз в sweep_interval. keep_destinies — ключи с
+    этими destiny не удаляются.
+    """
+
+    def __init__(
+        self,
+        flush_interval: float = 0.2,
+        cache_size: int = 10000,
+        idle_ttl: float = 86400.0,
+        sweep_interval: float = 60.0,
+        keep_destinies: Tuple[str, ...] = (),
+    ):
+        self.flush_interval = flush_interval
+        self.cache_size = cache_size
+        self.idle_ttl = idle_ttl
+        self.sweep_interval = sweep_interval
+        self.keep_destinies = keep_destinies
+        self._records: OrderedDict[str, list] = OrderedDict()  # key -> [state, data]
+        self._dirty: set[str] = set()
+        self._wake = asyncio.Event()
+        self._flusher: asyncio.Task | None = None
+        self._sweeper: asyncio.Task | None = None
+        self._table_ready = False
+        self._table_retry_at = 0.0
+        self._table_lock = asyncio.Lock()
+        self.writes = 0  # выполненные пакеты записи — для метрик/бенча
+        self.expired = 0  # удалено брошенных диалогов
+
+    @staticmethod
+    def _key(key: StorageKey) -> str:
+        return f"{key.bot_id}:{key.chat_id}:{key.user_id}:{key.thread_id or ''}:{key.destiny}"
+
+    async def _pool(self):
+        """Пул, если БД доступна и таблица на месте; иначе None (работаем в памяти)."""
+        pool = await get_pool()
+        if not pool or self._table_ready:
+            return pool
+        if time.monotonic() < self._table_retry_at:
+            return None
+        async with self._table_lock:  # первые апдейты приходят пачкой
+            if not self._table_ready and time.monotonic() >= self._table_retry_at:
+                async with pool.acquire() as con:
+                    self._table_ready = bool(await con.fetchval(_TABLE_EXISTS_SQL))
+                if not self._table_ready:
+                    self._table_retry_at = time.monotonic() + _TABLE_RECHECK
+                    log.error("uslugicuba.fsm_state not found — apply migrations/001_fsm_state.sql; "
+                              "FSM is kept in memory until then")
+        return pool if self._table_ready else None
+
+    async def _record(self, key: StorageKey) -> list:
+        k = self._key(key)
+        rec = self._records.get(k)
+        if rec is None:
+            rec = [None, {}]
+            try:
+                pool = await self._pool()
+                if pool:
+                    row = await pool.fetchrow(_SELECT_SQL, k)
+                    db.report(None)
+                    if row:
+                        rec = [row["state"], json.loads(row["data"])]
+            except Exception as e:
+                db.report(e)
+                # строка в БД могла уцелеть: пустую запись не кэшируем, иначе flush
+                # затёр бы её; следующий апдейт прочитает ключ заново
+                log.warning("FSM read of %s failed: %s — serving an empty record", k, e)
+                return self._records.get(k, rec)
+            if not pool and k not in self._records and len(self._records) >= self.cache_size:
+                self._evict()
+                if len(self._records) >= self.cache_size:
+                    # без БД кэш — единственная копия грязных ключей: не растём сверх cache_size,
+                    # диалог нового пользователя живёт только в пределах апдейта
+                    log.warning("FSM cache full (%d keys) and DB unavailable — %s not stored", len(self._records), k)
+                    return rec
+            # пока ждали БД, ключ мог появиться (второй апдейт того же пользователя)
+            rec = self._records.setdefault(k, rec)
+        self._records.move_to_end(k)
+        return rec
+
+    async def _touch(self, key: StorageKey) -> None:
+        k = self._key(key)
+        if k not in self._records:
+            return  # запись не попала в кэш (нет БД и нет места) — писать нечего
+        self._dirty.add(k)
+        if self.flush_interval <= 0 and await self.flush():
+            return  # не записалось — допишет фоновый цикл, когда БД вернётся
+        if self._flusher is None or self._flusher.done():
+            self._flusher = asyncio.create_task(self._flush_loop())
+        if self.idle_ttl > 0 and (self._sweeper is None or self._sweeper.done()):
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+        self._wake.set()
+
+    # ───── BaseStorage ─────
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        rec = await self._record(key)
+        rec[0] = _state_name(state)
+        await self._touch(key)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        return (await self._record(key))[0]
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        rec = await self._record(key)
+        rec[1] = data.copy()
+        await self._touch(key)
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        return (await self._record(key))[1].copy()
+
+    async def get_record(self, key: StorageKey) -> Tuple[Optional[str], Dict[str, Any]]:
+        """Состояние и данные одним вызовом (см. middlewares/fsm_unit.py)."""
+        state, data = await self._record(key)
+        return state, data.copy()
+
+    async def set_record(self, key: StorageKey, state: StateType, data: Dict[str, Any]) -> None:
+        """Состояние и данные одним вызовом (см. middlewares/fsm_unit.py)."""
+        rec = await self._record(key)
+        rec[0], rec[1] = _state_name(state), data.copy()
+        await self._touch(key)
+
+    async def close(self) -> None:
+        for task in (self._flusher, self._sweeper):
+            if task is not None:
+                task.cancel()
+        self._flusher = self._sweeper = None
+        await self.flush()
+
+    # ───── Запись ─────
+
+    async def _flush_loop(self) -> None:
+        while True:
+            await self._wake.wait()
+            await asyncio.sleep(self.flush_interval)  # копим записи соседних апдейтов
+            self._wake.clear()
+            if not await self.flush():
+                self._wake.set()
+                await asyncio.sleep(_RETRY_DELAY)
+
+    async def flush(self) -> bool:
+        """
+        Пишет все изменённые ключи одним пакетом. False — БД недоступна или
+        вернула ошибку, ключи остались грязными и будут записаны следующей попыткой.
+        """
+        if not self._dirty:
+            return True
+        try:
+            pool = await self._pool()
+        except Exception as e:
+            db.report(e)
+            pool = None
+        if not pool:
+            return False  # без БД вытеснять нельзя: кэш — единственная копия
+        dirty, self._dirty = self._dirty, set()
+        upsert: list[tuple[str, Optional[str], str]] = []
+        delete: list[str] = []
+        for k in dirty:
+            state, data = self._records.get(k, (None, {}))
+            if state is None and not data:
+                delete.append(k)  # state.clear() — строку не храним
+            else:
+                upsert.append((k, state, _dump(data)))
+        try:
+            async with pool.acquire() as con:
+                async with con.transaction():
+                    if upsert:
+                        keys, states, datas = zip(*upsert)
+                        await con.execute(_UPSERT_SQL, list(keys), list(states), list(datas))
+                    if delete:
+                        await con.execute(_DELETE_SQL, delete)
+            self.writes += 1
+            db.report(None)
+        except Exception as e:
+            db.report(e)
+            log.warning("FSM flush failed (%d keys): %s — will retry", len(dirty), e)
+            self._dirty |= dirty
+            return False
+        self._evict()
+        return True
+
+    def _evict(self) -> None:
+        extra = len(self._records) - self.cache_size
+        if extra <= 0:
+            return
+        for k in list(self._records):
+            if extra <= 0:
+                break
+            if k not in self._dirty:
+                del self._records[k]
+                extra -= 1
+
+    # ───── Брошенные диалоги ─────
+
+    async def expire(self) -> int:
+        """Удаляет из таблицы диалоги без записей дольше idle_ttl; возвращает, сколько удалено."""
+        pool = await self._pool()
+        if not pool or self.idle_ttl <= 0:
+            return 0
+        async with pool.acquire() as con:
+            status = await con.execute(_EXPIRE_SQL, float(self.idle_ttl), list(self.keep_destinies))
+        removed = int(status.split()[-1]) if status else 0  # "DELETE n"
+        self.expired += removed
+        return removed
+
+    async def _sweep_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.sweep_interval)
+            try:
+                removed = await self.expire()
+            except Exception as e:
+                db.report(e)
+                log.warning("FSM expiry failed: %s", e)
+                continue
+            if removed:
+                log.info("FSM: expired %d idle dialogs", removed)
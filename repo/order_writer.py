@@ -0,0 +1,209 @@
+# repo/order_writer.py — групповая запись заказов (group commit)
+#
+# Когда садится рейс, десятки пользователей подтверждают заказ за секунды, и
+# каждый create_order берёт своё соединение и коммитит отдельно. Здесь заказы
+# копятся до window секунд (или до max_batch) и пишутся одним оператором:
+#   * upsert svc.user + uslugicuba.customers для новых/изменившихся клиентов
+#     (повторные клиенты берут id из кэша repo.orders);
+#   * INSERT всех заказов через unnest; id выдаёт nextval в том же операторе
+#     и возвращает вместе с номером строки пакета — каждый вызывающий
+#     получает свой id через свой Future.
+# Всё это — один оператор (_INSERT_BATCH_SQL): один round-trip и один
+# коммит на пакет вместо одного на заказ.
+# Одиночный заказ при спокойном трафике окна не ждёт и идёт через create_order.
+# Если пакет упал на ошибке запроса, заказы пишутся по одному через
+# create_order: ошибка одного заказа не роняет остальные. При обрыве связи
+# оператор мог и закоммититься — повтор дал бы дубли, поэтому все вызывающие
+# получают ошибку, а заказы остаются в журнале (repo/outbox.py), где повтор
+# отсекается ключом идемпотентности.
+
+from __future__ import annotations
+import asyncio
+import logging
+from typing import List, Tuple
+
+from config import ORDER_BATCH_WINDOW, ORDER_BATCH_MAX
+from repo import orders
+from repo.db import CONNECTION_ERRORS, db
+from repo.orders import (
+    _CUSTOMER_IDS, _SERVICE_IDS, _USER_IDS, _cached_ids, _fake_order_id, _order_fields,
+)
+
+log = logging.getLogger("repo.order_writer")
+
+# Весь пакет — одним оператором (атомарен сам по себе, без BEGIN/COMMIT):
+# t — строки пакета (category — сразу enum services.category: enum = text не сравнивается);
+# f — клиенты без id в кэше (последний заказ на tg_id);
+# u/c — их upsert; o — заказы с id из nextval и номером строки n.
+_INSERT_BATCH_SQL = """
+WITH t AS (
+    SELECT * FROM unnest(
+        $1::bigint[], $2::text[], $3::text[], $4::bigint[], $5::bigint[], $6::uslugicuba.service_category[],
+        $7::text[], $8::text[], $9::timestamptz[], $10::int[], $11::text[]
+    ) WITH ORDINALITY AS t(tg_id, username, lang, customer_id, service_id, category,
+                          pickup_text, dropoff_text, when_at, pax, meta, n)
+), f AS (
+    SELECT DISTINCT ON (tg_id) tg_id, username, lang FROM t
+    WHERE customer_id IS NULL ORDER BY tg_id, n DESC
+), u AS (
+    INSERT INTO svc."user" (tg_id, username)
+    SELECT tg_id, username FROM f
+    ON CONFLICT (tg_id) DO UPDATE SET username = EXCLUDED.username
+    RETURNING id, tg_id
+), c AS (
+    INSERT INTO uslugicuba.customers (user_id, lang)
+    SELECT u.id, f.lang FROM u JOIN f USING (tg_id)
+    ON CONFLICT (user_id) DO UPDATE SET lang = EXCLUDED.lang
+    RETURNING id, user_id
+), o AS (
+    SELECT t.n, t.tg_id, nextval(pg_get_serial_sequence('uslugicuba.orders', 'id')) AS id,
+           COALESCE(t.customer_id, c.id) AS customer_id, u.id AS user_id,
+           COALESCE(t.service_id, (SELECT s.id FROM uslugicuba.services s
+                                   WHERE s.category = t.category LIMIT 1)) AS service_id,
+           t.pickup_text, t.dropoff_text, t.when_at, t.pax, t.meta
+    FROM t
+    LEFT JOIN u ON u.tg_id = t.tg_id AND t.customer_id IS NULL
+    LEFT JOIN c ON c.user_id = u.id
+), ins AS (
+    INSERT INTO uslugicuba.orders (
+      id, customer_id, service_id, state,
+      pickup_text, dropoff_text, when_at, pax,
+      meta
+    )
+    SELECT id, customer_id, service_id, 'new', pickup_text, dropoff_text, when_at, COALESCE(pax, 1), meta::jsonb
+    FROM o
+)
+SELECT n, id, customer_id, user_id, service_id FROM o ORDER BY n
+"""
+
+_Pending = Tuple[dict, str, asyncio.Future]
+
+
+class OrderWriter:
+    """
+    window — сколько максимум копить заказы после первого, сек; max_batch —
+    пишем сразу, как набралось столько.
+    """
+
+    def __init__(self, window: float = 0.005, max_batch: int = 100):
+        self.window = window
+        self.max_batch = max_batch
+        self._queue: asyncio.Queue[_Pending] = asyncio.Queue()
+        self._task: asyncio.Task | None = None
+        self._last_batch = 0
+        self.batches = 0  # записанные пакеты — для метрик/бенча
+        self.orders = 0
+
+    async def submit(self, order: dict, category: str = "taxi") -> int:
+        """Ставит заказ в ближайший пакет и ждёт его id (как create_order)."""
+        fut = asyncio.get_running_loop().create_future()
+        self._queue.put_nowait((order, category, fut))
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        return await fut
+
+    async def close(self) -> None:
+        """Дописывает принятые заказы и останавливает цикл записи."""
+        if self._task is not None:
+            await self._queue.join()
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            batch = [await self._queue.get()]
+            # одиночный заказ в тишине не ждёт окна; копим, только когда идёт поток,
+            # и только пока заказы продолжают прибывать (не дольше window)
+            if self.window > 0 and (self._last_batch > 1 or not self._queue.empty()):
+                loop = asyncio.get_running_loop()
+                deadline, seen = loop.time() + self.window, -1
+                while seen != self._queue.qsize() < self.max_batch - 1 and loop.time() < deadline:
+                    seen = self._queue.qsize()
+                    await asyncio.sleep(self.window / 5)
+            while len(batch) < self.max_batch and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            self._last_batch = len(batch)
+            try:
+                await self._write(batch)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write(self, batch: List[_Pending]) -> None:
+        if len(batch) == 1:  # без unnest и nextval: обычный create_order
+            await self._write_one(*batch[0])
+            return
+        try:
+            ids = await self._write_batch([(o, c) for o, c, _f in batch])
+        except CONNECTION_ERRORS as e:
+            db.report(e)
+            log.warning("Order batch of %d lost the connection: %s — not retrying", len(batch), e)
+            for _o, _c, fut in batch:
+                if not fut.done():
+                    fut.set_exception(e)
+            return
+        except Exception as e:
+            log.warning("Order batch of %d failed: %s — writing one by one", len(batch), e)
+            for pending in batch:
+                await self._write_one(*pending)
+            return
+        for (_o, _c, fut), oid in zip(batch, ids):
+            if not fut.done():
+                fut.set_result(oid)
+
+    @staticmethod
+    async def _write_one(order: dict, category: str, fut: asyncio.Future) -> None:
+        try:
+            oid = await orders.create_order(order, category)
+        except Exception as exc:
+            if not fut.done():
+                fut.set_exception(exc)
+            return
+        if not fut.done():  # вызывающий мог уйти по таймауту
+            fut.set_result(oid)
+
+    async def _write_batch(self, batch: List[Tuple[dict, str]]) -> List[int]:
+        pool = await orders.get_pool()
+        if not pool:
+            return [_fake_order_id() for _ in batch]
+
+        cols: List[list] = [[] for _ in range(11)]
+        for order, category in batch:
+            # id из кэша, если клиент не новый и username/lang не менялись; иначе NULL — upsert
+            customer_id, service_id = _cached_ids(order, category) or (None, _SERVICE_IDS.get(category))
+            row = (order["client_tg_id"], order.get("username"), order.get("lang", "ru"),
+                   customer_id, service_id, category, *_order_fields(order))
+            for col, value in zip(cols, row):
+                col.append(value)
+
+        async with pool.acquire() as con:
+            rows = await con.fetch(_INSERT_BATCH_SQL, *cols)
+        db.report(None)
+
+        for (order, category), r in zip(batch, rows):
+            if r["user_id"] is not None:  # клиент прошёл upsert — запоминаем (последний заказ побеждает)
+                _USER_IDS.set(order["client_tg_id"], (r["user_id"], order.get("username")))
+                _CUSTOMER_IDS.set(r["user_id"], (r["customer_id"], order.get("lang", "ru")))
+            if r["service_id"] is not None:
+                _SERVICE_IDS.set(category, r["service_id"])
+        self.batches += 1
+        self.orders += len(batch)
+        log.info("Order batch inserted: %d orders, ids %s..%s", len(rows), rows[0]["id"], rows[-1]["id"])
+        return [int(r["id"]) for r in rows]
+
+
+_writer: OrderWriter | None = None
+
+
+def get_order_writer() -> OrderWriter:
+    global _writer
+    if _writer is None:
+        _writer = OrderWriter(window=ORDER_BATCH_WINDOW, max_batch=ORDER_BATCH_MAX)
+    return _writer
+
+
+async def submit_order(order: dict, category: str = "taxi") -> int:
+    """create_order через групповую запись (ORDER_BATCH_WINDOW=0 — сразу, без пакетов)."""
+    if ORDER_BATCH_WINDOW <= 0:
+        return await orders.create_order(order, category)
+    return await get_order_writer().submit(order, category)
@@ -2,13 +2,11 @@
 import asyncpg
 import logging
 import json
-from config import DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD, DB_SSLMODE
-
-_pool = None
-NO_DB = False
+from cache import TTLCache
+from config import REPO_CACHE_SIZE, REPO_CACHE_TTL
+from repo.db import db, get_pool, ping_db  # noqa: F401 — get_pool/ping_db исторически импортируют отсюда
 
 log = logging.getLogger("repo.orders")
-_pool: asyncpg.Pool | None = None
 
 _FAKE_ID = 0
 def _fake_order_id() -> int:
@@ -19,124 +17,192 @@ def _fake_order_id() -> int:
     _FAKE_ID -= 1
     return _FAKE_ID
 
-async def get_pool():
-    """
-    Возвращает пул подключений к БД или None, если БД недоступна.
-    """
-    global _pool, NO_DB
-    if _pool or NO_DB:
-        return _pool
-
-    try:
-        _pool = await asyncpg.create_pool(
-            host=DB_HOST,
-            port=int(DB_PORT),
-            database=DB_NAME,
-            user=DB_USER,
-            password=DB_PASSWORD,
-            ssl="require",
-        )
-        return _pool
-    except Exception as e:
-        logging.warning("DB pool init failed: %s — continuing without DB", e)
-        NO_DB = True
-        return None
+# ───── Кэши id ─────
+# Повторный клиент с тем же username/lang не требует upsert'ов: его user_id и
+# customer_id уже известны, как и service_id категории. Тогда заказ — это
+# один INSERT в uslugicuba.orders. Изменился username/lang — промах кэша,
+# запись идёт через полный CTE (он обновит строки) и кэши перезаписываются.
+_SERVICE_IDS = TTLCache(maxsize=64, ttl=REPO_CACHE_TTL)               # category -> service_id
+_USER_IDS = TTLCache(maxsize=REPO_CACHE_SIZE, ttl=REPO_CACHE_TTL)     # tg_id -> (user_id, username)
+_CUSTOMER_IDS = TTLCache(maxsize=REPO_CACHE_SIZE, ttl=REPO_CACHE_TTL)  # user_id -> (customer_id, lang)
 
 
-async def ping_db():
-    """
-    Проверка соединения с БД на старте. В NO-DB режиме просто пропускаем.
-    """
-    pool = await get_pool()
-    if not pool:
-        logging.warning("Skipping DB ping (NO-DB mode)")
-        return
+def invalidate_user(tg_id: int) -> None:
+    """Забыть id пользователя (например, после ручной правки/удаления в БД)."""
+    cached = _USER_IDS.pop(tg_id)
+    if cached:
+        _CUSTOMER_IDS.pop(cached[0])
+
+
+def clear_repo_caches() -> None:
+    _SERVICE_IDS.clear()
+    _USER_IDS.clear()
+    _CUSTOMER_IDS.clear()
+
 
-    async with pool.acquire() as conn:
-        await conn.execute("SELECT 1")
+def repo_cache_stats() -> dict:
+    return {"services": _SERVICE_IDS.stats(), "users": _USER_IDS.stats(), "customers": _CUSTOMER_IDS.stats()}
 
 
-async def create_order(order: dict) -> int:
+def _cached_ids(order: dict, category: str) -> tuple[int, int] | None:
+    """(customer_id, service_id), если всё известно и не изменилось, иначе None."""
+    service_id = _SERVICE_IDS.get(category)
+    user = _USER_IDS.get(order["client_tg_id"])
+    if service_id is None or user is None or user[1] != order.get("username"):
+        return None
+    customer = _CUSTOMER_IDS.get(user[0])
+    if customer is None or customer[1] != order.get("lang", "ru"):
+        return None
+    return customer[0], service_id
+
+
+def _remember_ids(order: dict, category: str, row) -> None:
+    _USER_IDS.set(order["client_tg_id"], (row["user_id"], order.get("username")))
+    _CUSTOMER_IDS.set(row["user_id"], (row["customer_id"], order.get("lang", "ru")))
+    if row["service_id"] is not None:
+        _SERVICE_IDS.set(category, row["service_id"])
+
+
+# Заказ — одним оператором: CTE с upsert пользователя и клиента, поиск
+# service_id и вставка заказа. Один round-trip вместо четырёх, и оператор
+# атомарен сам по себе — при ошибке не остаётся «осиротевших» upsert.
+# Текст запроса постоянный, поэтому asyncpg готовит его один раз на
+# соединение (кэш prepared statements) и дальше шлёт только Bind/Execute.
+_CREATE_ORDER_SQL = """
+WITH u AS (
+    INSERT INTO svc."user" (tg_id, username)
+    VALUES ($1, $2)
+    ON CONFLICT (tg_id) DO UPDATE SET username = EXCLUDED.username
+    RETURNING id
+), c AS (
+    INSERT INTO uslugicuba.customers (user_id, lang)
+    SELECT id, $3::text FROM u
+    ON CONFLICT (user_id) DO UPDATE SET lang = EXCLUDED.lang
+    RETURNING id
+)
+INSERT INTO uslugicuba.orders (
+  customer_id, service_id, state,
+  pickup_text, dropoff_text, when_at, pax,
+  meta
+)
+VALUES (
+  (SELECT id FROM c),
+  (SELECT id FROM uslugicuba.services WHERE category = $9 LIMIT 1),
+  'new', $4, $5, $6, COALESCE($7, 1), $8::jsonb
+)
+RETURNING id, customer_id, service_id, (SELECT id FROM u) AS user_id
+"""
+
+# Перенос из журнала (repo/outbox.py): тот же запрос, но заказ с уже записанным
+# ключом идемпотентности не вставляется повторно. Нужен уникальный индекс из
+# migrations/002_orders_idempotency_key.sql. Параметры — как у _CREATE_ORDER_SQL.
+_REPLAY_ORDER_SQL = """
+WITH u AS (
+    INSERT INTO svc."user" (tg_id, username)
+    VALUES ($1, $2)
+    ON CONFLICT (tg_id) DO UPDATE SET username = EXCLUDED.username
+    RETURNING id
+), c AS (
+    INSERT INTO uslugicuba.customers (user_id, lang)
+    SELECT id, $3::text FROM u
+    ON CONFLICT (user_id) DO UPDATE SET lang = EXCLUDED.lang
+    RETURNING id
+)
+INSERT INTO uslugicuba.orders (
+  customer_id, service_id, state,
+  pickup_text, dropoff_text, when_at, pax,
+  meta
+)
+VALUES (
+  (SELECT id FROM c),
+  (SELECT id FROM uslugicuba.services WHERE category = $9 LIMIT 1),
+  'new', $4, $5, $6, COALESCE($7, 1), $8::jsonb
+)
+ON CONFLICT ((meta->>'idempotency_key')) DO NOTHING
+RETURNING id
+"""
+
+# Повторный клиент: id из кэша, только вставка заказа
+_INSERT_ORDER_SQL = """
+INSERT INTO uslugicuba.orders (
+  customer_id, service_id, state,
+  pickup_text, dropoff_text, when_at, pax,
+  meta
+)
+VALUES ($1, $2, 'new', $3, $4, $5, COALESCE($6, 1), $7::jsonb)
+RETURNING id
+"""
+
+
+def _order_fields(order: dict) -> tuple:
+    """(pickup_text, dropoff_text, when_at, pax, meta) — колонки заказа в порядке SQL."""
+    # Pack extra data into `meta` JSONB field
+    meta_payload = {
+        "options": order.get("options", {}),
+        "price_quote": order.get("price_quote"),
+        "price_payload": order.get("price_payload", {}),
+        "idempotency_key": order.get("idempotency_key"),  # уникален в БД (repo/outbox.py)
+        "order_ref": order.get("order_ref"),  # номер, показанный до получения id (repo/outbox.py)
+        "source_data": order # For debugging
+    }
+    meta_json = json.dumps(meta_payload, ensure_ascii=False, default=str)
+    return (
+        order.get("pickup_text", ""),
+        order.get("dropoff_text", ""),
+        order.get("when_dt"),
+        order.get("pax"),
+        meta_json,
+    )
+
+
+async def create_order(order: dict, category: str = "taxi") -> int:
     """
-    Создает заказ в БД, следуя правильной логике и схеме:
-    1. Get-or-create `svc.user`.
-    2. Get-or-create `uslugicuba.customers`.
-    3. Get `service_id` for 'taxi'.
-    4. Pack extra data into `meta` JSONB field.
-    5. Insert `uslugicuba.orders`.
+    Создает заказ в БД одним запросом:
+    - повторный клиент (id в кэше, username/lang те же) — INSERT заказа;
+    - иначе _CREATE_ORDER_SQL: get-or-create `svc.user` и
+      `uslugicuba.customers`, `service_id` категории (NULL, если нет),
+      insert `uslugicuba.orders`; доп. данные — в `meta` JSONB.
     """
     pool = await get_pool()
     if not pool:
         return _fake_order_id()
 
+    fields = _order_fields(order)
+
     async with pool.acquire() as con:
         try:
-            # 1. Get-or-create svc.user
-            user_id = await con.fetchval(
-                """
-                INSERT INTO svc."user" (tg_id, username)
-                VALUES ($1, $2)
-                ON CONFLICT (tg_id) DO UPDATE SET username = $2
-                RETURNING id
-                """,
+            cached = _cached_ids(order, category)
+            if cached:
+                try:
+                    oid = await con.fetchval(_INSERT_ORDER_SQL, *cached, *fields)
+                    db.report(None)
+                    logging.info("Order inserted id=%s (customer_id=%s, cached)", oid, cached[0])
+                    return int(oid)
+                except asyncpg.ForeignKeyViolationError:
+                    # клиента/услугу удалили в БД — кэш устарел, идём полным путём
+                    invalidate_user(order["client_tg_id"])
+                    _SERVICE_IDS.pop(category)
+
+            row = await con.fetchrow(
+                _CREATE_ORDER_SQL,
                 order["client_tg_id"],
                 order.get("username"),
-            )
-
-            # 2. Get-or-create uslugicuba.customers
-            customer_id = await con.fetchval(
-                """
-                INSERT INTO uslugicuba.customers (user_id, lang)
-                VALUES ($1, $2)
-                ON CONFLICT (user_id) DO UPDATE SET lang = $2
-                RETURNING id
-                """,
-                user_id,
                 order.get("lang", "ru"),
+                *fields,
+                category,
             )
-
-            # 3. Get service_id for 'taxi' (without failing)
-            service_id = await con.fetchval(
-                "SELECT id FROM uslugicuba.services WHERE category = 'taxi' LIMIT 1"
-            )
-            if not service_id:
-                log.warning("Service 'taxi' not found in uslugicuba.services table. `service_id` will be NULL.")
-
-            # 4. Pack extra data into `meta` JSONB field
-            meta_payload = {
-                "options": order.get("options", {}),
-                "price_quote": order.get("price_quote"),
-                "price_payload": order.get("price_payload", {}),
-                "source_data": order # For debugging
-            }
-            meta_json = json.dumps(meta_payload, ensure_ascii=False, default=str)
-
-            # 5. Insert order with correct columns from schema
-            row = await con.fetchrow(
-                """
-                INSERT INTO uslugicuba.orders(
-                  customer_id, service_id, state,
-                  pickup_text, dropoff_text, when_at, pax,
-                  meta
-                )
-                VALUES ($1, $2, 'new', $3, $4, $5, COALESCE($6, 1), $7::jsonb)
-                RETURNING id
-                """,
-                customer_id,
-                service_id, # Can be NULL
-                order.get("pickup_text", ""),
-                order.get("dropoff_text", ""),
-                order.get("when_dt"),
-                order.get("pax"),
-                meta_json,
-            )
-            if not row or "id" not in row:
+            if not row or row["id"] is None:
                 raise RuntimeError("INSERT returned no id")
+            if row["service_id"] is None:
+                log.warning("Service '%s' not found in uslugicuba.services table. `service_id` is NULL.", category)
+            _remember_ids(order, category, row)
+            db.report(None)
 
             oid = int(row["id"])
-            logging.info("Order inserted id=%s (customer_id=%s, user_id=%s)", oid, customer_id, user_id)
+            logging.info("Order inserted id=%s (customer_id=%s, user_id=%s)", oid, row["customer_id"], row["user_id"])
             return oid
 
         except Exception as e:
+            db.report(e)  # обрыв связи копится в предохранителе пула
             logging.exception("create_order failed: %s", e)
-            raise
\ No newline at end of file
+            raise
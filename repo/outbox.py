@@ -0,0 +1,285 @@
+# repo/outbox.py — локальный журнал заказов на случай недоступной БД
+#
+# В NO-DB режиме create_order возвращал -1, -2, … и заказ терялся (оставался
+# только пост в канале). Теперь каждый подтверждённый заказ сначала пишется в
+# SQLite-файл (WAL, synchronous=FULL — переживает и падение процесса, и
+# отключение питания) за время локальной записи на диск, и только потом —
+# в PostgreSQL через групповую запись (repo/order_writer.py). id из БД
+# подтверждение ждёт не дольше OUTBOX_CONFIRM_WAIT: медленная или зависшая БД
+# не держит пользователя; недописанное фоновая задача переносит в
+# uslugicuba.orders пачками, как только пул снова доступен (repo/db.py).
+#
+# Повторов не будет: у заказа есть ключ идемпотентности (tg:<order_key черновика>),
+# он лежит в meta заказа, и на uslugicuba.orders есть уникальный индекс по
+# нему — повторная передача той же записи (упали между COMMIT в PostgreSQL и
+# отметкой в журнале, или запись ушла в БД по таймауту) ничего не вставит.
+# Индекс ставится миграцией migrations/002_orders_idempotency_key.sql; без
+# него перенос из журнала выключен (ошибка в логе), заказы пишутся только
+# напрямую.
+#
+# Пока id из БД нет, заказ называется номером order_ref (Q-XXXXXXXX из ключа
+# идемпотентности): его видят клиент, админ-чат и канал, а в БД он лежит в
+# meta->>'order_ref' — по нему оператор найдёт заказ после переноса.
+
+from __future__ import annotations
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import List, Tuple
+
+from config import ORDER_OUTBOX_PATH, OUTBOX_REPLAY_INTERVAL, OUTBOX_BATCH, OUTBOX_CONFIRM_WAIT
+from repo import orders
+from repo.db import CONNECTION_ERRORS, db
+from repo.order_writer import submit_order
+
+log = logging.getLogger("repo.outbox")
+
+DEFAULT_PATH = Path(__file__).resolve().parent.parent / "data" / "orders_outbox.sqlite3"
+_KEEP_REPLAYED = 7 * 86400  # перенесённые записи храним неделю (разбор инцидентов), сек
+
+_OUTBOX_SCHEMA = """
+CREATE TABLE IF NOT EXISTS outbox (
+    seq         INTEGER PRIMARY KEY AUTOINCREMENT,
+    key         TEXT NOT NULL UNIQUE,
+    category    TEXT NOT NULL,
+    payload     TEXT NOT NULL,
+    created_at  REAL NOT NULL,
+    replayed_at REAL,
+    error       TEXT
+)
+"""
+
+# индекс из migrations/002_orders_idempotency_key.sql (INVALID после неудачного CONCURRENTLY — не в счёт)
+_INDEX_READY_SQL = """
+SELECT coalesce(bool_and(indisvalid), false) FROM pg_index
+WHERE indexrelid = to_regclass('uslugicuba.orders_idempotency_key_uq')
+"""
+
+_INDEX_RECHECK = 60.0  # как часто снова искать индекс, если миграция не применена, сек
+
+
+def order_ref(key: str) -> str:
+    """Номер заказа до получения id из БД — один и тот же для одного ключа идемпотентности."""
+    return "Q-" + hashlib.blake2b(key.encode(), digest_size=4).hexdigest().upper()
+
+
+class Outbox:
+    """Журнал в SQLite: append() — из обработчика, replay() — из фоновой задачи."""
+
+    def __init__(self, path: str | Path = DEFAULT_PATH, batch: int = 100):
+        self.path = Path(path)
+        self.batch = batch
+        self._con: sqlite3.Connection | None = None
+        self._lock = threading.Lock()  # одно соединение на потоки to_thread
+        self._index_ready = False
+        self._index_checked_at = float("-inf")
+        self._index_warned = False
+        self._inflight: set[int] = set()  # записи, которые прямо сейчас пишет deliver()
+        self._wake = asyncio.Event()
+
+    def _db(self) -> sqlite3.Connection:
+        if self._con is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            con = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None, timeout=10)
+            con.execute("PRAGMA journal_mode=WAL")
+            con.execute("PRAGMA synchronous=FULL")
+            con.execute(_OUTBOX_SCHEMA)
+            self._con = con
+        return self._con
+
+    # ───── Запись ─────
+
+    def _append(self, key: str, category: str, payload: str) -> Tuple[int, bool]:
+        with self._lock:
+            con = self._db()
+            added = con.execute(
+                "INSERT OR IGNORE INTO outbox (key, category, payload, created_at) VALUES (?, ?, ?, ?)",
+                (key, category, payload, time.time()),
+            ).rowcount == 1
+            return con.execute("SELECT seq FROM outbox WHERE key = ?", (key,)).fetchone()[0], added
+
+    async def append(self, order: dict, category: str = "taxi") -> Tuple[int, bool]:
+        """Сохраняет заказ; (номер записи в журнале, новая ли запись) — повторный ключ не пишется."""
+        payload = json.dumps(order, ensure_ascii=False, default=str)
+        return await asyncio.to_thread(self._append, order["idempotency_key"], category, payload)
+
+    def _pending(self) -> List[Tuple[int, str, str]]:
+        with self._lock:
+            return self._db().execute(
+                "SELECT seq, category, payload FROM outbox WHERE replayed_at IS NULL AND error IS NULL "
+                "ORDER BY seq LIMIT ?",
+                (self.batch,),
+            ).fetchall()
+
+    def _mark(self, seqs: List[int]) -> None:
+        now = time.time()
+        with self._lock:
+            con = self._db()
+            con.executemany("UPDATE outbox SET replayed_at = ? WHERE seq = ?", [(now, s) for s in seqs])
+            con.execute("DELETE FROM outbox WHERE replayed_at < ?", (now - _KEEP_REPLAYED,))
+
+    def _reject(self, seq: int, error: str) -> None:
+        with self._lock:
+            self._db().execute("UPDATE outbox SET error = ? WHERE seq = ?", (error, seq))
+
+    def pending_count(self) -> int:
+        with self._lock:
+            return self._db().execute(
+                "SELECT count(*) FROM outbox WHERE replayed_at IS NULL AND error IS NULL"
+            ).fetchone()[0]
+
+    # ───── Перенос в PostgreSQL ─────
+
+    async def replay(self) -> int:
+        """Переносит накопленное пачками по batch; возвращает, сколько перенесено."""
+        total = 0
+        while True:
+            pool = await orders.get_pool()
+            if not pool or not await self._check_index(pool):
+                return total
+            rows = [r for r in await asyncio.to_thread(self._pending) if r[0] not in self._inflight]
+            if not rows:
+                return total
+            args = [self._replay_args(category, payload) for _seq, category, payload in rows]
+            rejected: set[int] = set()
+            try:
+                async with pool.acquire() as con:
+                    try:
+                        async with con.transaction():
+                            await con.executemany(orders._REPLAY_ORDER_SQL, args)  # один конвейер запросов на пачку
+                    except CONNECTION_ERRORS:
+                        raise
+                    except Exception as e:
+                        # в пачке «плохой» заказ: переносим по одному, плохие помечаем
+                        log.warning("Outbox batch failed: %s — replaying one by one", e)
+                        for (seq, _c, _p), row_args in zip(rows, args):
+                            try:
+                                await con.execute(orders._REPLAY_ORDER_SQL, *row_args)
+                            except CONNECTION_ERRORS:
+                                raise
+                            except Exception as row_error:
+                                log.error("Outbox order #%d rejected by DB: %s", seq, row_error)
+                                await asyncio.to_thread(self._reject, seq, str(row_error))
+                                rejected.add(seq)
+            except Exception as e:
+                db.report(e)
+                log.warning("Outbox replay of %d orders failed: %s — will retry", len(rows), e)
+                return total
+            db.report(None)
+            done = [seq for seq, _c, _p in rows if seq not in rejected]
+            await asyncio.to_thread(self._mark, done)
+            total += len(done)
+            log.info("Outbox: replayed %d orders into uslugicuba.orders", len(done))
+
+    async def _check_index(self, pool) -> bool:
+        """Есть ли уникальный индекс по ключу идемпотентности; без него replay() не повторяет заказы."""
+        if self._index_ready or time.monotonic() - self._index_checked_at < _INDEX_RECHECK:
+            return self._index_ready
+        self._index_checked_at = time.monotonic()
+        async with pool.acquire() as con:
+            self._index_ready = bool(await con.fetchval(_INDEX_READY_SQL))
+        if not self._index_ready and not self._index_warned:
+            self._index_warned = True
+            log.error("uslugicuba.orders_idempotency_key_uq is missing or invalid — apply "
+                      "migrations/002_orders_idempotency_key.sql; outbox replay is off until then")
+        return self._index_ready
+
+    async def deliver(self, seq: int, order: dict, category: str) -> int | None:
+        """
+        Записывает только что сохранённый заказ через групповую запись; id из
+        БД или None — тогда запись перенесёт фоновая задача. Пока ждём БД,
+        replay() эту запись не трогает (а гонку с другим процессом решает
+        уникальный индекс). Прямая запись идёт и без индекса: повтор возможен
+        только из replay().
+        """
+        self._inflight.add(seq)
+        try:
+            oid = await submit_order(order, category)
+        except Exception as e:
+            log.warning("Order %s stays in outbox: %s", order["idempotency_key"], e)
+            oid = 0
+        finally:
+            self._inflight.discard(seq)
+        if oid <= 0:  # ошибка или фиктивный id (пул пропал, пока заказ ждал пачку)
+            self.wake()
+            return None
+        await asyncio.to_thread(self._mark, [seq])
+        return oid
+
+    def wake(self) -> None:
+        """Перенести журнал сейчас, не дожидаясь интервала."""
+        self._wake.set()
+
+    @staticmethod
+    def _replay_args(category: str, payload: str) -> tuple:
+        order = json.loads(payload)
+        if isinstance(order.get("when_dt"), str):
+            order["when_dt"] = datetime.fromisoformat(order["when_dt"])
+        return (
+            order["client_tg_id"], order.get("username"), order.get("lang", "ru"),
+            *orders._order_fields(order), category,
+        )
+
+    async def run(self, interval: float = 5.0) -> None:
+        """Фоновая задача: раз в interval (или по wake()) переносит журнал, если БД доступна."""
+        while True:
+            try:
+                pool = await orders.get_pool()
+                if pool and await self._check_index(pool) and await asyncio.to_thread(self.pending_count):
+                    await self.replay()
+            except Exception as e:
+                db.report(e)
+                log.exception("Outbox replay loop error")
+            try:
+                await asyncio.wait_for(self._wake.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+
+_outbox: Outbox | None = None
+
+
+def get_outbox() -> Outbox:
+    global _outbox
+    if _outbox is None:
+        _outbox = Outbox(ORDER_OUTBOX_PATH or DEFAULT_PATH, batch=OUTBOX_BATCH)
+    return _outbox
+
+
+async def save_order(order: dict, category: str = "taxi", wait: float = OUTBOX_CONFIRM_WAIT) -> int | str:
+    """
+    Запись подтверждённого заказа: сначала в локальный журнал, затем в БД.
+    id из БД ждём не дольше wait секунд; не дождались (или БД недоступна) —
+    возвращает order_ref (он же в meta заказа), а заказ допишет фоновая задача.
+    order["idempotency_key"] обязателен.
+    """
+    order = order | {"order_ref": order_ref(order["idempotency_key"])}
+    outbox = get_outbox()
+    seq, added = await outbox.append(order, category)
+    if not added:
+        # тот же черновик подтверждён повторно: заказ уже записан или ждёт replay();
+        # прямая запись без ON CONFLICT вставила бы его второй раз
+        log.info("Order %s is already in outbox (#%d)", order["idempotency_key"], seq)
+        return order["order_ref"]
+    # без пула — сразу в фон (разомкнутый предохранитель не ждём)
+    if wait > 0 and db.available:
+        delivery = asyncio.ensure_future(outbox.deliver(seq, order, category))
+        try:
+            oid = await asyncio.wait_for(asyncio.shield(delivery), wait)
+        except asyncio.TimeoutError:
+            oid = None  # deliver() дописывает в фоне; не успеет — перенесёт replay()
+        if oid:
+            return oid
+    outbox.wake()
+    return order["order_ref"]
+
+
+def start_outbox(interval: float = OUTBOX_REPLAY_INTERVAL) -> asyncio.Task:
+    return asyncio.create_task(get_outbox().run(interval))
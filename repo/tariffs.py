@@ -0,0 +1,177 @@
+# repo/tariffs.py — тарифы такси из БД (vehicle_zone_prices, service_offers) поверх CSV
+import asyncio
+import json
+import logging
+import time
+
+import pricing
+from repo.orders import get_pool
+
+log = logging.getLogger("repo.tariffs")
+
+# zone_price-предложения провайдеров такси
+_OFFERS_SQL = """
+SELECT z.code AS zone_code, o.price, o.details
+FROM uslugicuba.service_offers o
+JOIN uslugicuba.services s ON s.id = o.service_id
+JOIN uslugicuba.zones    z ON z.id = o.zone_id
+WHERE o.offer_type = 'zone_price'
+  AND s.category = 'taxi'
+  AND o.price IS NOT NULL
+  AND COALESCE(o.currency, 'USD') = 'USD'
+"""
+
+# цены конкретных машин по зонам
+_VEHICLE_SQL = """
+SELECT z.code AS zone_code, p.price, p.details
+FROM uslugicuba.vehicle_zone_prices p
+JOIN uslugicuba.vehicles v ON v.id = p.vehicle_id
+JOIN uslugicuba.services s ON s.id = v.service_id
+JOIN uslugicuba.zones    z ON z.id = p.zone_id
+WHERE s.category = 'taxi'
+  AND v.is_active
+  AND p.currency = 'USD'
+"""
+
+
+_FROM_TO = ("type", "code", "id")
+
+
+def _reversed(row: dict) -> dict:
+    """Тот же маршрут в обратную сторону (zone → airport), как парные строки prices.csv."""
+    rev = dict(row)
+    for f in _FROM_TO:
+        rev[f"from_{f}"], rev[f"to_{f}"] = row[f"to_{f}"], row[f"from_{f}"]
+    return rev
+
+
+def _route(row: dict) -> tuple:
+    return tuple(str(v) for k, v in row.items() if k != "price_usd")
+
+
+def _rules_from_rows(rows) -> dict:
+    """
+    Строки БД -> таблица решений pricing (см. pricing._compile_rules).
+    Маршрут описывается в details теми же полями, что строка prices.csv:
+      {"rule_type": "airport_zone", "from_type": "airport", "from_code": "VRA",
+       "to_type": "zone", "to_code": "A", "priority": 2, "to_id": "..."}
+    По умолчанию (details='{}' по схеме) — airport_zone из любого аэропорта
+    (from_code="*") в зону строки. Для airport_zone добавляется и обратное
+    правило зона → аэропорт, если его нет среди строк явно.
+    Если на один маршрут несколько цен (разные машины/провайдеры) — берём минимальную.
+    При равном priority правила из БД выигрывают у CSV (считаются строками выше).
+    """
+    routes: dict[tuple, dict] = {}
+    implied: dict[tuple, dict] = {}
+    skipped = []
+    for r in rows:
+        details = r["details"] or {}
+        if isinstance(details, str):
+            try:
+                details = json.loads(details)
+            except ValueError:
+                details = {}
+        from_type = details.get("from_type") or "airport"
+        row = {
+            "priority":  details.get("priority"),
+            "rule_type": details.get("rule_type") or "airport_zone",
+            "from_type": from_type,
+            "from_code": details.get("from_code") or ("*" if from_type == "airport" else ""),
+            "from_id":   details.get("from_id") or "",
+            "to_type":   details.get("to_type") or "zone",
+            "to_code":   details.get("to_code") or r["zone_code"] or "",
+            "to_id":     details.get("to_id") or "",
+            "price_usd": float(r["price"]),
+        }
+        if (pricing._selector(row["from_type"], row["from_code"], row["from_id"]) is None
+                or pricing._selector(row["to_type"], row["to_code"], row["to_id"]) is None):
+            skipped.append(r)
+            continue
+        pairs = [(routes, row)]
+        if row["rule_type"] == "airport_zone":
+            pairs.append((implied, _reversed(row)))
+        for target, item in pairs:
+            route = _route(item)
+            if route not in target or item["price_usd"] < target[route]["price_usd"]:
+                target[route] = item
+    if skipped:
+        log.warning("Tariffs: %d DB rows skipped (no route in details), e.g. %s", len(skipped), dict(skipped[0]))
+    for route, row in implied.items():
+        routes.setdefault(route, row)  # явная строка обратного направления важнее
+    rules = pricing._compile_rules(routes.values())
+    # тай-брейк по seq: правила из БД — «выше» любой строки CSV
+    shift = len(routes)
+    return {key: rule._replace(seq=rule.seq - shift) for key, rule in rules.items()}
+
+
+async def load_db_rules() -> dict | None:
+    """Читает тарифы из БД. None — БД недоступна (NO-DB режим)."""
+    pool = await get_pool()
+    if not pool:
+        return None
+    async with pool.acquire() as con:
+        rows = list(await con.fetch(_OFFERS_SQL))
+        rows += await con.fetch(_VEHICLE_SQL)
+    return _rules_from_rows(rows)
+
+
+class TariffCache:
+    """
+    Кэш тарифов из БД в памяти процесса: котировки не ходят в БД,
+    а читают индекс pricing. Обновляется по TTL или после invalidate().
+    При недоступной БД pricing возвращается к CSV-правилам.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self.loaded_at: float | None = None  # time.monotonic() последней удачной загрузки
+        self._wake = asyncio.Event()
+
+    def is_fresh(self) -> bool:
+        return self.loaded_at is not None and time.monotonic() - self.loaded_at < self.ttl
+
+    def invalidate(self) -> None:
+        """Сбросить кэш: следующий refresh() (или фоновый цикл — сразу) перечитает БД."""
+        self.loaded_at = None
+        self._wake.set()
+
+    async def refresh(self, force: bool = False) -> None:
+        if self.is_fresh() and not force:
+            return
+        try:
+            rules = await load_db_rules()
+        except Exception as e:
+            log.warning("Tariffs from DB failed: %s — using CSV rules", e)
+            rules = None
+        pricing.use_db_rules(rules)
+        if rules is None:
+            self.loaded_at = None
+            return
+        self.loaded_at = time.monotonic()
+        log.info("Tariffs from DB loaded: %d rules", len(rules))
+
+    async def run(self) -> None:
+        """Фоновая задача: держит тарифы свежими."""
+        while True:
+            await self.refresh()
+            self._wake.clear()
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.ttl)
+            except asyncio.TimeoutError:
+                pass
+
+
+_cache: TariffCache | None = None
+
+
+def get_tariff_cache(ttl: float = 300.0) -> TariffCache:
+    global _cache
+    if _cache is None:
+        _cache = TariffCache(ttl)
+    return _cache
+
+
+def invalidate_tariffs() -> None:
+    """Вызывать после изменения цен провайдером."""
+    if _cache is not None:
+        _cache.invalidate()
@@ -58,9 +58,10 @@ async def _send_message_with_retries(bot: Bot, text: str):
     )
 
 
-def format_order_card(order_id: int, pickup: str, dropoff: str, when: str, price: float, pax: int, client_tg_id: int) -> str:
+def format_order_card(order_id: int | str, pickup: str, dropoff: str, when: str, price: float, pax: int, client_tg_id: int) -> str:
     """
     Форматирует карточку заказа для публикации.
+    order_id — id из БД или order_ref, если заказ ещё в журнале (repo/outbox.py).
     """
     # Fallback for price if it's None
     price_str = f"{price} USD" if price is not None else "N/A"
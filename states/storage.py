@@ -0,0 +1,137 @@
+# states/storage.py — FSM-хранилище в памяти с вытеснением брошенных диалогов
+#
+# aiogram MemoryStorage хранит state/data каждого, кто начал /taxi и ушёл,
+# до рестарта процесса. Здесь у записи есть срок простоя: ttl секунд без
+# обращений — и она удаляется вместе с pickup/dropoff и котировками.
+#
+# Записи лежат в OrderedDict в порядке последнего обращения (каждое чтение
+# или запись переносит ключ в конец), поэтому просроченные всегда в начале:
+# проход сборщика снимает их с головы и останавливается на первой живой —
+# O(просроченных), без полного обхода.
+
+from __future__ import annotations
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Optional, Tuple
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, StateType, StorageKey
+
+log = logging.getLogger("states.storage")
+
+
+def _size(state: Optional[str], data: Dict[str, Any]) -> int:
+    # оценка объёма записи — длина JSON (точный sys.getsizeof по вложенным dict дороже)
+    return len(state or "") + len(json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=str))
+
+
+class ExpiringMemoryStorage(BaseStorage):
+    """
+    ttl — сколько секунд простоя хранить диалог (0 — вечно, как MemoryStorage).
+    sweep_interval — как часто сборщик снимает просроченные, сек.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 86400.0,
+        sweep_interval: float = 60.0,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.ttl = ttl
+        self.sweep_interval = sweep_interval
+        self._clock = clock
+        self._records: OrderedDict[StorageKey, list] = OrderedDict()  # key -> [state, data, размер, время]
+        self._bytes = 0
+        self._sweeper: asyncio.Task | None = None
+        self.expired = 0  # вытеснено за всё время — для метрик
+
+    # ───── Записи ─────
+
+    def _get(self, key: StorageKey) -> Optional[list]:
+        rec = self._records.get(key)
+        if rec is None:
+            return None
+        now = self._clock()
+        if self.ttl > 0 and now - rec[3] >= self.ttl:
+            self._drop(key)  # просрочена, сборщик ещё не дошёл
+            self.expired += 1
+            return None
+        rec[3] = now
+        self._records.move_to_end(key)
+        return rec
+
+    def _put(self, key: StorageKey, state: Optional[str], data: Dict[str, Any]) -> None:
+        self._drop(key)
+        if state is None and not data:
+            return  # state.clear() — пустую запись не храним
+        size = _size(state, data)
+        self._records[key] = [state, data, size, self._clock()]
+        self._bytes += size
+        if self.ttl > 0 and (self._sweeper is None or self._sweeper.done()):
+            self._sweeper = asyncio.create_task(self._sweep_loop())
+
+    def _drop(self, key: StorageKey) -> None:
+        rec = self._records.pop(key, None)
+        if rec is not None:
+            self._bytes -= rec[2]
+
+    def sweep(self) -> int:
+        """Удаляет просроченные записи с головы; возвращает, сколько удалено."""
+        if self.ttl <= 0:
+            return 0
+        deadline = self._clock() - self.ttl
+        removed = 0
+        while self._records:
+            key, rec = next(iter(self._records.items()))
+            if rec[3] > deadline:
+                break
+            self._drop(key)
+            removed += 1
+        self.expired += removed
+        return removed
+
+    async def _sweep_loop(self) -> None:
+        while self._records:
+            await asyncio.sleep(self.sweep_interval)
+            removed = self.sweep()
+            if removed:
+                log.info("FSM: expired %d idle dialogs; %s", removed, self.stats())
+
+    def stats(self) -> dict:
+        """Гейдж: сколько диалогов в памяти и примерный объём их данных."""
+        return {"dialogs": len(self._records), "bytes": self._bytes, "expired": self.expired}
+
+    # ───── BaseStorage ─────
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        rec = self._get(key)
+        self._put(key, state.state if isinstance(state, State) else state, rec[1] if rec else {})
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        rec = self._get(key)
+        return rec[0] if rec else None
+
+    async def set_data(self, key: StorageKey, data: Dict[str, Any]) -> None:
+        rec = self._get(key)
+        self._put(key, rec[0] if rec else None, data.copy())
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        rec = self._get(key)
+        return rec[1].copy() if rec else {}
+
+    async def get_record(self, key: StorageKey) -> Tuple[Optional[str], Dict[str, Any]]:
+        """Состояние и данные одним вызовом (см. middlewares/fsm_unit.py)."""
+        rec = self._get(key)
+        return (rec[0], rec[1].copy()) if rec else (None, {})
+
+    async def set_record(self, key: StorageKey, state: StateType, data: Dict[str, Any]) -> None:
+        """Состояние и данные одним вызовом (см. middlewares/fsm_unit.py)."""
+        self._put(key, state.state if isinstance(state, State) else state, data.copy())
+
+    async def close(self) -> None:
+        if self._sweeper is not None:
+            self._sweeper.cancel()
+            self._sweeper = None
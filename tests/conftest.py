@@ -0,0 +1,32 @@
+# tests/conftest.py — общая настройка pytest
+#
+#   python -m pytest -q          — чистые тесты, без сети и БД
+#   python -m pytest -q --db     — плюс интеграционные (маркер db) на БД из .env;
+#                                  они пишут строки — только на тестовой базе!
+
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+os.environ.setdefault("CLIENT_BOT_TOKEN", "1:test")  # config.py требует токен при импорте
+
+
+def pytest_addoption(parser):
+    parser.addoption("--db", action="store_true", help="запускать тесты на настоящей БД из .env")
+
+
+def pytest_configure(config):
+    config.addinivalue_line("markers", "db: интеграционный тест на настоящей БД (нужен --db)")
+
+
+def pytest_collection_modifyitems(config, items):
+    if config.getoption("--db"):
+        return
+    skip = pytest.mark.skip(reason="нужен --db и тестовая БД в .env")
+    for item in items:
+        if "db" in item.keywords:
+            item.add_marker(skip)
@@ -0,0 +1,101 @@
+# tests/test_db_integration.py — SQL заказов/FSM на настоящей PostgreSQL
+#
+#   python -m pytest -q --db tests/test_db_integration.py
+#
+# Берёт DB_* из .env; на базе должны быть применены migrations/*.sql. Пишет
+# заказы от тестовых tg_id (900000000+) и удаляет их за собой — запускать на
+# тестовой копии базы, не на боевой.
+
+import asyncio
+import json
+import uuid
+
+import pytest
+
+from repo import orders
+from repo.db import db
+from repo.order_writer import OrderWriter
+
+pytestmark = pytest.mark.db
+
+TG_BASE = 900_000_000
+ORDER = {"username": "pytest", "lang": "ru", "pickup_text": "A", "dropoff_text": "B", "pax": 2, "price_quote": 30.0}
+
+
+def _run(coro_fn):
+    async def wrapper():
+        pool = await orders.get_pool()
+        if pool is None:
+            pytest.fail("DB from .env is not reachable")
+        try:
+            return await coro_fn(pool)
+        finally:
+            await db.close()
+    return asyncio.run(wrapper())
+
+
+async def _cleanup(pool, ids):
+    async with pool.acquire() as con:
+        await con.execute("DELETE FROM uslugicuba.orders WHERE id = ANY($1::bigint[])", ids)
+
+
+def test_batch_insert():
+    async def body(pool):
+        orders.clear_repo_caches()
+        writer = OrderWriter(window=0.05, max_batch=10)
+        batch = [ORDER | {"client_tg_id": TG_BASE + i, "idempotency_key": f"pytest:{uuid.uuid4()}"} for i in range(3)]
+        ids = await asyncio.gather(*(writer.submit(o) for o in batch))
+        await writer.close()
+        try:
+            assert writer.batches == 1, "batch statement failed and fell back to create_order"
+            assert len(set(ids)) == 3 and all(i > 0 for i in ids)
+            async with pool.acquire() as con:
+                services = await con.fetch(
+                    "SELECT service_id FROM uslugicuba.orders WHERE id = ANY($1::bigint[])", ids
+                )
+            assert len(services) == 3 and all(r["service_id"] is not None for r in services)
+        finally:
+            await _cleanup(pool, ids)
+    _run(body)
+
+
+def test_fsm_roundtrip_and_expire():
+    from aiogram.fsm.storage.base import StorageKey
+    from repo.fsm_storage import PgStorage
+
+    async def body(pool):
+        key = StorageKey(bot_id=0, chat_id=TG_BASE, user_id=TG_BASE)
+        storage = PgStorage(flush_interval=0, idle_ttl=0)
+        await storage.set_record(key, "TaxiOrder:confirm", {"pax": 2, "pickup_text": "Отель"})
+        fresh = PgStorage(flush_interval=0, idle_ttl=0)  # пустой кэш — чтение из БД
+        assert await fresh.get_record(key) == ("TaxiOrder:confirm", {"pax": 2, "pickup_text": "Отель"})
+        async with pool.acquire() as con:
+            await con.execute(
+                "UPDATE uslugicuba.fsm_state SET updated_at = now() - interval '2 days' WHERE key = $1",
+                PgStorage._key(key),
+            )
+        fresh.idle_ttl = 86400
+        assert await fresh.expire() >= 1
+        assert await PgStorage(flush_interval=0, idle_ttl=0).get_record(key) == (None, {})
+    _run(body)
+
+
+def test_replay_is_idempotent():
+    # нужна migrations/002_orders_idempotency_key.sql
+    from repo.outbox import Outbox
+
+    async def body(pool):
+        key = f"pytest:{uuid.uuid4()}"
+        args = Outbox._replay_args("taxi", json.dumps(ORDER | {"client_tg_id": TG_BASE, "idempotency_key": key}))
+        async with pool.acquire() as con:
+            first = await con.fetchval(orders._REPLAY_ORDER_SQL, *args)
+            again = await con.fetchval(orders._REPLAY_ORDER_SQL, *args)
+            ids = await con.fetch(
+                "SELECT id FROM uslugicuba.orders WHERE meta->>'idempotency_key' = $1", key
+            )
+        try:
+            assert first and again is None  # повтор ключа ничего не вставил
+            assert [r["id"] for r in ids] == [first]
+        finally:
+            await _cleanup(pool, [r["id"] for r in ids])
+    _run(body)
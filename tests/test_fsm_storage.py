@@ -0,0 +1,101 @@
+# tests/test_fsm_storage.py — PgStorage на пуле-имитации (repo/fsm_storage.py)
+
+import asyncio
+from contextlib import asynccontextmanager
+from pathlib import Path
+
+import pytest
+from aiogram.fsm.storage.base import StorageKey
+
+import repo.fsm_storage as fsm_storage
+from repo.fsm_storage import PgStorage
+
+KEY = StorageKey(bot_id=1, chat_id=7, user_id=7)
+MIGRATION = Path(__file__).resolve().parent.parent / "migrations" / "001_fsm_state.sql"
+
+
+class _Pool:
+    def __init__(self, table=True, row=None, read_error=None):
+        self.table = table
+        self.row = row
+        self.read_error = read_error
+        self.executed = []
+
+    async def fetchval(self, sql, *args):
+        return self.table
+
+    async def fetchrow(self, sql, *args):
+        if self.read_error:
+            raise self.read_error
+        return self.row
+
+    async def execute(self, sql, *args):
+        self.executed.append((sql, args))
+        return "DELETE 3"
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self
+
+
+@pytest.fixture
+def reports(monkeypatch):
+    reports = []
+    monkeypatch.setattr(fsm_storage.db, "report", reports.append)
+    return reports
+
+
+def _use(monkeypatch, pool):
+    async def get_pool():
+        return pool
+    monkeypatch.setattr(fsm_storage, "get_pool", get_pool)
+
+
+def test_read_error_serves_empty_record_and_reports(monkeypatch, reports):
+    err = ConnectionResetError("reset")
+    pool = _Pool(read_error=err)
+    _use(monkeypatch, pool)
+
+    async def body():
+        storage = PgStorage(flush_interval=0, idle_ttl=0)
+        assert await storage.get_record(KEY) == (None, {})
+        assert reports == [err]
+        # пустая запись не кэшируется: после восстановления ключ читается из БД
+        pool.read_error, pool.row = None, {"state": "TaxiOrder:confirm", "data": '{"pax": 2}'}
+        assert await storage.get_record(KEY) == ("TaxiOrder:confirm", {"pax": 2})
+        assert reports[-1] is None
+    asyncio.run(body())
+
+
+def test_missing_table_keeps_fsm_in_memory(monkeypatch, reports):
+    pool = _Pool(table=False)
+    _use(monkeypatch, pool)
+
+    async def body():
+        storage = PgStorage(flush_interval=0, idle_ttl=0)
+        await storage.set_state(KEY, "TaxiOrder:pickup")
+        assert await storage.get_state(KEY) == "TaxiOrder:pickup"
+        assert pool.executed == []  # ни DDL, ни записей без миграции
+    asyncio.run(body())
+
+
+def test_expire_keeps_destinies(monkeypatch, reports):
+    pool = _Pool()
+    _use(monkeypatch, pool)
+
+    async def body():
+        storage = PgStorage(idle_ttl=3600, keep_destinies=("lang",))
+        assert await storage.expire() == 3
+        sql, args = pool.executed[-1]
+        assert "DELETE FROM uslugicuba.fsm_state" in sql and args == (3600.0, ["lang"])
+    asyncio.run(body())
+
+
+def test_migration_creates_table():
+    sql = MIGRATION.read_text(encoding="utf-8")
+    assert "CREATE TABLE IF NOT EXISTS uslugicuba.fsm_state" in sql
+    assert "(updated_at)" in sql  # индекс для очистки брошенных диалогов
@@ -0,0 +1,60 @@
+# tests/test_location_search.py — нечёткий поиск точек (location_search.py)
+
+import pytest
+
+from data_loader import Location, LocationRegistry
+from location_search import LocationSearchIndex, fold
+
+NAMES = [
+    ("vra", "airport", "Aeropuerto Juan Gualberto Gómez (Varadero)"),
+    ("hav", "airport", "Aeropuerto José Martí (La Habana)"),
+    ("melia-varadero", "hotel", "Meliá Varadero"),
+    ("melia-cohiba", "hotel", "Meliá Cohiba"),
+    ("nacional", "hotel", "Hotel Nacional de Cuba"),
+    ("lorans", "restaurant", "Marisquería Lorán"),
+]
+REGISTRY = LocationRegistry(tuple(
+    Location(i, _id, kind, name, "A", "A") for i, (_id, kind, name) in enumerate(NAMES)
+))
+
+
+@pytest.fixture(scope="module")
+def index():
+    return LocationSearchIndex(REGISTRY)
+
+
+def _ids(locs):
+    return [loc.id for loc in locs]
+
+
+def test_fold():
+    assert fold("Marisquería Лоран") == "marisqueria loran"
+    assert fold("  Meliá—Varadero!! ") == "melia varadero"
+
+
+def test_accents_case_and_cyrillic_match_the_same_place(index):
+    for query in ("Melia Cohiba", "MELIÁ cohiba", "мелиа кохиба"):
+        assert _ids(index.search(query, k=1)) == ["melia-cohiba"]
+
+
+def test_prefix_of_last_word_matches(index):
+    assert _ids(index.search("nacio", k=1)) == ["nacional"]
+
+
+def test_typo_still_matches(index):
+    assert _ids(index.search("marisqueria loran", k=1)) == ["lorans"]
+    assert _ids(index.search("melia varadro", k=1)) == ["melia-varadero"]
+    assert _ids(index.search("hotel nacinal")) == ["nacional"]
+    assert set(_ids(index.search("Varadeor"))) == {"melia-varadero", "vra"}
+
+
+def test_kinds_filter_and_k(index):
+    assert _ids(index.search("varadero", kinds=["airport"])) == ["vra"]
+    assert len(index.search("melia", k=1)) == 1
+    assert set(_ids(index.search("melia", k=5))) >= {"melia-varadero", "melia-cohiba"}
+
+
+def test_empty_and_unrelated_queries(index):
+    assert index.search("") == []
+    assert index.search("  !!! ") == []
+    assert index.search("zzzzqqq") == []
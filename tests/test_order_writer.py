@@ -0,0 +1,82 @@
+# tests/test_order_writer.py — групповая запись заказов (repo/order_writer.py)
+
+import asyncio
+import re
+from contextlib import asynccontextmanager
+
+import pytest
+
+from repo import orders
+from repo.order_writer import _INSERT_BATCH_SQL, OrderWriter
+
+ORDER = {"username": "t", "lang": "ru", "pickup_text": "A", "dropoff_text": "B", "pax": 2, "price_quote": 30.0}
+
+
+def test_batch_category_is_cast_to_enum():
+    # services.category — enum uslugicuba.service_category: сравнение enum = text не существует
+    assert "$6::uslugicuba.service_category[]" in _INSERT_BATCH_SQL
+    assert not re.search(r"\$6::text\[\]", _INSERT_BATCH_SQL)
+
+
+class _Con:
+    def __init__(self):
+        self.args = None
+
+    async def fetch(self, sql, *args):
+        self.args = args
+        return [{"n": n, "id": 100 + n, "customer_id": n, "user_id": n, "service_id": 1}
+                for n in range(1, len(args[0]) + 1)]
+
+
+class _Pool:
+    def __init__(self):
+        self.con = _Con()
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self.con
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = _Pool()
+    async def get_pool():
+        return pool
+    monkeypatch.setattr(orders, "get_pool", get_pool)
+    orders.clear_repo_caches()
+    yield pool
+    orders.clear_repo_caches()
+
+
+def test_write_batch_columns(pool):
+    batch = [(ORDER | {"client_tg_id": 1}, "taxi"), (ORDER | {"client_tg_id": 2}, "taxi")]
+    ids = asyncio.run(OrderWriter()._write_batch(batch))
+    assert ids == [101, 102]
+    cols = pool.con.args
+    assert len(cols) == 11  # $1..$11
+    assert cols[0] == [1, 2] and cols[5] == ["taxi", "taxi"]
+    assert orders._USER_IDS.get(1) == (1, "t")  # id запомнены после успешной записи
+
+
+def test_connection_error_fails_every_future(monkeypatch, pool):
+    retried = []
+
+    async def lost(self, batch):
+        raise ConnectionResetError("reset")
+
+    async def create_order(order, category="taxi"):
+        retried.append(order)
+        return 1
+
+    monkeypatch.setattr(OrderWriter, "_write_batch", lost)
+    monkeypatch.setattr(orders, "create_order", create_order)
+
+    async def run():
+        writer = OrderWriter(window=0.01)
+        return await asyncio.gather(
+            *(writer.submit(ORDER | {"client_tg_id": i}) for i in range(3)), return_exceptions=True
+        )
+
+    results = asyncio.run(run())
+    assert all(isinstance(r, ConnectionResetError) for r in results)
+    assert retried == []  # пакет мог закоммититься — по одному не повторяем
@@ -0,0 +1,98 @@
+# tests/test_outbox.py — журнал заказов (repo/outbox.py) без PostgreSQL
+
+import asyncio
+import json
+import re
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from repo import orders, outbox
+from repo.outbox import Outbox, order_ref, save_order
+
+ORDER = {"idempotency_key": "tg:abc", "client_tg_id": 1, "username": "t", "lang": "ru",
+         "pickup_text": "A", "dropoff_text": "B", "pax": 2, "price_quote": 30.0}
+
+
+def _params(sql: str) -> set:
+    return set(re.findall(r"\$\d+", sql))
+
+
+def test_replay_sql_is_create_sql_with_conflict_guard():
+    replay = orders._REPLAY_ORDER_SQL
+    guard = "ON CONFLICT ((meta->>'idempotency_key')) DO NOTHING"
+    assert replay.endswith(f"\n{guard}\nRETURNING id\n")
+    assert _params(replay) == _params(orders._CREATE_ORDER_SQL)
+    # до ON CONFLICT — тот же запрос, что и прямая запись
+    insert = orders._CREATE_ORDER_SQL.split("\nRETURNING ")[0]
+    assert replay.split("\n" + guard)[0] == insert
+
+
+@pytest.fixture
+def box(monkeypatch, tmp_path):
+    box = Outbox(tmp_path / "outbox.sqlite3")
+    monkeypatch.setattr(outbox, "_outbox", box)
+    return box
+
+
+def test_save_order_without_db_returns_stable_ref(box):
+    ref = asyncio.run(save_order(dict(ORDER)))
+    assert ref == order_ref("tg:abc") and re.fullmatch(r"Q-[0-9A-F]{8}", ref)
+    assert asyncio.run(save_order(dict(ORDER))) == ref  # повтор ключа — тот же номер, одна запись
+    [(_seq, category, payload)] = box._pending()
+    assert category == "taxi" and json.loads(payload)["order_ref"] == ref
+    meta = json.loads(orders._order_fields(json.loads(payload))[-1])
+    assert meta["order_ref"] == ref  # по нему оператор найдёт заказ в БД
+
+
+class _Pool:
+    def __init__(self, index: bool):
+        self.index = index
+        self.executed = 0
+
+    async def fetchval(self, sql, *args):
+        return self.index
+
+    async def executemany(self, sql, args):
+        self.executed += len(args)
+
+    @asynccontextmanager
+    async def transaction(self):
+        yield
+
+    @asynccontextmanager
+    async def acquire(self):
+        yield self
+
+
+def test_replay_waits_for_index_migration(monkeypatch, box, caplog):
+    pool = _Pool(index=False)
+    async def get_pool():
+        return pool
+    monkeypatch.setattr(orders, "get_pool", get_pool)
+    asyncio.run(box.append(dict(ORDER)))
+
+    assert asyncio.run(box.replay()) == 0
+    assert asyncio.run(box.replay()) == 0
+    assert pool.executed == 0 and box.pending_count() == 1
+    assert len([r for r in caplog.records if "002_orders_idempotency_key" in r.getMessage()]) == 1
+
+    pool.index, box._index_checked_at = True, float("-inf")  # миграцию применили
+    monkeypatch.setattr(outbox.db, "report", lambda error: None)
+    assert asyncio.run(box.replay()) == 1
+    assert pool.executed == 1 and box.pending_count() == 0
+
+
+def test_repeated_key_is_not_written_twice(monkeypatch, box):
+    submitted = []
+    async def submit_order(order, category):
+        submitted.append(order["idempotency_key"])
+        return 101
+    monkeypatch.setattr(outbox, "submit_order", submit_order)
+    monkeypatch.setattr(outbox, "db", SimpleNamespace(available=True, report=lambda error: None))
+
+    assert asyncio.run(save_order(dict(ORDER))) == 101
+    # повторное «Подтвердить» того же черновика: без второй прямой записи
+    assert asyncio.run(save_order(dict(ORDER))) == order_ref("tg:abc")
+    assert submitted == ["tg:abc"] and box.pending_count() == 0
@@ -0,0 +1,85 @@
+# tests/test_paging.py — callback_data постраничных списков: клавиатуры ↔ обработчики навигации
+
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+
+from handlers.client.paging import open_alphabet, turn_page
+from keyboards.paging import Item, alphabet_keyboard, page_keyboard, register_list
+
+NAMES = ["Ambos Mundos", "Bella Vista", "Brisas", "Copacabana", "Iberostar", "Melia", "Nacional",
+         "Paradisus", "Playa Azul", "Riu", "Sevilla", "Tryp", "Varadero", "Vedado", "1830"]
+ITEMS = [Item(n, f"pickH:{i}", n) for i, n in enumerate(NAMES)]
+
+
+async def _source(prefix, state):
+    return ITEMS
+
+
+register_list("t", _source, page_size=4, columns=2, footer=[("⬅️ Назад", "back")])
+
+
+class _Callback:
+    def __init__(self, data):
+        self.data = data
+        self.answered = 0
+        self.markups = []
+        self.message = SimpleNamespace(edit_reply_markup=self._edit)
+
+    async def _edit(self, reply_markup):
+        self.markups.append(reply_markup)
+
+    async def answer(self, *args, **kwargs):
+        self.answered += 1
+
+
+def _press(handler, data):
+    cb = _Callback(data)
+    asyncio.run(handler(cb, state=None))
+    return cb
+
+
+def _callbacks(markup):
+    return [b.callback_data for row in markup.inline_keyboard for b in row]
+
+
+def test_navigation_buttons_open_their_pages():
+    first = page_keyboard("t", "pickH", ITEMS, 0)
+    nav = [cb for cb in _callbacks(first) if cb.startswith("pg|")]
+    assert nav == ["pg|t|pickH|3", "pg|t|pickH|1"]  # ◀ на последнюю, ▶ на вторую
+    for cb in nav:
+        page = int(cb.rsplit("|", 1)[1])
+        pressed = _press(turn_page, cb)
+        assert pressed.markups == [page_keyboard("t", "pickH", ITEMS, page)] and pressed.answered == 1
+
+
+def test_alphabet_letters_lead_to_first_page_of_letter():
+    pressed = _press(open_alphabet, "abc|t|pickH")
+    [kb] = pressed.markups
+    assert kb == alphabet_keyboard("t", "pickH", ITEMS)
+    letters = {b.text: b.callback_data for row in kb.inline_keyboard for b in row}
+    assert letters["#"] == "pg|t|pickH|0"  # «1830» — первой в сортировке
+    assert letters["V"] == "pg|t|pickH|3"
+    assert letters["◀ 1"] == "pg|t|pickH|0"
+
+
+@pytest.mark.parametrize("handler, data", [
+    (turn_page, "pg|t|pickH|x"),
+    (turn_page, "pg|t|pickH"),
+    (turn_page, "pg|nope|pickH|0"),
+    (open_alphabet, "abc|t"),
+    (open_alphabet, "abc|nope|pickH"),
+])
+def test_malformed_or_unknown_callbacks_are_only_answered(handler, data):
+    pressed = _press(handler, data)
+    assert pressed.markups == [] and pressed.answered == 1
+
+
+def test_out_of_range_page_is_clamped():
+    assert _press(turn_page, "pg|t|pickH|99").markups == [page_keyboard("t", "pickH", ITEMS, 3)]
+
+
+def test_callback_data_fits_telegram_limit():
+    markups = [page_keyboard("t", "pickH", ITEMS, p) for p in range(4)] + [alphabet_keyboard("t", "pickH", ITEMS)]
+    assert all(len(cb.encode()) <= 64 for m in markups for cb in _callbacks(m))
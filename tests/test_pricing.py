@@ -0,0 +1,64 @@
+# tests/test_pricing.py — таблица решений котировок (pricing._compile_rules/_sides/_resolve)
+
+import pytest
+
+import pricing
+from data_loader import Location
+
+VRA = Location(0, "vra", "airport", "Varadero", "A", "VRA")
+MELIA = Location(1, "melia", "hotel", "Melia", "B", "B")
+
+ROWS = [
+    {"rule_type": "airport_zone", "from_type": "airport", "from_code": "vra", "to_type": "zone", "to_code": "b",
+     "price_usd": "40"},
+    {"rule_type": "airport_zone", "from_type": "airport", "from_code": "*", "to_type": "zone", "to_code": "*",
+     "price_usd": "60"},
+    {"rule_type": "custom", "from_type": "location", "from_code": "vra", "to_type": "location", "to_code": "melia",
+     "price_usd": "35", "priority": "0.5"},
+    {"rule_type": "zone_zone", "from_type": "zone", "from_code": "B", "to_type": "zone", "to_code": "B",
+     "price_usd": "not a number"},
+]
+
+
+def _quote(rules, src, dst, when=None, options=None):
+    return pricing._resolve(
+        rules, pricing._sides(src.kind, src, src.id), pricing._sides(dst.kind, dst, dst.id), when, options or {},
+    )
+
+
+def test_sides_most_specific_first():
+    assert pricing._sides("airport", VRA, "vra") == [
+        ("location", "vra"), ("airport", "VRA"), ("airport", "*"), ("zone", "A"), ("zone", "*"), ("*", "*"),
+    ]
+    assert pricing._sides("hotel", None, "") == [("*", "*")]
+
+
+def test_compile_keeps_best_rule_per_pair_and_skips_bad_rows():
+    rules = pricing._compile_rules(ROWS + [dict(ROWS[0], price_usd="45")])
+    assert rules[(("airport", "VRA"), ("zone", "B"))].base == 40.0  # та же пара: первая строка
+    assert (("zone", "B"), ("zone", "B")) not in rules  # цена не число
+
+
+def test_resolve_by_priority_not_specificity():
+    rules = pricing._compile_rules(ROWS)
+    price, payload = _quote(rules, VRA, MELIA)
+    assert (price, payload["rule"]) == (35.0, "custom")  # priority 0.5 < airport_zone 2.0
+    rules = pricing._compile_rules(ROWS[:2])
+    assert _quote(rules, VRA, MELIA)[0] == 40.0  # равный priority — раньше в файле
+
+
+def test_resolve_wildcard_and_not_found():
+    rules = pricing._compile_rules(ROWS[1:2])
+    assert _quote(rules, VRA, MELIA)[0] == 60.0
+    assert _quote(rules, MELIA, VRA) == (0.0, {"rule": "not_found"})
+
+
+@pytest.mark.parametrize("when, options, price", [
+    ("21:59", {}, 40.0),
+    ("22:00", {}, 48.0),
+    ("05:59", {"child_seat": True}, 53.0),
+    ("now", {"child_seat": True}, 45.0),
+])
+def test_resolve_applies_mods(when, options, price):
+    rules = pricing._compile_rules(ROWS[:2])
+    assert _quote(rules, VRA, MELIA, when, options)[0] == price
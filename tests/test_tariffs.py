@@ -0,0 +1,54 @@
+# tests/test_tariffs.py — тарифы из БД поверх CSV (repo/tariffs.py)
+
+import pytest
+
+import pricing
+from repo.tariffs import _rules_from_rows
+
+
+@pytest.fixture
+def db_rules():
+    yield pricing.use_db_rules
+    pricing.use_db_rules(None)
+
+
+def _zone_hotel(zone: str) -> str:
+    return next(loc.id for loc in pricing.get_registry().of_kind("hotel") if loc.zone == zone)
+
+
+def test_default_details_row_is_any_airport_to_zone_and_back():
+    rules = _rules_from_rows([{"zone_code": "A", "price": 20, "details": {}}])
+    assert rules[(("airport", "*"), ("zone", "A"))].base == 20.0
+    assert rules[(("zone", "A"), ("airport", "*"))].base == 20.0
+
+
+def test_details_as_json_text_and_min_price():
+    rows = [
+        {"zone_code": "B", "price": 40, "details": '{"from_code": "VRA"}'},
+        {"zone_code": "B", "price": 35, "details": '{"from_code": "VRA"}'},
+    ]
+    rules = _rules_from_rows(rows)
+    assert rules[(("airport", "VRA"), ("zone", "B"))].base == 35.0
+
+
+def test_explicit_reverse_row_wins_over_implied():
+    rows = [
+        {"zone_code": "C", "price": 30, "details": {}},
+        {"zone_code": "C", "price": 33, "details": {"from_type": "zone", "from_code": "C",
+                                                     "to_type": "airport", "to_code": "*"}},
+    ]
+    assert _rules_from_rows(rows)[(("zone", "C"), ("airport", "*"))].base == 33.0
+
+
+def test_row_without_route_is_skipped_and_logged(caplog):
+    rows = [{"zone_code": "", "price": 10, "details": {"to_type": "zone"}}]
+    assert _rules_from_rows(rows) == {}
+    assert "skipped" in caplog.text
+
+
+def test_default_row_overrides_csv_both_directions(db_rules):
+    hotel = _zone_hotel("A")
+    csv_price, _ = pricing._quote_from_rules("airport", "vra", "hotel", hotel)
+    db_rules(_rules_from_rows([{"zone_code": "A", "price": csv_price - 5, "details": {}}]))
+    assert pricing._quote_from_rules("airport", "vra", "hotel", hotel)[0] == csv_price - 5
+    assert pricing._quote_from_rules("hotel", hotel, "airport", "hav")[0] == csv_price - 5